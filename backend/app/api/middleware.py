@@ -0,0 +1,74 @@
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+from core.config import settings
+from core.metrics import metrics_registry, RequestTimings, use_timings
+from core.profiling import slow_request_profiler
+
+REQUEST_SECONDS = metrics_registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response is complete",
+    ("method", "route", "status")
+)
+REQUESTS_IN_PROGRESS = metrics_registry.gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled"
+)
+
+class TimingMiddleware:
+    """
+    Request latency metrics, Server-Timing headers and slow-request profiling
+
+    Written as plain ASGI middleware so streamed responses pass through
+    untouched. Stage timings recorded while a request is handled (see
+    ``core.metrics.stage_timer``) are sent back in a ``Server-Timing``
+    header when SERVER_TIMING_ENABLED is set or the client sends
+    ``X-Server-Timing: 1``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        requested = any(
+            name == b"x-server-timing" and value not in (b"", b"0")
+            for name, value in scope["headers"]
+        )
+        timings = RequestTimings() if settings.SERVER_TIMING_ENABLED or requested else None
+        token = (
+            slow_request_profiler.begin(scope["method"], scope["path"])
+            if settings.PROFILE_SLOW_REQUESTS else None
+        )
+        status = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    timings.add("total", time.perf_counter() - started)
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", timings.header())
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            with use_timings(timings):
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route,
+                status=str(status)
+            )
+            if token is not None:
+                slow_request_profiler.end(token)
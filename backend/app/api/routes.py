@@ -1,34 +1,194 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import asyncio
+import hmac
+import json
+import time
+import zipfile
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Depends, BackgroundTasks, Header
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Literal
 
 from schemas.response import (
     UploadResponse,
     DetectionResponse,
     ResultsResponse,
+    JobResponse,
     ErrorResponse
 )
+from schemas.request import TilingOptions, PostprocessOptions, BatchDetectRequest, ModelReloadRequest, ModelRoutingRequest
 from utils.file_handler import (
     generate_unique_id,
     validate_file_extension,
-    save_upload_file,
-    get_blueprint_path
+    save_upload_stream,
+    save_archive_stream,
+    iter_archive_images,
+    extract_archive_image,
+    get_blueprint_path,
+    is_valid_blueprint_id,
+    register_upload,
+    UploadTooLargeError,
+    InvalidImageError
 )
-from services.inference import run_inference, get_detection_statistics
-from services.postprocess import process_and_save_results, load_results
+from api.serialization import detection_response, ALTERNATE_CONTENT
+from services.cache import detection_cache, remember_file_hash
+from services.preprocess import decoded_image_cache
+from services.postprocess import load_results
+from services.executor import inference_executor, ExecutorBusyError
+from services.jobs import job_queue, JobQueueFullError, TERMINAL_STATES
+from services.batch import stream_batch_results
+from services.detection import detect_blueprint
+from services.pdf import count_pdf_pages, render_pdf_page
+from services.results_store import results_store
+from services.analytics import scope_key, ALL_LABELS
+from services.pyramid import pyramid_store
+from services.retention import retention_manager
+from models.batcher import batch_scheduler, QueueFullError
+from models.detector import MODEL_LOADING
+from models.registry import model_registry, UnknownModelError, DEFAULT_MODEL
+from models.backends import BACKENDS
 from core.config import settings
+from core.metrics import metrics_registry, stage_timer
+from core.cpu import thread_info
 
 router = APIRouter()
 
+def tiling_options(
+    tiled: bool = Query(False, description="Use tiled inference for large sheets"),
+    tile_size: Optional[int] = Query(None, ge=128, le=8192),
+    tile_overlap: Optional[float] = Query(None, ge=0.0, lt=0.9),
+    tile_merge: Optional[Literal["nms", "wbf", "none"]] = Query(None),
+    tile_merge_threshold: Optional[float] = Query(None, gt=0.0, le=1.0)
+) -> TilingOptions:
+    """Tiled inference settings from query parameters"""
+    return TilingOptions(
+        enabled=tiled,
+        tile_size=tile_size,
+        overlap=tile_overlap,
+        merge=tile_merge,
+        merge_threshold=tile_merge_threshold
+    )
+
+def postprocess_options(
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0, description="Minimum confidence"),
+    class_threshold: Optional[List[str]] = Query(
+        None,
+        description="Minimum confidence of one label as `label:value`; repeat for more labels"
+    ),
+    merge: Optional[Literal["none", "nms", "wbf"]] = Query(
+        None,
+        description="Merge overlapping duplicates of the same class"
+    ),
+    merge_iou: Optional[float] = Query(None, gt=0.0, le=1.0),
+    containment: Optional[float] = Query(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="Drop boxes at least this much inside a more confident box of their class"
+    ),
+    max_per_class: Optional[int] = Query(None, ge=1),
+    max_detections: Optional[int] = Query(None, ge=1)
+) -> PostprocessOptions:
+    """Post-processing settings from query parameters"""
+    class_thresholds = None
+    if class_threshold:
+        class_thresholds = {}
+        for item in class_threshold:
+            label, _, value = item.rpartition(":")
+            try:
+                threshold = float(value)
+            except ValueError:
+                threshold = None
+            if not label or threshold is None or not 0.0 <= threshold <= 1.0:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid class_threshold '{item}', expected label:value with value in [0, 1]"
+                )
+            class_thresholds[label] = threshold
+    return PostprocessOptions(
+        min_confidence=min_confidence,
+        class_thresholds=class_thresholds,
+        merge=merge,
+        merge_iou=merge_iou,
+        containment=containment,
+        max_per_class=max_per_class,
+        max_detections=max_detections
+    )
+
+def model_query(
+    model: Optional[str] = Query(
+        None,
+        description="Model name; by default requests are split by the configured routing weights"
+    )
+) -> Optional[str]:
+    """Model named in the query, validated against the registry"""
+    if model is not None:
+        try:
+            model_registry.entry(model)
+        except UnknownModelError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return model
+
+def grouping_query(
+    project: Optional[str] = Query(
+        None,
+        min_length=1,
+        max_length=200,
+        description="Project the sheets belong to, for corpus analytics"
+    ),
+    tag: Optional[List[str]] = Query(None, description="Tags for corpus analytics (repeatable)")
+) -> Dict:
+    """Project and tags given with an upload"""
+    return {"project": project, "tags": list(dict.fromkeys(tag)) if tag else None}
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Guard admin endpoints with the X-Admin-Token header; disabled while ADMIN_TOKEN is unset"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid or missing admin token")
+
+def _busy_error(error: Exception) -> HTTPException:
+    """Build a fast rejection response for an overloaded worker"""
+    retry_after = getattr(error, "retry_after", settings.RETRY_AFTER_SECONDS)
+    return HTTPException(
+        status_code=settings.BUSY_STATUS_CODE,
+        detail=f"Server busy: {str(error)}",
+        headers={"Retry-After": str(retry_after)}
+    )
+
 @router.post("/upload", response_model=UploadResponse)
-async def upload_blueprint(file: UploadFile = File(...)):
+async def upload_blueprint(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    revision_of: Optional[str] = Query(
+        None,
+        description="Blueprint ID of the previous revision of this sheet, for incremental detection"
+    ),
+    grouping: Dict = Depends(grouping_query)
+):
     """
-    Upload a blueprint image
+    Upload a blueprint image or document
     
-    - **file**: Blueprint image file (JPG, PNG)
+    - **file**: Blueprint image (JPG, PNG) or multi-page PDF
+    - **revision_of**: Previous revision of the same sheet (images only)
+    - **project** / **tag**: Grouping for corpus analytics; a revision
+      inherits them from the previous revision unless given
     
     Returns unique blueprint ID for later detection/retrieval
     """
+    # Reject oversized bodies up front when the client declares their size
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        # Allow some room for the multipart envelope
+        limit = max(settings.MAX_UPLOAD_SIZE, settings.MAX_PDF_UPLOAD_SIZE)
+        if int(content_length) > limit + 64 * 1024:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds the {limit} byte upload limit"
+            )
+    
     # Validate file extension
     if not validate_file_extension(file.filename):
         raise HTTPException(
@@ -36,32 +196,225 @@ async def upload_blueprint(file: UploadFile = File(...)):
             detail=f"Invalid file extension. Allowed: {', '.join(settings.ALLOWED_EXTENSIONS)}"
         )
     
+    if revision_of is not None:
+        if not is_valid_blueprint_id(revision_of):
+            raise HTTPException(status_code=400, detail=f"Invalid blueprint ID: {revision_of}")
+        previous_path = await run_in_threadpool(get_blueprint_path, revision_of)
+        if not previous_path:
+            raise HTTPException(status_code=404, detail=f"Blueprint not found: {revision_of}")
+        if previous_path.suffix.lower() == ".pdf" or file.filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Revisions are supported for images only")
+        previous = await run_in_threadpool(results_store.get_blueprint, revision_of)
+        if previous is not None and grouping["project"] is None and grouping["tags"] is None:
+            grouping = {"project": previous["project"], "tags": previous["tags"] or None}
+    
     # Generate unique ID
     blueprint_id = generate_unique_id()
     
     try:
-        # Save file
-        file_path = save_upload_file(file, blueprint_id)
+        # Stream to disk, hashing and validating in the same pass
+        with stage_timer("upload_io"):
+            upload = await save_upload_stream(file, blueprint_id)
+        remember_file_hash(upload["path"], upload["sha256"])
+        
+        pages = None
+        if upload["format"] == "pdf":
+            try:
+                pages = await run_in_threadpool(count_pdf_pages, upload["path"])
+            except Exception as e:
+                upload["path"].unlink(missing_ok=True)
+                raise InvalidImageError(f"Unreadable PDF: {str(e)}")
+        
+        await run_in_threadpool(
+            register_upload,
+            blueprint_id,
+            upload["path"],
+            file.filename,
+            {**upload, "pages": pages, "revision_of": revision_of, **grouping}
+        )
+        
+        if settings.PYRAMID_ENABLED and pages is None:
+            # Viewer tiles; PDF page pyramids are built when first requested
+            background_tasks.add_task(pyramid_store.build_in_background, blueprint_id)
         
         return UploadResponse(
             id=blueprint_id,
             filename=file.filename,
+            size=upload["size"],
+            sha256=upload["sha256"],
+            width=upload["width"],
+            height=upload["height"],
+            pages=pages,
+            revision_of=revision_of,
+            project=grouping["project"],
+            tags=grouping["tags"] or [],
             message="File uploaded successfully"
         )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-@router.post("/detect/{blueprint_id}", response_model=DetectionResponse)
-async def detect_elements(blueprint_id: str):
+def _blueprint_items(ids):
+    """Batch items for already uploaded blueprints"""
+    for blueprint_id in ids:
+        async def resolve(blueprint_id=blueprint_id):
+            file_path = await run_in_threadpool(get_blueprint_path, blueprint_id)
+            if not file_path:
+                raise FileNotFoundError(f"Blueprint not found: {blueprint_id}")
+            return blueprint_id, file_path
+        yield blueprint_id, resolve
+
+def _archive_items(archive: zipfile.ZipFile, members: List[zipfile.ZipInfo], grouping: Dict):
+    """Batch items for images inside a ZIP, extracted only when their turn comes"""
+    for member in members:
+        async def resolve(member=member):
+            blueprint_id = generate_unique_id()
+            upload = await run_in_threadpool(extract_archive_image, archive, member, blueprint_id)
+            remember_file_hash(upload["path"], upload["sha256"])
+            await run_in_threadpool(
+                register_upload,
+                blueprint_id,
+                upload["path"],
+                member.filename,
+                {**upload, **grouping}
+            )
+            return blueprint_id, upload["path"]
+        yield member.filename, resolve
+
+@router.post(
+    "/detect/batch",
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": BatchDetectRequest.model_json_schema()},
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}}
+                    }
+                }
+            }
+        }
+    }
+)
+async def detect_batch(
+    request: Request,
+    tiling: TilingOptions = Depends(tiling_options),
+    model: Optional[str] = Depends(model_query),
+    postprocess: PostprocessOptions = Depends(postprocess_options),
+    grouping: Dict = Depends(grouping_query)
+):
+    """
+    Run detection on many blueprints, streaming each result as NDJSON
+    
+    - JSON body `{"ids": [...]}`: blueprints that were already uploaded
+    - multipart `file`: a ZIP of JPG/PNG images or PDFs; each becomes a new blueprint
+      (in the given **project** / **tag**)
+    
+    Either form is rejected with 413 above `MAX_BATCH_ITEMS` sheets.
+    
+    Each line is one sheet (`index`, `source`, `id`, `status`, detections or
+    `error`) in completion order, followed by a summary line. Results are
+    saved exactly as with `/detect/{blueprint_id}`, with the same
+    post-processing parameters applied to every sheet.
+    """
+    content_type = request.headers.get("content-type", "")
+    archive_path = None
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "read"):
+            raise HTTPException(status_code=400, detail="Missing ZIP file field 'file'")
+        try:
+            archive_path = await save_archive_stream(upload)
+            archive = await run_in_threadpool(zipfile.ZipFile, archive_path)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except (InvalidImageError, zipfile.BadZipFile) as e:
+            if archive_path is not None:
+                archive_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail=f"Invalid archive: {str(e)}")
+        members = list(iter_archive_images(archive))
+        if len(members) > settings.MAX_BATCH_ITEMS:
+            archive.close()
+            archive_path.unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archive holds {len(members)} images; at most {settings.MAX_BATCH_ITEMS} per batch"
+            )
+        items = _archive_items(archive, members, grouping)
+    else:
+        try:
+            body = BatchDetectRequest(**await request.json())
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Invalid batch request: {str(e)}")
+        if len(body.ids) > settings.MAX_BATCH_ITEMS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.MAX_BATCH_ITEMS} blueprints per batch"
+            )
+        archive = None
+        items = _blueprint_items(body.ids)
+    
+    async def lines():
+        try:
+            async for line in stream_batch_results(items, tiling, model=model, postprocess=postprocess):
+                yield line
+        finally:
+            if archive is not None:
+                archive.close()
+                archive_path.unlink(missing_ok=True)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post(
+    "/detect/{blueprint_id}",
+    response_model=DetectionResponse,
+    responses={200: {"content": ALTERNATE_CONTENT}}
+)
+async def detect_elements(
+    blueprint_id: str,
+    request: Request,
+    tiling: TilingOptions = Depends(tiling_options),
+    model: Optional[str] = Depends(model_query),
+    incremental: bool = Query(
+        True,
+        description="For a revision upload, only re-detect the regions that changed"
+    ),
+    postprocess: PostprocessOptions = Depends(postprocess_options)
+):
     """
     Run YOLO detection on uploaded blueprint
     
     - **blueprint_id**: Unique blueprint ID from upload
+    - **tiled**: Cut the sheet into overlapping tiles so small symbols survive
+    - **tile_size** / **tile_overlap** / **tile_merge**: Tiling overrides
+    - **model**: Model name (default: routed by the configured split)
+    - **incremental**: For a blueprint uploaded with `revision_of`, run the
+      model only on tiles that changed and reuse the previous detections
+      elsewhere; `revision` in the response lists the recomputed regions
+    - **min_confidence** / **class_threshold**: Confidence cut-offs, e.g.
+      `class_threshold=door:0.5` (repeatable); unset values use the server defaults
+    - **merge** / **merge_iou**: Class-aware NMS or weighted box fusion of duplicates
+    - **containment**: Drop boxes nested inside a more confident box of the same class
+    - **max_per_class** / **max_detections**: Keep only the most confident boxes
     
-    Returns detection results with bounding boxes and labels
+    Returns detection results with bounding boxes and labels. Send
+    `Accept: application/vnd.blueprint.columnar+json` for detections as
+    parallel `label` / `confidence` / `bbox` arrays, or
+    `application/msgpack` (`application/vnd.blueprint.columnar+msgpack`)
+    for MessagePack. For a PDF the
+    detections of each page are saved under `<blueprint_id>_pNNNN` and the
+    response lists the pages with their counts.
+    For large sheets prefer `POST /jobs/detect/{blueprint_id}`, which returns immediately.
     """
     # Get blueprint file path
-    file_path = get_blueprint_path(blueprint_id)
+    file_path = await run_in_threadpool(get_blueprint_path, blueprint_id)
     if not file_path:
         raise HTTPException(
             status_code=404,
@@ -69,26 +422,35 @@ async def detect_elements(blueprint_id: str):
         )
     
     try:
-        # Run inference
-        raw_detections = run_inference(file_path)
-        
-        # Calculate statistics
-        statistics = get_detection_statistics(raw_detections)
-        
-        # Process and save results
-        results = process_and_save_results(
+        # Straight to the bounded executor: a saturated server answers 503 at once
+        # instead of queuing the request behind background jobs
+        results = await detect_blueprint(
             blueprint_id,
-            raw_detections,
-            statistics
+            file_path,
+            tiling,
+            model=model,
+            incremental=incremental,
+            postprocess=postprocess
         )
         
-        return DetectionResponse(
-            id=blueprint_id,
-            total_detections=results["total_detections"],
-            detections=results["detections"],
-            message="Detection completed successfully"
-        )
+        # Detections come from our own pipeline; encode them without re-validating
+        with stage_timer("serialize"):
+            response = detection_response(
+                {
+                    "id": blueprint_id,
+                    "total_detections": results["total_detections"],
+                    "detections": results["detections"],
+                    "pages": results.get("pages"),
+                    "model": results.get("model"),
+                    "revision": results.get("revision"),
+                    "message": "Detection completed successfully"
+                },
+                request.headers.get("accept")
+            )
+        return response
     
+    except (ExecutorBusyError, QueueFullError) as e:
+        raise _busy_error(e)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -97,23 +459,180 @@ async def detect_elements(blueprint_id: str):
             detail=f"Detection failed: {str(e)}"
         )
 
-@router.get("/results/{blueprint_id}", response_model=ResultsResponse)
-async def get_results(blueprint_id: str):
+@router.post("/jobs/detect/{blueprint_id}", response_model=JobResponse, status_code=202)
+async def submit_detection_job(
+    blueprint_id: str,
+    tiling: TilingOptions = Depends(tiling_options),
+    model: Optional[str] = Depends(model_query),
+    incremental: bool = Query(
+        True,
+        description="For a revision upload, only re-detect the regions that changed"
+    ),
+    postprocess: PostprocessOptions = Depends(postprocess_options)
+):
+    """
+    Queue detection on an uploaded blueprint and return immediately
+    
+    - **blueprint_id**: Unique blueprint ID from upload
+    - **incremental** and post-processing parameters: See `POST /detect/{blueprint_id}`
+    
+    Poll `GET /jobs/{job_id}` or stream `GET /jobs/{job_id}/events` for progress
+    """
+    if not await run_in_threadpool(get_blueprint_path, blueprint_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Blueprint not found: {blueprint_id}"
+        )
+    
+    try:
+        return await job_queue.submit(
+            blueprint_id,
+            tiling,
+            model=model,
+            incremental=incremental,
+            postprocess=postprocess
+        )
+    except JobQueueFullError as e:
+        raise _busy_error(e)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get detection job state
+    
+    - **job_id**: Job ID from submission
+    
+    Returns status (queued/running/done/failed) and progress
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream detection job progress as server-sent events
+    
+    - **job_id**: Job ID from submission
+    
+    Sends the current state, then every update until the job is done or failed
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    
+    queue = job_queue.subscribe(job_id)
+    
+    async def events():
+        try:
+            current = await job_queue.get(job_id)
+            yield f"event: {current['status']}\ndata: {json.dumps(current)}\n\n"
+            idle = 0.0
+            while current["status"] not in TERMINAL_STATES:
+                try:
+                    current = await asyncio.wait_for(queue.get(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    # The job may run in another server process, whose updates only reach the database
+                    latest = await job_queue.get(job_id)
+                    if latest is None or latest["updated_at"] == current["updated_at"]:
+                        idle += settings.JOB_POLL_INTERVAL
+                        if idle >= 15:
+                            # Keep proxies from closing an idle stream
+                            yield ": keep-alive\n\n"
+                            idle = 0.0
+                        continue
+                    current = latest
+                idle = 0.0
+                yield f"event: {current['status']}\ndata: {json.dumps(current)}\n\n"
+        finally:
+            job_queue.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def viewport_query(
+    bbox: Optional[str] = Query(
+        None,
+        description="Viewport as x1,y1,x2,y2 in image pixels; only boxes inside are returned"
+    )
+) -> Optional[Tuple[float, float, float, float]]:
+    """Viewport rectangle from the bbox query parameter"""
+    if bbox is None:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox must be four numbers: x1,y1,x2,y2")
+    if x2 < x1 or y2 < y1:
+        raise HTTPException(status_code=422, detail="bbox must satisfy x1 <= x2 and y1 <= y2")
+    return x1, y1, x2, y2
+
+@router.get(
+    "/results/{blueprint_id}",
+    response_model=ResultsResponse,
+    responses={200: {"content": ALTERNATE_CONTENT}}
+)
+async def get_results(
+    blueprint_id: str,
+    request: Request,
+    label: Optional[List[str]] = Query(None, description="Only these labels (repeatable)"),
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    viewport: Optional[Tuple[float, float, float, float]] = Depends(viewport_query),
+    scale: Optional[float] = Query(
+        None,
+        gt=0.0,
+        description="Level of detail: screen pixels per image pixel; boxes too small to see are left out"
+    )
+):
     """
     Get detection results for a blueprint
     
-    - **blueprint_id**: Unique blueprint ID
+    - **blueprint_id**: Unique blueprint ID (or `<id>_pNNNN` for a PDF page)
+    - **label** / **min_confidence**: Filter detections
+    - **offset** / **limit**: Page through detections
+    - **bbox**: Viewport `x1,y1,x2,y2`; answered from a spatial index
+    - **scale**: Current zoom, drops boxes smaller than a few screen pixels
     
-    Returns saved detection results and statistics
+    Returns saved detection results and statistics. Statistics always cover
+    every detection; `matched` counts the detections passing the filters.
+    The Accept header selects the encoding (see `POST /detect/{blueprint_id}`).
     """
+    min_box_size = settings.LOD_MIN_BOX_PIXELS / scale if scale else None
     try:
-        results = load_results(blueprint_id)
-        
-        return ResultsResponse(
-            id=results["id"],
-            detections=results["detections"],
-            statistics=results["statistics"]
+        results = await run_in_threadpool(
+            load_results,
+            blueprint_id,
+            label,
+            min_confidence,
+            offset,
+            limit,
+            viewport,
+            min_box_size
         )
+        
+        with stage_timer("serialize"):
+            response = detection_response(
+                {
+                    "id": results["id"],
+                    "detections": results["detections"],
+                    "statistics": results["statistics"],
+                    "pages": results.get("pages"),
+                    "total_detections": results["total_detections"],
+                    "model": results.get("model"),
+                    "revision": results.get("revision"),
+                    "matched": results["matched"],
+                    "offset": offset,
+                    "limit": limit
+                },
+                request.headers.get("accept")
+            )
+        return response
     except FileNotFoundError:
         raise HTTPException(
             status_code=404,
@@ -125,29 +644,339 @@ async def get_results(blueprint_id: str):
             detail=f"Failed to load results: {str(e)}"
         )
 
+def _immutable_file_response(request: Request, file_path: Path, etag: Optional[str]) -> Response:
+    """Serve a file that never changes, answering conditional requests with 304"""
+    headers = {"Cache-Control": f"public, max-age={settings.TILE_CACHE_MAX_AGE}, immutable"}
+    if etag is not None:
+        headers["ETag"] = etag
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+    # FileResponse answers Range requests with 206 partial content
+    return FileResponse(file_path, headers=headers)
+
 @router.get("/blueprints/{blueprint_id}")
-async def get_blueprint_image(blueprint_id: str):
+async def get_blueprint_image(blueprint_id: str, request: Request):
     """
     Get uploaded blueprint image
     
     - **blueprint_id**: Unique blueprint ID
     
-    Returns the blueprint image file
+    Returns the original blueprint file. Supports `Range` requests and
+    `If-None-Match`; for viewing, prefer the tiles of `/blueprints/{id}/pyramid`.
     """
-    file_path = get_blueprint_path(blueprint_id)
+    file_path = await run_in_threadpool(get_blueprint_path, blueprint_id)
     if not file_path:
         raise HTTPException(
             status_code=404,
             detail=f"Blueprint image not found: {blueprint_id}"
         )
     
-    return FileResponse(file_path)
+    blueprint = await run_in_threadpool(results_store.get_blueprint, blueprint_id)
+    etag = f'"{blueprint["sha256"]}"' if blueprint and blueprint["sha256"] else None
+    return _immutable_file_response(request, file_path, etag)
+
+@router.get("/blueprints/{blueprint_id}/pyramid")
+async def get_blueprint_pyramid(blueprint_id: str):
+    """
+    Get the deep-zoom tile pyramid of a blueprint
+    
+    - **blueprint_id**: Unique blueprint ID, or `<id>_pNNNN` for a page of a PDF
+    
+    Returns width, height, tile_size, levels (level 0 fits in one tile, the
+    last level is full resolution), tile format and the tile URL template.
+    The pyramid is built on first request if the background build has not
+    finished yet.
+    """
+    try:
+        manifest = await run_in_threadpool(pyramid_store.ensure, blueprint_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build pyramid: {str(e)}")
+    
+    return {
+        "id": blueprint_id,
+        **manifest,
+        "tile_url": f"/blueprints/{blueprint_id}/tiles/{{level}}/{{col}}_{{row}}.{manifest['format']}"
+    }
+
+@router.get("/blueprints/{blueprint_id}/tiles/{level}/{tile}")
+async def get_blueprint_tile(blueprint_id: str, level: int, tile: str, request: Request):
+    """
+    Get one tile of a blueprint's image pyramid
+    
+    - **blueprint_id**: Unique blueprint ID, or `<id>_pNNNN` for a page of a PDF
+    - **level**: Pyramid level
+    - **tile**: `<col>_<row>.<format>`
+    
+    Tiles are immutable and served with a strong ETag and a long Cache-Control lifetime
+    """
+    name, _, extension = tile.partition(".")
+    col, _, row = name.partition("_")
+    if not (col.isdigit() and row.isdigit()):
+        raise HTTPException(status_code=404, detail=f"Invalid tile name: {tile}")
+    
+    try:
+        manifest = await run_in_threadpool(pyramid_store.ensure, blueprint_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build pyramid: {str(e)}")
+    
+    tile_path = pyramid_store.tile_path(blueprint_id, manifest, level, int(col), int(row))
+    if tile_path is None or extension != manifest["format"]:
+        raise HTTPException(status_code=404, detail=f"Tile not found: {level}/{tile}")
+    
+    etag = f'"{manifest["etag"]}-{manifest["tile_size"]}-{level}-{col}-{row}"'
+    return _immutable_file_response(request, tile_path, etag)
+
+@router.get("/blueprints/{blueprint_id}/pages/{page}")
+async def get_blueprint_page(
+    blueprint_id: str,
+    page: int,
+    dpi: Optional[int] = Query(None, ge=36, le=600, description="Render resolution")
+):
+    """
+    Render one page of a PDF blueprint as PNG
+    
+    - **blueprint_id**: Unique blueprint ID
+    - **page**: 1-based page number
+    
+    At the default DPI the image matches the coordinates of the page's detections
+    """
+    file_path = await run_in_threadpool(get_blueprint_path, blueprint_id)
+    if not file_path or file_path.suffix.lower() != ".pdf":
+        raise HTTPException(
+            status_code=404,
+            detail=f"PDF blueprint not found: {blueprint_id}"
+        )
+    
+    def render():
+        import cv2
+        return cv2.imencode(".png", render_pdf_page(file_path, page - 1, dpi))
+    
+    try:
+        ok, encoded = await run_in_threadpool(render)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    if not ok:
+        raise HTTPException(status_code=500, detail="Failed to encode page image")
+    return Response(content=encoded.tobytes(), media_type="image/png")
+
+@router.get("/batching/metrics")
+async def batching_metrics(model: str = Query(DEFAULT_MODEL, description="Model name")):
+    """Micro-batching metrics of a model (batch sizes, queue depth, latency percentiles)"""
+    try:
+        loaded = model_registry.entry(model).current
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # Before the first load the default model's scheduler is the global one
+    scheduler = loaded.scheduler if loaded else (batch_scheduler if model == DEFAULT_MODEL else None)
+    return {
+        "enabled": settings.BATCH_ENABLED,
+        "model": model,
+        **(scheduler.get_metrics() if scheduler else {})
+    }
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Detection cache hit/miss counters and tier usage, and the decoded image cache"""
+    return {**detection_cache.get_stats(), "decoded_images": decoded_image_cache.get_stats()}
+
+@router.get("/storage/stats")
+async def storage_stats():
+    """Tracked storage per kind (uploads, tile pyramids, results) with retention limits"""
+    return await run_in_threadpool(retention_manager.get_stats)
+
+def analytics_scope(
+    project: Optional[str] = Query(None, description="Only this project"),
+    tag: Optional[str] = Query(None, description="Only sheets with this tag")
+) -> str:
+    """Analytics scope named in the query: a project, a tag or the whole corpus"""
+    if project is not None and tag is not None:
+        raise HTTPException(status_code=400, detail="Filter by project or by tag, not both")
+    return scope_key(project, tag)
+
+@router.get("/analytics")
+async def get_analytics(
+    scope: str = Depends(analytics_scope),
+    day: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="One UTC day, YYYY-MM-DD"),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="One UTC month, YYYY-MM"),
+    label: Optional[List[str]] = Query(None, description="Only these labels (repeatable)")
+):
+    """
+    Symbol counts, average confidence and confidence/box-size histograms over stored results
+    
+    - **project** / **tag**: Scope (default: all sheets)
+    - **day** / **month**: Period the results were stored in (default: all time)
+    - **label**: Only report these labels
+    
+    Answered from aggregates kept up to date as results are saved, so the
+    cost does not grow with the number of sheets.
+    """
+    if day is not None and month is not None:
+        raise HTTPException(status_code=400, detail="Give a day or a month, not both")
+    period = f"day:{day}" if day else f"month:{month}" if month else "all"
+    return await run_in_threadpool(results_store.analytics.summary, scope, period, label)
+
+@router.get("/analytics/timeseries")
+async def get_analytics_timeseries(
+    scope: str = Depends(analytics_scope),
+    granularity: Literal["day", "month"] = Query("day"),
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}(-\d{2})?$", description="First day or month"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}(-\d{2})?$", description="Last day or month"),
+    label: Optional[str] = Query(None, description="One label (default: all)")
+):
+    """
+    Sheets and detections per day or month
+    
+    - **project** / **tag**: Scope (default: all sheets)
+    - **start** / **end**: Inclusive range of periods
+    """
+    return await run_in_threadpool(
+        results_store.analytics.timeseries,
+        scope,
+        granularity,
+        start,
+        end,
+        label or ALL_LABELS
+    )
+
+@router.get("/analytics/projects")
+async def list_analytics_projects():
+    """Every project with its sheet and detection counts"""
+    return await run_in_threadpool(results_store.analytics.list_scopes, "project")
+
+@router.get("/analytics/tags")
+async def list_analytics_tags():
+    """Every tag with its sheet and detection counts"""
+    return await run_in_threadpool(results_store.analytics.list_scopes, "tag")
+
+@router.post("/analytics/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_analytics():
+    """Recompute the corpus aggregates from the stored results (blocks result writes meanwhile)"""
+    return await run_in_threadpool(results_store.analytics.rebuild)
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, queue depths, in-flight work and cache hits"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Some values are read from SQLite; keep that off the event loop
+    body = await run_in_threadpool(metrics_registry.render)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @router.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; status is "healthy" only once the default model is ready"""
+    model = model_registry.describe()
     return {
-        "status": "healthy",
+        "status": "healthy" if model_registry.ready else (
+            "starting" if model["state"] == MODEL_LOADING else "unhealthy"
+        ),
         "app_name": settings.APP_NAME,
-        "version": settings.APP_VERSION
+        "version": settings.APP_VERSION,
+        "model": model,
+        "inference": inference_executor.get_metrics(),
+        "process": thread_info()
+    }
+
+@router.get("/health/live")
+async def liveness(request: Request):
+    """Liveness probe: the process is up and serving requests"""
+    startup = getattr(request.app.state, "startup", None)
+    return {
+        "status": "alive",
+        "uptime_seconds": time.time() - startup["started_at"] if startup else 0.0
+    }
+
+@router.get("/health/ready")
+async def readiness(request: Request):
+    """
+    Readiness probe: 200 once the model is loaded and warmed up, 503 before
+    that or if loading failed
+    """
+    ready = model_registry.ready
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "model": model_registry.describe(),
+        "startup": getattr(request.app.state, "startup", None)
+    }
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@router.get("/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    """Registered models with their loaded version, memory use and routing weight"""
+    return {
+        "models": model_registry.list_models(),
+        "routing": model_registry.routing,
+        "memory_budget_bytes": model_registry.memory_budget
     }
+
+@router.post("/models/{name}/reload", dependencies=[Depends(require_admin)])
+async def reload_model(name: str, body: Optional[ModelReloadRequest] = None):
+    """
+    Load new weights for a model and swap them in without dropping requests
+    
+    - **name**: Model name; a new name registers a new model (requires `path`)
+    - **path**: Weights file inside MODEL_DIR (default: the model's current file)
+    - **backend**: Inference backend to switch to, e.g. `onnxruntime-int8` (default: the model's current one)
+    
+    Requests already running finish on the old version
+    """
+    path = None
+    if body is not None and body.path:
+        path = (settings.MODEL_DIR / body.path).resolve()
+        if not path.is_relative_to(settings.MODEL_DIR.resolve()):
+            raise HTTPException(status_code=400, detail="Model path must be inside MODEL_DIR")
+    backend = body.backend if body is not None else None
+    if backend is not None and backend not in BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown inference backend: {backend}. Available: {', '.join(BACKENDS)}"
+        )
+    try:
+        if path is None:
+            model_registry.entry(name)
+        return await run_in_threadpool(model_registry.reload, name, path, backend)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {str(e)}")
+
+@router.post("/models/{name}/unload", dependencies=[Depends(require_admin)])
+async def unload_model(name: str):
+    """
+    Unload a model to free its memory; it is loaded again on its next use
+    
+    - **name**: Model name (the default model cannot be unloaded)
+    """
+    if name == DEFAULT_MODEL:
+        raise HTTPException(status_code=400, detail="The default model cannot be unloaded")
+    try:
+        unloaded = await run_in_threadpool(model_registry.unload, name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not unloaded:
+        raise HTTPException(status_code=409, detail=f"Model {name} is not loaded or is in use")
+    return model_registry.describe(name)
+
+@router.put("/models/routing", dependencies=[Depends(require_admin)])
+async def set_model_routing(body: ModelRoutingRequest):
+    """
+    Set the weighted split (A/B test) for requests that do not name a model
+    
+    A blueprint keeps getting the same model while the weights are unchanged
+    """
+    try:
+        model_registry.set_routing(body.weights)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"routing": model_registry.routing}
@@ -0,0 +1,111 @@
+"""
+Response encodings for detection payloads
+
+Detection results are produced by the server itself, so they are encoded
+straight from dicts instead of being validated again by a response model.
+Clients pick the encoding with the Accept header:
+
+- ``application/json`` (default): the documented response schema
+- ``application/vnd.blueprint.columnar+json``: ``detections`` as parallel
+  arrays ``{"label": [...], "confidence": [...], "bbox": [[x, y, w, h], ...]}``
+- ``application/msgpack`` / ``application/vnd.blueprint.columnar+msgpack``:
+  the same two layouts as MessagePack
+"""
+from typing import Dict, List, Optional, Tuple
+import msgpack
+import orjson
+from fastapi.responses import Response
+
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.blueprint.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+COLUMNAR_MSGPACK_MEDIA_TYPE = "application/vnd.blueprint.columnar+msgpack"
+
+# Accepted media type -> (encoding, columnar)
+ENCODINGS = {
+    JSON_MEDIA_TYPE: ("json", False),
+    COLUMNAR_JSON_MEDIA_TYPE: ("json", True),
+    MSGPACK_MEDIA_TYPE: ("msgpack", False),
+    "application/x-msgpack": ("msgpack", False),
+    COLUMNAR_MSGPACK_MEDIA_TYPE: ("msgpack", True)
+}
+
+# OpenAPI description of the alternative encodings, for ``responses=``
+ALTERNATE_CONTENT = {
+    COLUMNAR_JSON_MEDIA_TYPE: {},
+    MSGPACK_MEDIA_TYPE: {},
+    COLUMNAR_MSGPACK_MEDIA_TYPE: {}
+}
+
+def dumps_json(payload) -> bytes:
+    """Encode a payload as JSON with orjson (numpy scalars and arrays allowed)"""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _msgpack_default(value):
+    """Encode numpy scalars and arrays, which msgpack does not know"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def negotiate(accept: Optional[str]) -> Tuple[str, bool]:
+    """
+    Choose the response encoding from an Accept header
+
+    Args:
+        accept: Accept header value (None or ``*/*`` means JSON)
+
+    Returns:
+        (media type, columnar); JSON rows if nothing supported is acceptable
+    """
+    best, best_quality = JSON_MEDIA_TYPE, 0.0
+    for position, item in enumerate((accept or "").split(",")):
+        media_type, *parameters = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        # Earlier entries win ties, and the plain JSON default wins over wildcards
+        if media_type.lower() in ENCODINGS and quality > best_quality:
+            best, best_quality = media_type.lower(), quality
+    return best, ENCODINGS[best][1]
+
+def columnar_detections(detections: List[Dict]) -> Dict[str, List]:
+    """
+    Detections as parallel arrays
+
+    Args:
+        detections: Detections in the list-of-dicts API format
+
+    Returns:
+        ``{"label": [...], "confidence": [...], "bbox": [...]}``
+    """
+    return {
+        "label": [detection["label"] for detection in detections],
+        "confidence": [detection["confidence"] for detection in detections],
+        "bbox": [detection["bbox"] for detection in detections]
+    }
+
+def detection_response(payload: Dict, accept: Optional[str] = None, status_code: int = 200) -> Response:
+    """
+    Encode a detection payload in the encoding the client asked for
+
+    Args:
+        payload: Response fields in schema order, ``detections`` as dicts
+        accept: Accept header of the request
+        status_code: HTTP status
+
+    Returns:
+        Encoded response with ``Vary: Accept``
+    """
+    media_type, columnar = negotiate(accept)
+    if columnar:
+        payload = {**payload, "detections": columnar_detections(payload["detections"])}
+    if ENCODINGS[media_type][0] == "msgpack":
+        body = msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    else:
+        body = dumps_json(payload)
+    return Response(body, status_code=status_code, media_type=media_type, headers={"Vary": "Accept"})
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Optional, Dict
 
 class Settings(BaseSettings):
     # Application
@@ -10,6 +11,8 @@ class Settings(BaseSettings):
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    SERVER_WORKERS: int = 1  # Processes; serve.py forks them after loading the model once
+    CPU_THREADS: int = 0  # Thread budget split across SERVER_WORKERS, 0 = every CPU available
     
     # Paths
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
@@ -21,10 +24,134 @@ class Settings(BaseSettings):
     MODEL_PATH: Path = MODEL_DIR / "best.pt"  # Your YOLO model file
     CONFIDENCE_THRESHOLD: float = 0.25
     IOU_THRESHOLD: float = 0.45
+    MODEL_IMGSZ: int = 640  # Input size used when exporting ONNX/OpenVINO artifacts
+    
+    # Inference backend: "pytorch", "onnxruntime", "onnxruntime-int8" or "openvino"
+    INFERENCE_BACKEND: str = "pytorch"
+    INFERENCE_THREADS: int = 0  # Intra-op threads per process, 0 = share of CPU_THREADS
+    INFERENCE_INTEROP_THREADS: int = 1
+    OPENVINO_PERFORMANCE_HINT: str = "LATENCY"  # or "THROUGHPUT"
+    QUANTIZATION_MODE: str = "dynamic"  # INT8 for "onnxruntime-int8": "dynamic" or "static" (calibrated)
+    QUANTIZATION_CALIBRATION_DIR: Optional[Path] = None  # Sample sheets for "static", not the evaluation set
+    QUANTIZATION_CALIBRATION_IMAGES: int = 100  # At most this many calibration sheets
+    WARMUP_ON_LOAD: bool = True
+    MODEL_LOAD_IN_BACKGROUND: bool = True  # Accept traffic while the model loads; see /health/ready
+    
+    # Model registry (MODEL_PATH is the "default" model)
+    MODELS: Dict[str, str] = {}  # Extra models, name -> weights path (relative to MODEL_DIR), as JSON
+    MODEL_BACKENDS: Dict[str, str] = {}  # Backend per model name, e.g. {"candidate": "onnxruntime-int8"}
+    MODEL_ROUTING: Dict[str, float] = {}  # Split for requests without ?model=, e.g. {"default": 9, "candidate": 1}
+    MODEL_WATCH_INTERVAL: float = 5.0  # Seconds between weight file checks, 0 = no hot reload
+    MODEL_MEMORY_BUDGET_MB: int = 4096  # Idle models are unloaded to stay under this
+    MODEL_IDLE_UNLOAD_SECONDS: float = 1800.0  # Unload non-default models unused this long, 0 = never
+    ADMIN_TOKEN: Optional[str] = None  # Required in X-Admin-Token by admin endpoints, which are off while unset
+
+    # Micro-batching
+    BATCH_ENABLED: bool = True
+    BATCH_MAX_SIZE: int = 8  # Max images per model.predict call
+    BATCH_MAX_WAIT_MS: float = 10.0  # How long the first request waits for company
+    BATCH_QUEUE_SIZE: int = 64  # Pending requests before new ones are rejected
+    BATCH_METRICS_WINDOW: int = 1000  # Batches/requests kept for metrics
+
+    # Inference execution
+    INFERENCE_EXECUTOR: str = "thread"  # "thread" or "process"
+    INFERENCE_WORKERS: int = 4  # Raised to BATCH_MAX_SIZE in thread mode so batches can fill
+    MAX_INFLIGHT_INFERENCES: int = 16  # Running + waiting before requests are rejected
+    BUSY_STATUS_CODE: int = 503  # 429 or 503
+    RETRY_AFTER_SECONDS: int = 5
+
+    # Preprocessing (decoded once, handed to the model as arrays)
+    PREPROCESS_COLOR_MODE: str = "color"  # "color", "gray" or "binary"; line-art sheets lose little in gray
+    PREPROCESS_BINARY_THRESHOLD: int = 0  # Ink/paper cut-off for "binary", 0 = Otsu per sheet
+    PREPROCESS_MAX_SIDE: int = 0  # Whole-sheet inference on a copy at most this large, 0 = full size (tiles always full size)
+    DECODE_CACHE_BYTES: int = 512 * 1024 * 1024  # Decoded sheets kept in memory per process, 0 = off
+
+    # Tiled inference (defaults, overridable per request)
+    TILE_SIZE: int = 1280
+    TILE_OVERLAP: float = 0.2
+    TILE_MERGE: str = "nms"  # "nms", "wbf" or "none"
+    TILE_MERGE_THRESHOLD: float = 0.5
+    TILE_BATCH_SIZE: int = 8  # Tiles per model call
+
+    # Revision (incremental re-detection of a changed sheet)
+    REVISION_DIFF_MAX_SIDE: int = 2048  # Sheets are aligned and compared at most this large
+    REVISION_INK_THRESHOLD: int = 160  # Pixels darker than this count as ink when comparing revisions
+    REVISION_MIN_REGION_PIXELS: int = 12  # Changed blobs smaller than this (at diff resolution) are noise
+    REVISION_REGION_PADDING: int = 32  # Pixels of context added around each changed region
+    REVISION_MIN_ALIGNMENT: float = 0.2  # Phase-correlation peak below which the sheets are not comparable
+    REVISION_MAX_RECOMPUTE_FRACTION: float = 0.6  # Above this share of tiles the whole sheet is re-detected
+
+    # Post-processing (defaults, overridable per request)
+    POSTPROCESS_MIN_CONFIDENCE: float = 0.25
+    POSTPROCESS_CLASS_THRESHOLDS: Dict[str, float] = {}  # Label -> min confidence, as JSON
+    POSTPROCESS_MERGE: str = "none"  # Duplicates of one class: "none", "nms" or "wbf"
+    POSTPROCESS_MERGE_IOU: float = 0.6
+    POSTPROCESS_CONTAINMENT: float = 0.0  # Drop boxes this much inside a more confident box of their class, 0 = off
+    POSTPROCESS_MAX_PER_CLASS: int = 0  # 0 = no cap
+    POSTPROCESS_MAX_DETECTIONS: int = 0  # 0 = no cap
+
+    # Detection cache
+    CACHE_ENABLED: bool = True
+    CACHE_DIR: Path = RESULTS_DIR / "cache"
+    CACHE_MEMORY_BYTES: int = 256 * 1024 * 1024  # 256MB
+    CACHE_DISK_BYTES: int = 2 * 1024 * 1024 * 1024  # 2GB
+
+    # Results store
+    RESULTS_DB_PATH: Path = RESULTS_DIR / "results.db"
+    LOD_MIN_BOX_PIXELS: float = 3.0  # Boxes smaller than this on screen are left out
+    ANALYTICS_ENABLED: bool = True  # Corpus aggregates kept up to date on writes; rebuild after re-enabling
+    
+    # Deep-zoom tile pyramids
+    PYRAMID_ENABLED: bool = True  # Build after upload (otherwise on first tile request)
+    PYRAMID_DIR: Path = UPLOAD_DIR / "pyramids"
+    PYRAMID_TILE_SIZE: int = 256
+    PYRAMID_FORMAT: str = "jpg"  # "jpg", "png" or "webp"
+    PYRAMID_JPEG_QUALITY: int = 85
+    TILE_CACHE_MAX_AGE: int = 365 * 24 * 3600  # Tiles never change once built
+    
+    # Storage retention (oldest evicted first, in batches, by a background thread)
+    RETENTION_ENABLED: bool = True
+    RETENTION_DB_PATH: Path = RESULTS_DIR / "retention.db"
+    # Kind -> max age, as JSON; missing = kept. Uploads are kept by default (opt in with e.g. {"upload": 720})
+    RETENTION_MAX_AGE_HOURS: Dict[str, float] = {"pyramid": 7 * 24}  # Pyramids are rebuilt on demand
+    RETENTION_MAX_BYTES: Dict[str, int] = {  # Kind -> quota, as JSON; missing = unbounded
+        "upload": 20 * 1024 * 1024 * 1024,  # 20GB
+        "pyramid": 10 * 1024 * 1024 * 1024,  # 10GB
+        "results": 2 * 1024 * 1024 * 1024  # 2GB, estimated from detection counts
+    }
+    RETENTION_INTERVAL: float = 60.0  # Seconds between retention passes
+    RETENTION_BATCH_SIZE: int = 200  # Max items evicted per kind and step
+    
+    # Detection jobs
+    JOBS_DB_PATH: Path = RESULTS_DIR / "jobs.db"
+    JOB_WORKERS: int = 4  # Jobs processed concurrently
+    JOB_QUEUE_MAX: int = 256  # Queued jobs before submissions are rejected
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds between checks for jobs queued elsewhere
+    
+    # Observability
+    METRICS_ENABLED: bool = True  # Prometheus text format at /metrics
+    SERVER_TIMING_ENABLED: bool = False  # Always send Server-Timing; otherwise only on "X-Server-Timing: 1"
+    PROFILE_SLOW_REQUESTS: bool = False
+    PROFILE_SLOW_REQUEST_SECONDS: float = 2.0  # Requests running longer than this are sampled
+    PROFILE_SAMPLE_INTERVAL: float = 0.005
+    PROFILE_DIR: Path = RESULTS_DIR / "profiles"
     
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
-    ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png"}
+    MAX_IMAGE_PIXELS: int = 250_000_000  # Reject decompression bombs
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB
+    
+    # PDF documents
+    MAX_PDF_UPLOAD_SIZE: int = 500 * 1024 * 1024  # 500MB
+    MAX_PDF_PAGES: int = 500
+    PDF_DPI: int = 150  # Rasterization resolution
+    PDF_PREFETCH_PAGES: int = 2  # Pages rendered ahead of (and detected alongside) the current one
+    
+    # Batch detection
+    MAX_ARCHIVE_SIZE: int = 1024 * 1024 * 1024  # 1GB
+    MAX_BATCH_ITEMS: int = 1000  # Sheets per batch request
+    BATCH_DETECT_CONCURRENCY: int = 4  # Sheets in flight per batch request
+    ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".pdf"}
     
     # CORS
     CORS_ORIGINS: list = [
@@ -43,6 +170,8 @@ class Settings(BaseSettings):
         self.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         self.RESULTS_DIR.mkdir(parents=True, exist_ok=True)
         self.MODEL_DIR.mkdir(parents=True, exist_ok=True)
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        self.PYRAMID_DIR.mkdir(parents=True, exist_ok=True)
 
 # Global settings instance
 settings = Settings()
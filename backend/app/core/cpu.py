@@ -0,0 +1,99 @@
+import os
+import sys
+from typing import Optional, Dict, Tuple
+from core.config import settings
+
+# Native thread pools that read their size from the environment when first used
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "OPENCV_FOR_THREADS_NUM")
+
+# (intra-op, inter-op) threads of this process once a budget has been applied
+_applied: Optional[Tuple[int, int]] = None
+
+def available_cpus() -> int:
+    """
+    CPUs this process may use
+
+    Takes the smaller of the CPU affinity mask and the cgroup v2 CPU quota,
+    so a container limited with ``--cpus`` is not mistaken for the host.
+
+    Returns:
+        Number of usable CPUs (at least 1)
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = open("/sys/fs/cgroup/cpu.max").read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+def thread_budget(workers: int = 1, index: int = 0, total: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Share of a CPU thread budget for one of several server processes
+
+    Each process gets ``INFERENCE_INTEROP_THREADS`` inter-op threads (YOLO
+    graphs are a chain of layers, so more rarely helps) and an equal share
+    of the rest for intra-op parallelism; the first processes take the
+    remainder.
+
+    Args:
+        workers: Server processes sharing the budget
+        index: Which process (0-based)
+        total: Thread budget (default CPU_THREADS, or every available CPU)
+
+    Returns:
+        (intra-op threads, inter-op threads)
+    """
+    workers = max(1, workers)
+    total = total or settings.CPU_THREADS or available_cpus()
+    share = total // workers + (1 if index < total % workers else 0)
+    interop = max(1, settings.INFERENCE_INTEROP_THREADS)
+    intra = settings.INFERENCE_THREADS or max(1, share - (interop - 1))
+    return intra, interop
+
+def apply_thread_budget(intra: int, interop: int):
+    """
+    Size the thread pools of this process
+
+    Sets the environment read by OpenMP/MKL/OpenBLAS/OpenCV when they start
+    (so it must run before the model is loaded to cover them) and the settings
+    the inference backends pass to their runtime. Libraries that are
+    already imported are resized directly.
+
+    Args:
+        intra: Intra-op threads
+        interop: Inter-op threads
+    """
+    global _applied
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(intra)
+    settings.INFERENCE_THREADS = intra
+    settings.INFERENCE_INTEROP_THREADS = interop
+
+    # Never import them here: the heavy libraries stay lazy
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(intra)
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        cv2.setNumThreads(intra)
+    _applied = (intra, interop)
+
+def ensure_thread_budget():
+    """Apply this process's share of the budget unless a supervisor already did"""
+    if _applied is None:
+        apply_thread_budget(*thread_budget(settings.SERVER_WORKERS))
+
+def thread_info() -> Dict:
+    """Thread budget of this process, for health checks"""
+    intra, interop = _applied or (settings.INFERENCE_THREADS, settings.INFERENCE_INTEROP_THREADS)
+    return {
+        "pid": os.getpid(),
+        "cpus_available": available_cpus(),
+        "intra_op_threads": intra,
+        "inter_op_threads": interop
+    }
@@ -0,0 +1,159 @@
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional, List, Dict, Callable
+
+from core.config import settings
+
+# hook(report) receives {"method", "path", "duration", "interval", "samples", "stacks"}
+ProfileHook = Callable[[Dict], None]
+
+def _collapse(frame) -> str:
+    """Collapsed stack (root first, ';'-separated), the flame graph input format"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class _Trace:
+    """A request being watched by the profiler"""
+
+    __slots__ = ("method", "path", "started", "stacks", "samples")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler that only runs while a request is slow
+
+    Once any request has been running for ``threshold`` seconds a sampler
+    thread wakes up and records the stacks of every thread at ``interval``.
+    Requests are served from the event loop and several worker threads, so
+    all threads are sampled and each slow request gets the samples taken
+    while it was slow. When a slow request finishes its collapsed stacks are
+    passed to the hooks; the default hook writes a flame-graph-ready file to
+    PROFILE_DIR. Nothing is sampled while every request is fast.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        interval: Optional[float] = None,
+        output_dir: Optional[Path] = None
+    ):
+        """
+        Initialize the profiler
+
+        Args:
+            threshold: Seconds after which a request is profiled (default from settings)
+            interval: Seconds between samples (default from settings)
+            output_dir: Where the default hook writes profiles (default from settings)
+        """
+        self.threshold = threshold or settings.PROFILE_SLOW_REQUEST_SECONDS
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        self.output_dir = output_dir or settings.PROFILE_DIR
+        self.hooks: List[ProfileHook] = [self.write_profile]
+
+        self._active: Dict[int, _Trace] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_id = 0
+
+    def add_hook(self, hook: ProfileHook):
+        """Receive the report of every slow request"""
+        self.hooks.append(hook)
+
+    def begin(self, method: str, path: str) -> int:
+        """Start watching a request; returns a token for ``end``"""
+        with self._lock:
+            self._next_id += 1
+            token = self._next_id
+            self._active[token] = _Trace(method, path)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return token
+
+    def end(self, token: int):
+        """Stop watching a request and report it if it was slow"""
+        with self._lock:
+            trace = self._active.pop(token, None)
+        if trace is None:
+            return
+        duration = time.perf_counter() - trace.started
+        if duration < self.threshold or not trace.samples:
+            return
+
+        report = {
+            "method": trace.method,
+            "path": trace.path,
+            "duration": duration,
+            "interval": self.interval,
+            "samples": trace.samples,
+            "stacks": dict(trace.stacks)
+        }
+        # Hooks may write files; keep them off the caller (the event loop)
+        threading.Thread(target=self._report, args=(report,), daemon=True).start()
+
+    def _report(self, report: Dict):
+        for hook in self.hooks:
+            try:
+                hook(report)
+            except Exception as e:
+                print(f"Profile hook failed: {e}")
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            now = time.perf_counter()
+            with self._lock:
+                traces = list(self._active.values())
+            slow = [trace for trace in traces if now - trace.started >= self.threshold]
+
+            if not slow:
+                # Sleep until the oldest request turns slow, or a new one arrives
+                oldest = min((trace.started for trace in traces), default=None)
+                timeout = None if oldest is None else max(0.0, oldest + self.threshold - now)
+                self._wakeup.clear()
+                self._wakeup.wait(timeout)
+                continue
+
+            stacks = [
+                _collapse(frame)
+                for thread_id, frame in sys._current_frames().items()
+                if thread_id != own_id
+            ]
+            with self._lock:
+                # Only requests still running; ``end`` reads a trace after removing it
+                for trace in self._active.values():
+                    if now - trace.started >= self.threshold:
+                        trace.samples += 1
+                        trace.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    def write_profile(self, report: Dict):
+        """Default hook: write collapsed stacks (``stack count`` per line) to PROFILE_DIR"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        slug = report["path"].strip("/").replace("/", "_") or "root"
+        file_path = self.output_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['method']}-{slug[:80]}.folded"
+        with file_path.open("w") as f:
+            for stack, count in sorted(report["stacks"].items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        print(
+            f"Slow request {report['method']} {report['path']} took {report['duration']:.2f}s; "
+            f"{report['samples']} samples written to {file_path}"
+        )
+
+# Global profiler
+slow_request_profiler = SlowRequestProfiler()
@@ -1,30 +1,77 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 
 from core.config import settings
 from api import routes
-from models.detector import detector
+from api.middleware import TimingMiddleware
+from models.registry import model_registry
+from services.executor import inference_executor
+from services.jobs import job_queue
+from services.results_store import results_store
+from services.retention import retention_manager
+from core.metrics import metrics_registry
+from core.cpu import ensure_thread_budget
+
+# Heavy libraries (ultralytics, torch, OpenCV, pdfium) are imported on first use
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+STARTUP_SECONDS = metrics_registry.gauge(
+    "app_startup_seconds",
+    "Cold start time of this process, by phase",
+    ("phase",)
+)
+STARTUP_SECONDS.set(IMPORT_SECONDS, phase="import")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan events - startup and shutdown"""
-    # Startup: Load YOLO model
-    print("Starting Blueprint Detection API...")
-    try:
-        detector.load_model()
-        print("✓ YOLO model loaded successfully")
-    except FileNotFoundError as e:
-        print(f"⚠ Warning: {e}")
-        print("  The API will start, but detection will fail until you add your YOLO model.")
-    except Exception as e:
-        print(f"✗ Error loading model: {e}")
+    started = time.perf_counter()
+    print(f"Starting Blueprint Detection API... (imports took {IMPORT_SECONDS:.2f}s)")
+    
+    # Size thread pools before the model loads (serve.py has already done this per worker)
+    ensure_thread_budget()
+    
+    # Load the default YOLO model, run the warm-up inference and watch for new weights;
+    # in the background, liveness checks are served right away and /health/ready
+    # reports when the model is ready
+    model_registry.start(background=settings.MODEL_LOAD_IN_BACKGROUND)
+    
+    # Move results saved as JSON files by older versions into the results store
+    migrated = await run_in_threadpool(results_store.migrate_json_results, settings.RESULTS_DIR)
+    if migrated:
+        print(f"✓ Migrated {migrated} JSON results file(s) to the results store")
+    
+    inference_executor.start()
+    await job_queue.start()
+    
+    # Evict old uploads, tile pyramids and results in the background
+    if settings.RETENTION_ENABLED:
+        retention_manager.start()
+    
+    startup_seconds = time.perf_counter() - started
+    STARTUP_SECONDS.set(startup_seconds, phase="lifespan")
+    app.state.startup = {
+        "import_seconds": IMPORT_SECONDS,
+        "startup_seconds": startup_seconds,
+        "started_at": time.time()
+    }
+    print(f"✓ Accepting requests after {IMPORT_SECONDS + startup_seconds:.2f}s (model: {model_registry.describe()['state']})")
     
     yield
     
     # Shutdown
     print("Shutting down Blueprint Detection API...")
+    await job_queue.stop()
+    retention_manager.stop()
+    inference_executor.shutdown()
+    model_registry.stop()
+    results_store.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -43,6 +90,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency metrics, Server-Timing and slow-request profiling
+app.add_middleware(TimingMiddleware)
+
 # Include routers
 app.include_router(routes.router, prefix="", tags=["Blueprint Detection"])
 
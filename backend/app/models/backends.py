@@ -0,0 +1,458 @@
+"""
+Inference backends for BlueprintDetector
+
+All backends take BGR images (paths, or BGR/grayscale arrays) and return one ``Detections``
+per image in original image coordinates:
+
+- ``pytorch``: ultralytics YOLO on the ``.pt`` weights (reference)
+- ``onnxruntime``: ONNX export of the weights run by ONNX Runtime
+- ``openvino``: OpenVINO IR export of the weights
+- ``onnxruntime-int8``: the ONNX export quantized to INT8 (see ``models/quantization.py``)
+
+Exported artifacts are generated with ultralytics on first use and cached
+next to the weights file (``best.onnx``, ``best_openvino_model/``). They are
+regenerated when the weights file is newer than the artifact.
+
+Numerical equivalence: the exported backends use a square letterbox while
+ultralytics uses a stride-aligned rectangular one, so outputs are not bit
+identical. Against the PyTorch backend, every box has a match (at most
+``BACKEND_UNMATCHED_TOLERANCE`` of either side may be unmatched), matched
+boxes agree within ``BACKEND_BOX_TOLERANCE_PX`` pixels and confidences
+within ``BACKEND_CONF_TOLERANCE``; ``tools/compare_backends.py`` checks this
+on a folder of sample sheets.
+"""
+import ast
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Union
+import numpy as np
+from models.detections import Detections
+from models.suppression import greedy_suppression
+from core.config import settings
+from core.metrics import stage_timer
+
+BACKEND_BOX_TOLERANCE_PX = 2.0
+BACKEND_CONF_TOLERANCE = 0.02
+# Fraction of reference or candidate boxes allowed without a match (boxes near the confidence threshold)
+BACKEND_UNMATCHED_TOLERANCE = 0.0
+
+# Upper bound on boxes kept per image, matches the ultralytics default
+MAX_DETECTIONS = 300
+
+ImageSource = Union[Path, str, np.ndarray]
+
+# Letterbox padding value, as in ultralytics
+PAD_VALUE = 114
+
+def _read_image(source: ImageSource) -> np.ndarray:
+    """Decode an image path to a BGR array (arrays, also grayscale ones, are passed through)"""
+    if isinstance(source, np.ndarray):
+        return source
+    # OpenCV is imported on first use to keep process start-up fast
+    import cv2
+    image = cv2.imread(str(source), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not decode image: {source}")
+    return image
+
+def _as_bgr(image: np.ndarray) -> np.ndarray:
+    """Expand a grayscale image to the three channels the model expects"""
+    if image.ndim == 3:
+        return image
+    import cv2
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+def letterbox_geometry(height: int, width: int, size: int) -> Tuple[float, int, int, int, int]:
+    """
+    Placement of an image inside a square letterbox canvas
+
+    Args:
+        height: Image height
+        width: Image width
+        size: Side of the square model input
+
+    Returns:
+        (scale ratio, resized width, resized height, left pad, top pad)
+    """
+    ratio = min(size / height, size / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    return ratio, new_w, new_h, int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+
+def _resize(image: np.ndarray, new_w: int, new_h: int) -> np.ndarray:
+    if (new_w, new_h) == (image.shape[1], image.shape[0]):
+        return image
+    import cv2
+    return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+def letterbox(image: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Resize an image to fit a square canvas, keeping aspect ratio
+
+    Args:
+        image: BGR (or grayscale) image
+        size: Side of the square model input
+
+    Returns:
+        (padded image, scale ratio, (pad_x, pad_y))
+    """
+    ratio, new_w, new_h, left, top = letterbox_geometry(*image.shape[:2], size)
+    canvas = np.full((size, size) + image.shape[2:], PAD_VALUE, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = _resize(image, new_w, new_h)
+    return canvas, ratio, (left, top)
+
+def letterbox_into(image: np.ndarray, out: np.ndarray) -> Tuple[float, Tuple[float, float]]:
+    """
+    Letterbox an image straight into one slot of a model input batch
+
+    Writes RGB CHW float32 in [0, 1] without an intermediate canvas; a
+    grayscale image is written to all three channels. Gives the same values
+    as ``letterbox`` followed by the BGR -> RGB and /255 conversion.
+
+    Args:
+        image: BGR or grayscale uint8 image
+        out: (3, S, S) float32 view of the batch to fill
+
+    Returns:
+        (scale ratio, (pad_x, pad_y))
+    """
+    size = out.shape[1]
+    ratio, new_w, new_h, left, top = letterbox_geometry(*image.shape[:2], size)
+    resized = _resize(image, new_w, new_h)
+
+    out.fill(np.float32(PAD_VALUE) / np.float32(255.0))
+    region = out[:, top:top + new_h, left:left + new_w]
+    if resized.ndim == 2:
+        np.divide(resized, np.float32(255.0), out=region[0], dtype=np.float32)
+        region[1:] = region[0]
+    else:
+        # BGR HWC -> RGB CHW
+        np.divide(resized.transpose(2, 0, 1)[::-1], np.float32(255.0), out=region, dtype=np.float32)
+    return ratio, (left, top)
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float
+) -> np.ndarray:
+    """
+    Class-aware NMS
+
+    Args:
+        boxes: (N, 4) xyxy boxes
+        scores: (N,) confidences
+        class_ids: (N,) class indices
+        iou_threshold: IOU above which the lower scoring box is dropped
+
+    Returns:
+        Indices of kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    return greedy_suppression(boxes, scores, class_ids, iou_threshold)[0]
+
+def decode_yolo_output(
+    output: np.ndarray,
+    conf_threshold: float,
+    iou_threshold: float,
+    ratio: float,
+    pad: Tuple[float, float],
+    image_shape: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turn one raw YOLOv8 output into boxes in original image coordinates
+
+    Args:
+        output: (4 + num_classes, num_anchors) raw predictions
+        conf_threshold: Minimum class confidence
+        iou_threshold: IOU threshold for NMS
+        ratio: Letterbox scale ratio
+        pad: Letterbox (pad_x, pad_y)
+        image_shape: Original (height, width)
+
+    Returns:
+        (boxes xyxy, scores, class_ids)
+    """
+    predictions = output.T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+    mask = scores >= conf_threshold
+    predictions, scores, class_ids = predictions[mask], scores[mask], class_ids[mask]
+
+    cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    keep = non_max_suppression(boxes, scores, class_ids, iou_threshold)[:MAX_DETECTIONS]
+    boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+    # Undo the letterbox
+    boxes -= np.asarray([pad[0], pad[1], pad[0], pad[1]], dtype=boxes.dtype)
+    boxes /= ratio
+    height, width = image_shape
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    return boxes, scores, class_ids
+
+def export_artifact(weights_path: Path, export_format: str) -> Path:
+    """
+    Get an exported model artifact, generating it with ultralytics if needed
+
+    Args:
+        weights_path: Path to the PyTorch ``.pt`` weights
+        export_format: "onnx" or "openvino"
+
+    Returns:
+        Path to the ``.onnx`` file or the OpenVINO ``.xml`` file
+    """
+    if export_format == "onnx":
+        artifact = weights_path.with_suffix(".onnx")
+    else:
+        artifact = weights_path.parent / f"{weights_path.stem}_openvino_model" / f"{weights_path.stem}.xml"
+
+    if artifact.exists() and artifact.stat().st_mtime >= weights_path.stat().st_mtime:
+        return artifact
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights_path.name} to {export_format} (cached at {artifact})...")
+    YOLO(str(weights_path)).export(
+        format=export_format,
+        imgsz=settings.MODEL_IMGSZ,
+        dynamic=True,
+        half=False
+    )
+    if not artifact.exists():
+        raise RuntimeError(f"Export to {export_format} did not produce {artifact}")
+    return artifact
+
+class InferenceBackend:
+    """Common interface of all inference backends"""
+
+    name = "base"
+    # Whether a loaded model keeps working in a forked child (no runtime threads created at load)
+    fork_safe = False
+
+    def __init__(self, weights_path: Path, threads: int = 0):
+        """
+        Args:
+            weights_path: Path to the PyTorch ``.pt`` weights
+            threads: Intra-op threads (0 = library default)
+        """
+        self.weights_path = weights_path
+        self.threads = threads
+        self.class_names: Dict[int, str] = {}
+        self.imgsz = settings.MODEL_IMGSZ
+
+    def load(self):
+        """Load the model and populate ``class_names``"""
+        raise NotImplementedError
+
+    def predict(
+        self,
+        sources: List[ImageSource],
+        conf_threshold: float,
+        iou_threshold: float
+    ) -> List[Detections]:
+        """Run inference on a batch of images"""
+        raise NotImplementedError
+
+    def warmup(self):
+        """Run one dummy inference so the first request does not pay for lazy init"""
+        blank = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        self.predict([blank], settings.CONFIDENCE_THRESHOLD, settings.IOU_THRESHOLD)
+
+class TorchBackend(InferenceBackend):
+    """PyTorch eager inference through ultralytics (reference backend)"""
+
+    name = "pytorch"
+    fork_safe = True
+
+    def load(self):
+        import torch
+        from ultralytics import YOLO
+
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(max(1, settings.INFERENCE_INTEROP_THREADS))
+        except RuntimeError:
+            # Only possible before the first parallel work; keep the pool already running
+            pass
+        self.model = YOLO(str(self.weights_path))
+        self.class_names = self.model.names
+
+    def predict(self, sources, conf_threshold, iou_threshold):
+        # Ultralytics letterboxes and runs NMS inside predict
+        with stage_timer("forward"):
+            results = self.model.predict(
+                source=[
+                    _as_bgr(source) if isinstance(source, np.ndarray) else str(source)
+                    for source in sources
+                ],
+                conf=conf_threshold,
+                iou=iou_threshold,
+                batch=len(sources),
+                verbose=False
+            )
+        with stage_timer("parse"):
+            return [
+                Detections.from_ultralytics(result, self.class_names)
+                for result in results
+            ]
+
+class _ExportedBackend(InferenceBackend):
+    """Shared letterbox/decode logic for exported YOLOv8 graphs"""
+
+    dynamic_batch = True
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """Run the graph on a (B, 3, S, S) float32 batch"""
+        raise NotImplementedError
+
+    def _input_buffer(self, count: int) -> np.ndarray:
+        """
+        Model input batch for ``count`` images
+
+        The buffer is kept and reused by later calls (they are serialized by
+        the detector), so steady-state inference allocates no input memory.
+        """
+        buffer = getattr(self, "_buffer", None)
+        if buffer is None or len(buffer) < count or buffer.shape[2] != self.imgsz:
+            buffer = np.empty((count, 3, self.imgsz, self.imgsz), dtype=np.float32)
+            self._buffer = buffer
+        return buffer[:count]
+
+    def predict(self, sources, conf_threshold, iou_threshold):
+        with stage_timer("decode"):
+            images = [_read_image(source) for source in sources]
+
+        with stage_timer("preprocess"):
+            batch = self._input_buffer(len(images))
+            placements = [letterbox_into(image, slot) for image, slot in zip(images, batch)]
+
+        with stage_timer("forward"):
+            if self.dynamic_batch:
+                outputs = self._run(batch)
+            else:
+                outputs = np.concatenate([self._run(batch[i:i + 1]) for i in range(len(batch))])
+
+        detections = []
+        with stage_timer("nms"):
+            for output, image, (ratio, pad) in zip(outputs, images, placements):
+                boxes, scores, class_ids = decode_yolo_output(
+                    output,
+                    conf_threshold,
+                    iou_threshold,
+                    ratio,
+                    pad,
+                    image.shape[:2]
+                )
+                detections.append(Detections(boxes, scores, class_ids, self.class_names))
+        return detections
+
+class OnnxRuntimeBackend(_ExportedBackend):
+    """ONNX Runtime CPU inference on the exported graph"""
+
+    name = "onnxruntime"
+
+    def load(self):
+        import onnxruntime as ort
+
+        artifact = self._artifact()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = max(1, settings.INFERENCE_INTEROP_THREADS)
+
+        self.artifact = artifact
+        self.session = ort.InferenceSession(
+            str(artifact),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        if isinstance(model_input.shape[2], int):
+            self.imgsz = model_input.shape[2]
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.class_names = ast.literal_eval(metadata["names"])
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def _artifact(self) -> Path:
+        """ONNX graph to run"""
+        return export_artifact(self.weights_path, "onnx")
+
+class QuantizedOnnxBackend(OnnxRuntimeBackend):
+    """ONNX Runtime CPU inference on the INT8-quantized export (QUANTIZATION_MODE)"""
+
+    name = "onnxruntime-int8"
+
+    def _artifact(self) -> Path:
+        from models.quantization import quantized_artifact
+        return quantized_artifact(self.weights_path)
+
+class OpenVinoBackend(_ExportedBackend):
+    """OpenVINO CPU inference on the exported IR"""
+
+    name = "openvino"
+
+    def load(self):
+        import openvino as ov
+        import yaml
+
+        artifact = export_artifact(self.weights_path, "openvino")
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": settings.OPENVINO_PERFORMANCE_HINT}
+        if self.threads > 0:
+            config["INFERENCE_NUM_THREADS"] = self.threads
+
+        self.artifact = artifact
+        model = core.read_model(str(artifact))
+        batch_dim = model.input(0).get_partial_shape()[0]
+        self.dynamic_batch = batch_dim.is_dynamic
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+        with (artifact.parent / "metadata.yaml").open() as f:
+            metadata = yaml.safe_load(f)
+        self.class_names = {int(k): v for k, v in metadata["names"].items()}
+        if metadata.get("imgsz"):
+            self.imgsz = metadata["imgsz"][0]
+
+    def _run(self, batch):
+        return self.compiled(batch)[self.output]
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TorchBackend, OnnxRuntimeBackend, QuantizedOnnxBackend, OpenVinoBackend)
+}
+
+def create_backend(
+    name: str,
+    weights_path: Path,
+    threads: Optional[int] = None
+) -> InferenceBackend:
+    """
+    Instantiate a backend by name
+
+    Args:
+        name: "pytorch", "onnxruntime", "onnxruntime-int8" or "openvino"
+        weights_path: Path to the PyTorch ``.pt`` weights
+        threads: Intra-op threads (default from settings)
+
+    Returns:
+        Unloaded backend instance
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[name](
+        weights_path,
+        threads if threads is not None else settings.INFERENCE_THREADS
+    )
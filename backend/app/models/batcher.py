@@ -0,0 +1,309 @@
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Union
+import numpy as np
+from models.detector import BlueprintDetector, detector
+from models.detections import Detections
+from core.config import settings
+from core.metrics import metrics_registry, current_timings, record_stage
+
+BATCH_SIZE = metrics_registry.histogram(
+    "inference_batch_size",
+    "Images per batched model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+class QueueFullError(RuntimeError):
+    """Raised when the batching queue cannot accept more requests"""
+
+class _PendingRequest:
+    """A single image waiting to be put through the model"""
+
+    __slots__ = ("image_path", "conf", "iou", "future", "enqueued_at", "timings")
+
+    def __init__(self, image_path: Union[Path, np.ndarray], conf: float, iou: float):
+        self.image_path = image_path
+        self.conf = conf
+        self.iou = iou
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        # The batch runs on the scheduler thread; keep the submitting request's timings
+        self.timings = current_timings()
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching in front of a BlueprintDetector
+
+    Concurrent callers submit single images. A worker thread waits up to
+    ``max_wait_ms`` after the first pending request for more requests to
+    arrive, then runs up to ``max_batch_size`` images through one
+    ``model.predict`` call and resolves each caller's future with its own
+    detections. Requests with different thresholds are never mixed in one
+    model call.
+    """
+
+    def __init__(
+        self,
+        detector: BlueprintDetector,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        metrics_window: Optional[int] = None
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            detector: Detector used to run the batches
+            max_batch_size: Max images per batch (default from settings)
+            max_wait_ms: Max time to wait for a batch to fill (default from settings)
+            queue_size: Max pending requests (default from settings)
+            metrics_window: Number of batches/requests kept for metrics (default from settings)
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size or settings.BATCH_MAX_SIZE)
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.BATCH_MAX_WAIT_MS) / 1000.0
+        self.queue_size = queue_size or settings.BATCH_QUEUE_SIZE
+        window = metrics_window or settings.BATCH_METRICS_WINDOW
+
+        self._queue: "queue.Queue[Optional[_PendingRequest]]" = queue.Queue(maxsize=self.queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._batches: deque = deque(maxlen=window)
+        self._latencies_ms: deque = deque(maxlen=window)
+        self._total_batches = 0
+        self._total_requests = 0
+        self._rejected = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the worker thread (no-op if already running)"""
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name="batch-scheduler",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker thread after draining already queued requests"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+            thread.join(timeout)
+            self._thread = None
+
+    def submit(
+        self,
+        image_path: Union[Path, np.ndarray],
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None
+    ) -> Future:
+        """
+        Queue an image for batched inference
+
+        Args:
+            image_path: Path to input image, or a decoded BGR image array
+            conf_threshold: Confidence threshold (default from settings)
+            iou_threshold: IOU threshold for NMS (default from settings)
+
+        Returns:
+            Future resolving to the Detections for this image
+
+        Raises:
+            QueueFullError: If ``queue_size`` requests are already pending
+        """
+        if not self.running:
+            self.start()
+
+        request = _PendingRequest(
+            image_path,
+            conf_threshold or settings.CONFIDENCE_THRESHOLD,
+            iou_threshold or settings.IOU_THRESHOLD
+        )
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self._rejected += 1
+            raise QueueFullError(
+                f"Batching queue is full ({self.queue_size} pending requests)"
+            )
+        return request.future
+
+    def predict(
+        self,
+        image_path: Union[Path, np.ndarray],
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None
+    ) -> Detections:
+        """Submit an image and block until its detections are ready"""
+        return self.submit(image_path, conf_threshold, iou_threshold).result()
+
+    def _run(self):
+        """Worker loop: collect a batch, run it, repeat"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch, stop = self._collect_batch(first)
+            self._execute(batch)
+            if stop:
+                return
+
+    def _collect_batch(self, first: _PendingRequest) -> Tuple[List[_PendingRequest], bool]:
+        """Gather requests until the batch is full or the wait window closes"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    # Window closed: only take what is already waiting
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _execute(self, batch: List[_PendingRequest]):
+        """Run a collected batch, one model call per threshold pair"""
+        groups: Dict[Tuple[float, float], List[_PendingRequest]] = {}
+        for request in batch:
+            groups.setdefault((request.conf, request.iou), []).append(request)
+
+        for (conf, iou), requests in groups.items():
+            started = time.perf_counter()
+            queue_wait_ms = [(started - r.enqueued_at) * 1000.0 for r in requests]
+            try:
+                results = self.detector.predict_batch(
+                    [r.image_path for r in requests],
+                    conf_threshold=conf,
+                    iou_threshold=iou
+                )
+            except Exception as e:
+                self._failed += len(requests)
+                for request in requests:
+                    request.future.set_exception(e)
+                results = None
+            finished = time.perf_counter()
+
+            for request, wait_ms in zip(requests, queue_wait_ms):
+                record_stage("batch_wait", wait_ms / 1000.0, request.timings)
+                if request.timings is not None:
+                    request.timings.add("model", finished - started)
+
+            if results is not None:
+                for request, detections in zip(requests, results):
+                    request.future.set_result(detections)
+
+            self._record_batch(requests, queue_wait_ms, started, finished)
+
+    def _record_batch(
+        self,
+        requests: List[_PendingRequest],
+        queue_wait_ms: List[float],
+        started: float,
+        finished: float
+    ):
+        """Store per-batch and per-request metrics"""
+        self._total_batches += 1
+        self._total_requests += len(requests)
+        BATCH_SIZE.observe(len(requests))
+        self._batches.append({
+            "size": len(requests),
+            "queue_wait_ms": max(queue_wait_ms),
+            "inference_ms": (finished - started) * 1000.0,
+            "finished_at": time.time()
+        })
+        for request in requests:
+            self._latencies_ms.append((finished - request.enqueued_at) * 1000.0)
+
+    def get_metrics(self) -> Dict:
+        """
+        Summarize batching behaviour over the metrics window
+
+        Returns:
+            Dictionary with batch size, latency percentiles and throughput
+        """
+        batches = list(self._batches)
+        latencies = list(self._latencies_ms)
+
+        metrics = {
+            "config": {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_size": self.queue_size
+            },
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "total_batches": self._total_batches,
+            "total_requests": self._total_requests,
+            "rejected_requests": self._rejected,
+            "failed_requests": self._failed,
+            "window_batches": len(batches),
+            "avg_batch_size": 0.0,
+            "batch_size_histogram": {},
+            "avg_inference_ms": 0.0,
+            "avg_queue_wait_ms": 0.0,
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+                "max": max(latencies) if latencies else 0.0
+            },
+            "throughput_rps": 0.0,
+            "recent_batches": batches[-20:]
+        }
+
+        if batches:
+            sizes = [b["size"] for b in batches]
+            histogram: Dict[int, int] = {}
+            for size in sizes:
+                histogram[size] = histogram.get(size, 0) + 1
+            metrics["avg_batch_size"] = sum(sizes) / len(sizes)
+            metrics["batch_size_histogram"] = dict(sorted(histogram.items()))
+            metrics["avg_inference_ms"] = sum(b["inference_ms"] for b in batches) / len(batches)
+            metrics["avg_queue_wait_ms"] = sum(b["queue_wait_ms"] for b in batches) / len(batches)
+
+            span = batches[-1]["finished_at"] - batches[0]["finished_at"]
+            if span > 0 and len(batches) > 1:
+                # Requests completed after the first batch in the window
+                metrics["throughput_rps"] = (sum(sizes) - sizes[0]) / span
+
+        return metrics
+
+# Global batch scheduler around the global detector
+batch_scheduler = BatchScheduler(detector)
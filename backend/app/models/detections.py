@@ -0,0 +1,161 @@
+from typing import Dict, List, Sequence, Union
+import numpy as np
+
+class Detections:
+    """
+    Columnar detection results for one image
+
+    Boxes, confidences and class indices are kept as parallel NumPy arrays
+    so that filtering, statistics and merging run as vectorized operations.
+    Conversion to the list-of-dicts API format happens only at the API
+    boundary through ``to_dicts``.
+
+    Attributes:
+        boxes: (N, 4) float32 boxes in xyxy page coordinates
+        scores: (N,) float32 confidences
+        class_ids: (N,) int32 class indices into ``class_names``
+        class_names: Mapping of class index to label
+    """
+
+    __slots__ = ("boxes", "scores", "class_ids", "class_names")
+
+    def __init__(
+        self,
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        class_ids: np.ndarray,
+        class_names: Dict[int, str]
+    ):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        self.class_names = class_names
+
+    @classmethod
+    def empty(cls, class_names: Dict[int, str]) -> "Detections":
+        """Create an empty result"""
+        return cls(
+            np.empty((0, 4), dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.int32),
+            class_names
+        )
+
+    @classmethod
+    def from_ultralytics(cls, result, class_names: Dict[int, str]) -> "Detections":
+        """
+        Build from an ultralytics result with a single device-to-host transfer
+
+        Args:
+            result: ultralytics ``Results`` object
+            class_names: Mapping of class index to label
+
+        Returns:
+            Detections for the result's image
+        """
+        # boxes.data is [x1, y1, x2, y2, (track_id,) conf, cls] per row
+        data = result.boxes.data.cpu().numpy()
+        if len(data) == 0:
+            return cls.empty(class_names)
+        return cls(data[:, :4], data[:, -2], data[:, -1], class_names)
+
+    @classmethod
+    def from_dicts(cls, detections: List[Dict], class_names: Dict[int, str]) -> "Detections":
+        """
+        Build from the list-of-dicts API format
+
+        Args:
+            detections: Detections with bbox [x, y, width, height], label and confidence
+            class_names: Mapping of class index to label; unknown labels are appended
+
+        Returns:
+            Columnar detections
+        """
+        names = dict(class_names)
+        index = {name: class_id for class_id, name in names.items()}
+        class_ids = []
+        for det in detections:
+            label = det["label"]
+            if label not in index:
+                index[label] = max(names, default=-1) + 1
+                names[index[label]] = label
+            class_ids.append(index[label])
+
+        if not detections:
+            return cls.empty(names)
+        xywh = np.asarray([det["bbox"] for det in detections], dtype=np.float32)
+        xywh[:, 2:] += xywh[:, :2]
+        scores = [det["confidence"] for det in detections]
+        return cls(xywh, scores, class_ids, names)
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["Detections"], class_names: Dict[int, str]) -> "Detections":
+        """Join several results that share the same class mapping"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty(class_names)
+        return cls(
+            np.concatenate([part.boxes for part in parts]),
+            np.concatenate([part.scores for part in parts]),
+            np.concatenate([part.class_ids for part in parts]),
+            class_names
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def select(self, index: Union[np.ndarray, slice]) -> "Detections":
+        """Subset by boolean mask, index array or slice"""
+        return Detections(
+            self.boxes[index],
+            self.scores[index],
+            self.class_ids[index],
+            self.class_names
+        )
+
+    def offset(self, dx: float, dy: float) -> "Detections":
+        """Shift all boxes, e.g. from tile to page coordinates"""
+        return Detections(
+            self.boxes + np.asarray([dx, dy, dx, dy], dtype=np.float32),
+            self.scores,
+            self.class_ids,
+            self.class_names
+        )
+
+    def scale(self, sx: float, sy: float) -> "Detections":
+        """Scale all boxes, e.g. from a downscaled image back to the sheet"""
+        return Detections(
+            self.boxes * np.asarray([sx, sy, sx, sy], dtype=np.float32),
+            self.scores,
+            self.class_ids,
+            self.class_names
+        )
+
+    @property
+    def xywh(self) -> np.ndarray:
+        """(N, 4) boxes as [x, y, width, height]"""
+        xywh = self.boxes.copy()
+        xywh[:, 2:] -= xywh[:, :2]
+        return xywh
+
+    @property
+    def labels(self) -> List[str]:
+        """Label of each detection"""
+        names = self.class_names
+        return [names[class_id] for class_id in self.class_ids.tolist()]
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        Convert to the list-of-dicts API format
+
+        Returns:
+            List of detections with bbox [x, y, width, height], label and confidence
+        """
+        return [
+            {"label": label, "confidence": confidence, "bbox": bbox}
+            for label, confidence, bbox in zip(
+                self.labels,
+                self.scores.tolist(),
+                self.xywh.tolist()
+            )
+        ]
@@ -1,101 +1,180 @@
+import threading
+import time
 from pathlib import Path
-from typing import Optional, List, Dict
-from ultralytics import YOLO
+from typing import Optional, List, Dict, Union
 import numpy as np
+from models.detections import Detections
+from models.backends import InferenceBackend, create_backend
 from core.config import settings
+from core.metrics import metrics_registry
+
+MODEL_LOAD_SECONDS = metrics_registry.gauge(
+    "model_load_seconds",
+    "Time taken by the last model load, by phase",
+    ("phase",)
+)
+
+# Model lifecycle states reported by readiness checks
+MODEL_NOT_LOADED = "not_loaded"
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
 
 class BlueprintDetector:
     """YOLO model wrapper for blueprint symbol detection"""
     
-    def __init__(self, model_path: Optional[Path] = None):
+    def __init__(self, model_path: Optional[Path] = None, backend: Optional[str] = None):
         """
         Initialize the detector with a YOLO model
         
         Args:
             model_path: Path to YOLO model file (.pt)
+            backend: Inference backend name (default from settings)
         """
         self.model_path = model_path or settings.MODEL_PATH
-        self.model = None
+        self.backend_name = backend or settings.INFERENCE_BACKEND
+        self.model: Optional[InferenceBackend] = None
         self.class_names = None
+        self.state = MODEL_NOT_LOADED
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmed_up = False
+        # Backends are not guaranteed to be thread-safe; serialize model calls
+        self._predict_lock = threading.Lock()
+        # Held for the whole load, so callers arriving mid-load wait for it
+        self._load_lock = threading.Lock()
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == MODEL_READY
+        
+    def load_model(self, warmup: Optional[bool] = None):
+        """
+        Load the YOLO model on the configured backend and warm it up
         
-    def load_model(self):
-        """Load the YOLO model"""
+        Args:
+            warmup: Run the warm-up inference (default WARMUP_ON_LOAD); a
+                process that forks workers skips it and lets each worker warm up
+        """
+        with self._load_lock:
+            started = time.perf_counter()
+            self.state = MODEL_LOADING
+            try:
+                self._load(settings.WARMUP_ON_LOAD if warmup is None else warmup)
+            except Exception as e:
+                self.state = MODEL_FAILED
+                self.load_error = str(e)
+                raise
+            self.state = MODEL_READY
+            self.load_error = None
+            self.load_seconds = time.perf_counter() - started
+    
+    def _ensure_loaded(self):
+        """Load the model on first use, or wait for a load already in progress"""
+        if self.model is not None:
+            return
+        with self._load_lock:
+            loaded = self.model is not None
+        if not loaded:
+            self.load_model()
+    
+    def _load(self, warmup: bool):
         if not self.model_path.exists():
             raise FileNotFoundError(
                 f"YOLO model not found at {self.model_path}. "
                 f"Please place your trained YOLOv8 model (best.pt) in the models/ directory."
             )
         
-        print(f"Loading YOLO model from {self.model_path}...")
-        self.model = YOLO(str(self.model_path))
-        self.class_names = self.model.names
+        print(f"Loading YOLO model from {self.model_path} ({self.backend_name} backend)...")
+        started = time.perf_counter()
+        backend = create_backend(self.backend_name, self.model_path)
+        backend.load()
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started, phase="load")
+        
+        self.model = backend
+        self.class_names = backend.class_names
+        self.warmed_up = False
+        if warmup:
+            self.warmup()
         print(f"Model loaded successfully. Classes: {self.class_names}")
+    
+    def warmup(self):
+        """Run one dummy inference so the first request does not pay for lazy init"""
+        started = time.perf_counter()
+        with self._predict_lock:
+            self.model.warmup()
+        elapsed = time.perf_counter() - started
+        MODEL_LOAD_SECONDS.set(elapsed, phase="warmup")
+        self.warmed_up = True
+        print(f"Warm-up inference took {elapsed * 1000:.0f} ms")
         
+    @property
+    def model_identity(self) -> str:
+        """Identity of the model file and backend, changes when the file is replaced"""
+        stat = self.model_path.stat()
+        return f"{self.model_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{self.backend_name}"
+    
     def predict(
         self,
-        image_path: Path,
+        image_path: Union[Path, np.ndarray],
         conf_threshold: Optional[float] = None,
         iou_threshold: Optional[float] = None
-    ) -> List[Dict]:
+    ) -> Detections:
         """
         Run inference on an image
         
         Args:
-            image_path: Path to input image
+            image_path: Path to input image, or a decoded BGR image array
             conf_threshold: Confidence threshold (default from settings)
             iou_threshold: IOU threshold for NMS (default from settings)
             
         Returns:
-            List of detections with bbox, label, and confidence
+            Columnar detections (boxes, confidences, class indices)
         """
-        if self.model is None:
-            self.load_model()
+        return self.predict_batch([image_path], conf_threshold, iou_threshold)[0]
+    
+    def predict_batch(
+        self,
+        image_paths: List[Union[Path, np.ndarray]],
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None
+    ) -> List[Detections]:
+        """
+        Run inference on several images in a single model call
+        
+        Args:
+            image_paths: Paths to input images, or decoded BGR image arrays
+            conf_threshold: Confidence threshold (default from settings)
+            iou_threshold: IOU threshold for NMS (default from settings)
+            
+        Returns:
+            One Detections per input image, in input order
+        """
+        self._ensure_loaded()
         
         conf = conf_threshold or settings.CONFIDENCE_THRESHOLD
         iou = iou_threshold or settings.IOU_THRESHOLD
         
         # Run inference
-        results = self.model.predict(
-            source=str(image_path),
-            conf=conf,
-            iou=iou,
-            verbose=False
-        )
-        
-        # Parse results
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Get box coordinates (xyxy format)
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                
-                # Convert to xywh format
-                x = float(x1)
-                y = float(y1)
-                width = float(x2 - x1)
-                height = float(y2 - y1)
-                
-                # Get class and confidence
-                class_id = int(box.cls[0].cpu().numpy())
-                confidence = float(box.conf[0].cpu().numpy())
-                label = self.class_names[class_id]
-                
-                detections.append({
-                    "label": label,
-                    "confidence": confidence,
-                    "bbox": [x, y, width, height]
-                })
-        
-        return detections
+        with self._predict_lock:
+            return self.model.predict(list(image_paths), conf, iou)
+    
+    def get_status(self) -> Dict:
+        """Model lifecycle state without triggering a load"""
+        return {
+            "state": self.state,
+            "backend": self.backend_name,
+            "load_seconds": self.load_seconds,
+            "error": self.load_error
+        }
     
     def get_model_info(self) -> Dict:
         """Get model information"""
-        if self.model is None:
-            self.load_model()
+        self._ensure_loaded()
             
         return {
             "model_path": str(self.model_path),
+            "backend": self.backend_name,
             "classes": self.class_names,
             "num_classes": len(self.class_names) if self.class_names else 0
         }
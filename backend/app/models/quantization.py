@@ -0,0 +1,201 @@
+"""
+INT8 quantization of the ONNX export, used by the ``onnxruntime-int8`` backend
+
+Two modes (``QUANTIZATION_MODE``):
+
+- ``dynamic``: weights are stored as INT8 and activations are quantized on
+  the fly from the range of each batch. Needs no data.
+- ``static``: activation ranges are calibrated once on sample blueprints
+  (``QUANTIZATION_CALIBRATION_DIR``) and stored in the graph, which ONNX
+  Runtime fuses into integer kernels. Usually faster and more accurate than
+  dynamic, if the samples look like production sheets.
+
+Only convolutions and matrix products are quantized, and the DFL projection
+of the YOLOv8 head is left out: it turns bin distributions into box offsets,
+so rounding it moves every box. Everything after (box decoding, sigmoid
+scores) stays in float.
+
+The quantized graph is cached next to the weights (``best.int8-static.onnx``)
+and rebuilt when the FP32 export is newer. Delete it to recalibrate on new
+samples. The accuracy loss is model specific: measure it with
+``tools/quantization_report.py`` before switching a model to this backend
+(``MODEL_BACKENDS``).
+
+Requires ``onnxruntime`` and ``onnx``; only imported when the backend loads.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Optional, List, Dict
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static
+)
+from models.backends import export_artifact, letterbox_into
+from core.config import settings
+
+QUANTIZATION_MODES = ("dynamic", "static")
+
+# Operators quantized to INT8; the rest of the graph stays in float
+QUANTIZED_OP_TYPES = ["Conv", "MatMul"]
+
+# Node name fragments kept in float (the DFL box projection of the YOLOv8 head)
+EXCLUDED_NODE_PATTERNS = ("/dfl/",)
+
+CALIBRATION_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+def calibration_images(directory: Path, limit: Optional[int] = None) -> List[Path]:
+    """
+    Sample sheets used for static calibration
+
+    Args:
+        directory: Folder of images (searched recursively)
+        limit: At most this many, spread evenly over the sorted folder
+            (default from settings)
+
+    Returns:
+        Image paths
+    """
+    limit = limit or settings.QUANTIZATION_CALIBRATION_IMAGES
+    images = sorted(
+        path for path in Path(directory).rglob("*")
+        if path.suffix.lower() in CALIBRATION_SUFFIXES
+    )
+    if len(images) > limit:
+        images = [images[i] for i in np.linspace(0, len(images) - 1, limit).round().astype(int)]
+    return images
+
+class CalibrationReader(CalibrationDataReader):
+    """Feeds sample sheets to the calibrator, letterboxed exactly like at inference"""
+
+    def __init__(self, images: List[Path], input_name: str, imgsz: int):
+        self.images = list(images)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.used = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        import cv2
+        while self.images:
+            path = self.images.pop(0)
+            image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if image is None:
+                print(f"⚠ Skipping unreadable calibration image {path}")
+                continue
+            batch = np.empty((1, 3, self.imgsz, self.imgsz), dtype=np.float32)
+            letterbox_into(image, batch[0])
+            self.used += 1
+            return {self.input_name: batch}
+        return None
+
+def quantized_artifact_path(weights_path: Path, mode: str) -> Path:
+    """Where the quantized graph of a weights file is cached"""
+    return weights_path.with_suffix(f".int8-{mode}.onnx")
+
+def quantize_model(
+    source: Path,
+    target: Path,
+    mode: str,
+    calibration_dir: Optional[Path] = None
+) -> Dict:
+    """
+    Quantize an FP32 ONNX graph to INT8
+
+    Args:
+        source: FP32 ONNX graph (the ultralytics export)
+        target: Output path, replaced atomically
+        mode: One of ``QUANTIZATION_MODES``
+        calibration_dir: Sample sheets (``static`` only)
+
+    Returns:
+        Summary: mode, calibration images used, excluded nodes
+
+    Raises:
+        ValueError: On an unknown mode or missing calibration images
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}. Available: {', '.join(QUANTIZATION_MODES)}")
+
+    model = onnx.load(str(source))
+    excluded = [
+        node.name for node in model.graph.node
+        if any(pattern in node.name for pattern in EXCLUDED_NODE_PATTERNS)
+    ]
+    # Written next to the target so the final rename stays on one filesystem
+    partial = target.with_name(f".{target.name}.{os.getpid()}.partial")
+    summary = {"mode": mode, "calibration_images": 0, "excluded_nodes": excluded}
+    try:
+        if mode == "dynamic":
+            # ONNX Runtime's integer convolution kernel needs unsigned weights
+            quantize_dynamic(
+                str(source),
+                str(partial),
+                op_types_to_quantize=QUANTIZED_OP_TYPES,
+                weight_type=QuantType.QUInt8,
+                nodes_to_exclude=excluded
+            )
+        else:
+            if calibration_dir is None:
+                raise ValueError("Static quantization needs QUANTIZATION_CALIBRATION_DIR")
+            images = calibration_images(calibration_dir)
+            if not images:
+                raise ValueError(f"No calibration images in {calibration_dir}")
+            model_input = model.graph.input[0]
+            imgsz = model_input.type.tensor_type.shape.dim[2].dim_value or settings.MODEL_IMGSZ
+            reader = CalibrationReader(images, model_input.name, imgsz)
+            quantize_static(
+                str(source),
+                str(partial),
+                reader,
+                quant_format=QuantFormat.QDQ,
+                op_types_to_quantize=QUANTIZED_OP_TYPES,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                nodes_to_exclude=excluded,
+                calibrate_method=CalibrationMethod.MinMax
+            )
+            summary["calibration_images"] = reader.used
+
+        # Keep the export metadata (class names) the backend reads
+        quantized = onnx.load(str(partial))
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(model.metadata_props)
+        onnx.save(quantized, str(partial))
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+    return summary
+
+def quantized_artifact(weights_path: Path, mode: Optional[str] = None) -> Path:
+    """
+    Get the INT8 graph of a weights file, exporting and quantizing it if needed
+
+    Args:
+        weights_path: Path to the PyTorch ``.pt`` weights
+        mode: One of ``QUANTIZATION_MODES`` (default from settings)
+
+    Returns:
+        Path to the quantized ``.onnx`` file
+    """
+    mode = mode or settings.QUANTIZATION_MODE
+    source = export_artifact(weights_path, "onnx")
+    target = quantized_artifact_path(weights_path, mode)
+    if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+        return target
+
+    print(f"Quantizing {source.name} to INT8 ({mode}, cached at {target})...")
+    started = time.perf_counter()
+    summary = quantize_model(source, target, mode, settings.QUANTIZATION_CALIBRATION_DIR)
+    calibration = f", calibrated on {summary['calibration_images']} images" if mode == "static" else ""
+    print(
+        f"✓ Quantized in {time.perf_counter() - started:.1f}s{calibration}: "
+        f"{source.stat().st_size / 1e6:.1f} MB -> {target.stat().st_size / 1e6:.1f} MB"
+    )
+    return target
@@ -0,0 +1,644 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Union, Iterator, NamedTuple
+import numpy as np
+from models.detector import (
+    BlueprintDetector,
+    detector as default_detector,
+    MODEL_NOT_LOADED,
+    MODEL_LOADING,
+    MODEL_READY,
+    MODEL_FAILED
+)
+from models.backends import BACKENDS
+from models.batcher import BatchScheduler, batch_scheduler as default_scheduler
+from models.detections import Detections
+from core.config import settings
+from core.metrics import metrics_registry
+
+DEFAULT_MODEL = "default"
+
+# Hex digits of the weights hash used as the model version
+VERSION_LENGTH = 12
+
+MODEL_RELOADS = metrics_registry.counter(
+    "model_reloads_total",
+    "Model versions loaded after the first, by model",
+    ("model",)
+)
+MODEL_EVICTIONS = metrics_registry.counter(
+    "model_evictions_total",
+    "Models unloaded to stay within the memory budget or because they were idle",
+    ("model", "reason")
+)
+MODEL_REQUESTS = metrics_registry.counter(
+    "model_requests_total",
+    "Inference calls served, by model and version",
+    ("model", "version")
+)
+
+class UnknownModelError(KeyError):
+    """Raised when a request names a model that is not registered"""
+
+    def __str__(self) -> str:
+        return str(self.args[0]) if self.args else "Unknown model"
+
+class ModelSpec(NamedTuple):
+    """Picklable reference to a registered model, passed to process workers"""
+    name: str
+    path: str
+    backend: str
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def _hash_weights(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:VERSION_LENGTH]
+
+def _rss_bytes() -> Optional[int]:
+    """Resident memory of this process (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class LoadedModel:
+    """One loaded version of a model, with its own batch scheduler"""
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        detector: BlueprintDetector,
+        scheduler: BatchScheduler,
+        stamp: Optional[Tuple[int, int]]
+    ):
+        self.name = name
+        self.version = version
+        self.detector = detector
+        self.scheduler = scheduler
+        self.stamp = stamp
+        self.memory_bytes = 0
+        self.loaded_at = time.time()
+        # Calls currently using this version; a replaced version is unloaded at zero
+        self.active = 0
+        self.retired = False
+
+    @property
+    def tag(self) -> Dict[str, str]:
+        """Model name and version as recorded with stored results"""
+        return {"name": self.name, "version": self.version}
+
+    def predict(
+        self,
+        image: Union[Path, np.ndarray],
+        conf_threshold: float,
+        iou_threshold: float
+    ) -> Detections:
+        """Run one image, sharing a model call with concurrent requests if batching is on"""
+        if settings.BATCH_ENABLED:
+            return self.scheduler.predict(image, conf_threshold, iou_threshold)
+        return self.detector.predict(image, conf_threshold, iou_threshold)
+
+    def close(self):
+        """Stop the scheduler and drop the model so its memory can be freed"""
+        self.scheduler.stop()
+        self.detector.model = None
+        self.detector.state = MODEL_NOT_LOADED
+
+class ModelEntry:
+    """A named model: where its weights are and which version is loaded"""
+
+    def __init__(self, name: str, path: Path, backend: str):
+        self.name = name
+        self.path = path
+        self.backend = backend
+        self.current: Optional[LoadedModel] = None
+        self.state = MODEL_NOT_LOADED
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.last_used = 0.0
+        self.reloads = 0
+        # Version of the file on disk, re-hashed only when size or mtime change
+        self._version: Optional[str] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        # Stamp seen by the watcher on its previous pass, to wait for writes to finish
+        self.pending_stamp: Optional[Tuple[int, int]] = None
+        # One load at a time per model
+        self.load_lock = threading.Lock()
+
+    @property
+    def spec(self) -> ModelSpec:
+        return ModelSpec(self.name, str(self.path), self.backend)
+
+    def version(self) -> Optional[str]:
+        """Version of the weights file currently on disk, None if it is missing"""
+        stamp = _file_stamp(self.path)
+        if stamp != self._stamp:
+            self._version = _hash_weights(self.path) if stamp is not None else None
+            self._stamp = stamp
+        return self._version
+
+    def identity(self) -> Optional[str]:
+        """Cache identity: changes whenever the weights or backend change"""
+        version = self.version()
+        return f"{self.name}@{version}:{self.backend}" if version else None
+
+class ModelRegistry:
+    """
+    Named, versioned models loaded side by side
+
+    Each model is identified by name; its version is a hash of the weights
+    file. A new version (file change seen by the watcher, or an admin
+    reload) is loaded and warmed up next to the old one and swapped in
+    atomically: calls already using the old version finish on it, and it is
+    unloaded when the last one returns. Requests pick a model by name or are
+    routed by weight (sticky per routing key, for A/B tests). Models other
+    than the default are unloaded when idle or to stay within the memory
+    budget, and reloaded on their next use.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: Optional[int] = None,
+        watch_interval: Optional[float] = None,
+        idle_seconds: Optional[float] = None
+    ):
+        """
+        Initialize the registry with the default model and the configured MODELS
+
+        Args:
+            memory_budget_mb: Memory for loaded models (default from settings)
+            watch_interval: Seconds between weight file checks, 0 disables hot reload
+                (default from settings)
+            idle_seconds: Unload non-default models unused this long, 0 never
+                (default from settings)
+        """
+        self.memory_budget = (memory_budget_mb or settings.MODEL_MEMORY_BUDGET_MB) * 1024 * 1024
+        self.watch_interval = (
+            watch_interval if watch_interval is not None else settings.MODEL_WATCH_INTERVAL
+        )
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.MODEL_IDLE_UNLOAD_SECONDS
+        self.routing: Dict[str, float] = {}
+
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        # The first load of the default model reuses the global detector and scheduler
+        self._initial: Optional[Tuple[BlueprintDetector, BatchScheduler]] = (
+            default_detector,
+            default_scheduler
+        )
+
+        self.register(
+            DEFAULT_MODEL,
+            default_detector.model_path,
+            settings.MODEL_BACKENDS.get(DEFAULT_MODEL, default_detector.backend_name)
+        )
+        for name, path in settings.MODELS.items():
+            self.register(name, path)
+        self.set_routing(settings.MODEL_ROUTING)
+
+    # Configuration
+
+    def register(self, name: str, path: Union[str, Path], backend: Optional[str] = None) -> ModelEntry:
+        """
+        Add a model, or point an existing one at other weights
+
+        A loaded model keeps serving its current version until it is reloaded.
+
+        Args:
+            name: Model name used in requests and routing
+            path: Weights file; relative paths are resolved against MODEL_DIR
+            backend: Inference backend (default from MODEL_BACKENDS, then INFERENCE_BACKEND)
+
+        Returns:
+            The model entry
+        """
+        path = Path(path)
+        if not path.is_absolute():
+            path = settings.MODEL_DIR / path
+        backend = backend or settings.MODEL_BACKENDS.get(name) or settings.INFERENCE_BACKEND
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = ModelEntry(name, path, backend)
+                self._entries[name] = entry
+            else:
+                entry.path, entry.backend = path, backend
+        return entry
+
+    def entry(self, name: Optional[str] = None) -> ModelEntry:
+        """
+        Look up a registered model
+
+        Raises:
+            UnknownModelError: If no model has this name
+        """
+        entry = self._entries.get(name or DEFAULT_MODEL)
+        if entry is None:
+            raise UnknownModelError(f"Unknown model: {name}. Available: {', '.join(self._entries)}")
+        return entry
+
+    def set_routing(self, weights: Dict[str, float]):
+        """
+        Set the weighted split for requests that do not name a model
+
+        Args:
+            weights: Model name -> relative weight; empty sends everything to the default
+
+        Raises:
+            UnknownModelError: If a weight names an unregistered model
+            ValueError: If a weight is negative
+        """
+        for name, weight in weights.items():
+            self.entry(name)
+            if weight < 0:
+                raise ValueError(f"Routing weight of {name} must not be negative")
+        self.routing = {name: float(weight) for name, weight in weights.items() if weight > 0}
+
+    def route(self, requested: Optional[str], key: str) -> str:
+        """
+        Choose the model for a request
+
+        Args:
+            requested: Model named by the client, if any
+            key: Routing key (e.g. the blueprint ID); the same key always gets
+                the same model while the weights are unchanged
+
+        Returns:
+            Model name
+
+        Raises:
+            UnknownModelError: If ``requested`` is not registered
+        """
+        if requested:
+            return self.entry(requested).name
+        routing = self.routing
+        if not routing:
+            return DEFAULT_MODEL
+
+        total = sum(routing.values())
+        point = int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) / 0x100000000 * total
+        for name, weight in sorted(routing.items()):
+            point -= weight
+            if point < 0:
+                return name
+        return name
+
+    # Use
+
+    @contextmanager
+    def acquire(self, model: Union[str, ModelSpec, None] = None) -> Iterator[LoadedModel]:
+        """
+        Use the current version of a model for one call, loading it if needed
+
+        Args:
+            model: Model name or spec (a spec also registers the model, so
+                process workers know models added at runtime)
+
+        Yields:
+            The loaded model version; it stays loaded until the block exits
+        """
+        if isinstance(model, ModelSpec):
+            entry = self._entries.get(model.name)
+            if entry is None or str(entry.path) != model.path or entry.backend != model.backend:
+                entry = self.register(model.name, model.path, model.backend)
+        else:
+            entry = self.entry(model)
+
+        loaded = self._checkout(entry)
+        try:
+            yield loaded
+        finally:
+            self._release(loaded)
+
+    def _checkout(self, entry: ModelEntry) -> LoadedModel:
+        while True:
+            with self._lock:
+                loaded = entry.current
+                if loaded is not None:
+                    loaded.active += 1
+                    entry.last_used = time.time()
+                    MODEL_REQUESTS.inc(model=entry.name, version=loaded.version)
+                    return loaded
+            # First use, or unloaded since: load it (concurrent callers wait here)
+            with entry.load_lock:
+                if entry.current is None:
+                    self._install(entry, self._load(entry))
+
+    def _release(self, loaded: LoadedModel):
+        with self._lock:
+            loaded.active -= 1
+            unload = loaded.retired and loaded.active == 0
+        if unload:
+            loaded.close()
+
+    # Loading and unloading
+
+    def _load(self, entry: ModelEntry) -> LoadedModel:
+        """Load and warm up the current weights of a model (not yet installed)"""
+        entry.state = MODEL_LOADING
+        started = time.perf_counter()
+        try:
+            version = entry.version()
+            stamp = _file_stamp(entry.path)
+            self._make_room(entry)
+
+            initial = self._initial if entry.name == DEFAULT_MODEL else None
+            if initial is not None:
+                self._initial = None
+                detector, scheduler = initial
+                detector.model_path, detector.backend_name = entry.path, entry.backend
+            else:
+                detector = BlueprintDetector(entry.path, entry.backend)
+                scheduler = BatchScheduler(detector)
+
+            rss_before = _rss_bytes()
+            if not detector.ready:
+                detector.load_model()
+            elif settings.WARMUP_ON_LOAD and not detector.warmed_up:
+                # Weights loaded before this worker was forked
+                detector.warmup()
+            rss_after = _rss_bytes()
+        except Exception as e:
+            entry.state = MODEL_FAILED if entry.current is None else MODEL_READY
+            entry.error = str(e)
+            raise
+
+        loaded = LoadedModel(entry.name, version, detector, scheduler, stamp)
+        # RSS growth is the best measure; it can read low when other memory was freed meanwhile
+        measured = rss_after - rss_before if rss_before is not None and rss_after is not None else 0
+        loaded.memory_bytes = max(measured, stamp[0] if stamp else 0)
+        if settings.BATCH_ENABLED:
+            scheduler.start()
+        entry.load_seconds = time.perf_counter() - started
+        entry.error = None
+        return loaded
+
+    def _install(self, entry: ModelEntry, loaded: LoadedModel):
+        """Make ``loaded`` the version new calls get"""
+        with self._lock:
+            previous = entry.current
+            entry.current = loaded
+            entry.state = MODEL_READY
+            if previous is not None:
+                entry.reloads += 1
+                previous.retired = True
+                unload = previous.active == 0
+        if previous is not None:
+            MODEL_RELOADS.inc(model=entry.name)
+            print(f"✓ Model {entry.name} updated {previous.version} -> {loaded.version}")
+            if unload:
+                previous.close()
+
+    def _memory_used(self) -> int:
+        return sum(
+            entry.current.memory_bytes
+            for entry in self._entries.values()
+            if entry.current is not None
+        )
+
+    def _make_room(self, loading: ModelEntry):
+        """Unload least recently used idle models until ``loading`` fits the budget"""
+        stamp = _file_stamp(loading.path)
+        needed = loading.current.memory_bytes if loading.current else (stamp[0] if stamp else 0)
+        while self._memory_used() + needed > self.memory_budget:
+            candidates = [
+                entry for entry in self._entries.values()
+                if entry is not loading
+                and entry.name != DEFAULT_MODEL
+                and entry.current is not None
+                and entry.current.active == 0
+            ]
+            if not candidates:
+                print(f"⚠ Loading model {loading.name} exceeds the model memory budget")
+                return
+            victim = min(candidates, key=lambda entry: entry.last_used)
+            if not self.unload(victim.name, reason="memory"):
+                return
+
+    def unload(self, name: str, reason: str = "admin") -> bool:
+        """
+        Unload a model that is not in use; it is loaded again on its next use
+
+        Returns:
+            True if the model was unloaded
+        """
+        entry = self.entry(name)
+        with self._lock:
+            loaded = entry.current
+            if loaded is None or loaded.active:
+                return False
+            entry.current = None
+            entry.state = MODEL_NOT_LOADED
+        loaded.close()
+        MODEL_EVICTIONS.inc(model=name, reason=reason)
+        print(f"Unloaded model {name} ({reason})")
+        return True
+
+    def reload(
+        self,
+        name: str,
+        path: Optional[Union[str, Path]] = None,
+        backend: Optional[str] = None
+    ) -> Dict:
+        """
+        Load the current weights of a model and swap them in without downtime
+
+        Args:
+            name: Model name; a new name registers a new model (``path`` required)
+            path: Point the model at other weights first
+            backend: Switch the model to another inference backend first
+
+        Returns:
+            Model description (see ``describe``)
+        """
+        if path is not None or backend is not None:
+            current = self._entries.get(name)
+            self.register(
+                name,
+                path if path is not None else self.entry(name).path,
+                backend or (current.backend if current is not None else None)
+            )
+        entry = self.entry(name)
+        with entry.load_lock:
+            self._install(entry, self._load(entry))
+        return self.describe(name)
+
+    def preload(self, name: str = DEFAULT_MODEL):
+        """Load a model, logging the outcome instead of raising"""
+        try:
+            with self.acquire(name) as loaded:
+                print(
+                    f"✓ Model {name} ({loaded.version}) loaded successfully "
+                    f"in {self.entry(name).load_seconds:.2f}s"
+                )
+        except FileNotFoundError as e:
+            print(f"⚠ Warning: {e}")
+            print("  The API is running, but detection will fail until you add your YOLO model.")
+        except Exception as e:
+            print(f"✗ Error loading model {name}: {e}")
+
+    # Lifecycle
+
+    def load_for_fork(self) -> bool:
+        """
+        Load the default model's weights in a process that will fork workers
+
+        Nothing is warmed up or started: no runtime threads exist at fork
+        time, and each worker installs the already loaded weights on
+        ``start``, sharing their memory pages copy-on-write.
+
+        Returns:
+            True if the weights were loaded; False if they could not be or
+            the backend creates threads at load time (workers then load their own)
+        """
+        entry = self.entry(DEFAULT_MODEL)
+        backend = BACKENDS.get(entry.backend)
+        if self._initial is None or backend is None or not backend.fork_safe:
+            print(f"⚠ The {entry.backend} backend cannot be shared across forks; each worker loads its own copy")
+            return False
+        detector, _ = self._initial
+        detector.model_path, detector.backend_name = entry.path, entry.backend
+        try:
+            detector.load_model(warmup=False)
+        except Exception as e:
+            print(f"⚠ Loading model before forking failed, each worker will try again: {e}")
+            return False
+        return True
+
+    def start(self, background: bool = True):
+        """
+        Load the default model and start watching weight files
+
+        Args:
+            background: Load on a background thread and return immediately
+        """
+        self._stop.clear()
+        if background:
+            self.entry(DEFAULT_MODEL).state = MODEL_LOADING
+            threading.Thread(target=self.preload, name="model-loader", daemon=True).start()
+        else:
+            self.preload()
+        if self.watch_interval > 0 and (self._watcher is None or not self._watcher.is_alive()):
+            self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        """Stop the watcher and unload every model"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5.0)
+            self._watcher = None
+        with self._lock:
+            loaded = [entry.current for entry in self._entries.values() if entry.current is not None]
+            for entry in self._entries.values():
+                entry.current = None
+                entry.state = MODEL_NOT_LOADED
+        for model in loaded:
+            model.close()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            for entry in list(self._entries.values()):
+                try:
+                    self._check(entry)
+                except Exception as e:
+                    print(f"✗ Reloading model {entry.name} failed: {e}")
+
+    def _check(self, entry: ModelEntry):
+        """Reload a changed weights file once it has stopped changing; unload idle models"""
+        loaded = entry.current
+        if loaded is None:
+            return
+
+        stamp = _file_stamp(entry.path)
+        if stamp is not None and stamp != loaded.stamp:
+            # Wait one more interval so a file still being copied is not loaded
+            if stamp == entry.pending_stamp:
+                entry.pending_stamp = None
+                with entry.load_lock:
+                    self._install(entry, self._load(entry))
+            else:
+                entry.pending_stamp = stamp
+            return
+
+        idle = time.time() - entry.last_used
+        if entry.name != DEFAULT_MODEL and self.idle_seconds > 0 and idle > self.idle_seconds:
+            self.unload(entry.name, reason="idle")
+
+    # Status
+
+    @property
+    def ready(self) -> bool:
+        """Whether the default model is loaded and serving"""
+        return self.entry(DEFAULT_MODEL).current is not None
+
+    def describe(self, name: str = DEFAULT_MODEL) -> Dict:
+        """State, versions, memory and routing weight of a model"""
+        entry = self.entry(name)
+        loaded = entry.current
+        return {
+            "name": entry.name,
+            "state": entry.state,
+            "path": str(entry.path),
+            "backend": entry.backend,
+            "version": loaded.version if loaded else None,
+            "file_version": entry._version,
+            "loaded_at": loaded.loaded_at if loaded else None,
+            "load_seconds": entry.load_seconds,
+            "memory_bytes": loaded.memory_bytes if loaded else 0,
+            "in_flight": loaded.active if loaded else 0,
+            "last_used": entry.last_used or None,
+            "reloads": entry.reloads,
+            "routing_weight": self.routing.get(entry.name, 0.0),
+            "error": entry.error
+        }
+
+    def list_models(self) -> List[Dict]:
+        return [self.describe(name) for name in list(self._entries)]
+
+    def queue_depths(self) -> Dict[Tuple[str], int]:
+        return {
+            (entry.name,): entry.current.scheduler.queue_depth
+            for entry in list(self._entries.values())
+            if entry.current is not None
+        }
+
+    def memory_by_model(self) -> Dict[Tuple[str], int]:
+        return {
+            (entry.name,): entry.current.memory_bytes
+            for entry in list(self._entries.values())
+            if entry.current is not None
+        }
+
+# Global model registry
+model_registry = ModelRegistry()
+
+metrics_registry.gauge(
+    "inference_batch_queue_depth",
+    "Images waiting for the batch scheduler, by model",
+    ("model",),
+    callback=model_registry.queue_depths
+)
+metrics_registry.gauge(
+    "model_memory_bytes",
+    "Estimated memory of each loaded model",
+    ("model",),
+    callback=model_registry.memory_by_model
+)
@@ -0,0 +1,61 @@
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Optional, List, Dict, Literal, Annotated
+
+# Shape of IDs issued by upload (see utils.file_handler.is_valid_blueprint_id)
+BlueprintId = Annotated[str, StringConstraints(pattern=r"^[A-Za-z0-9_-]{1,128}$")]
+
+class TilingOptions(BaseModel):
+    """Per-request settings for tiled sliding-window inference"""
+    enabled: bool = Field(default=False, description="Run detection on overlapping tiles")
+    tile_size: Optional[int] = Field(None, ge=128, le=8192, description="Tile side in pixels")
+    overlap: Optional[float] = Field(None, ge=0.0, lt=0.9, description="Fractional overlap between tiles")
+    merge: Optional[Literal["nms", "wbf", "none"]] = Field(
+        None,
+        description="How duplicates at tile seams are merged"
+    )
+    merge_threshold: Optional[float] = Field(
+        None,
+        gt=0.0,
+        le=1.0,
+        description="Overlap (intersection over smaller box) above which boxes are merged"
+    )
+
+class PostprocessOptions(BaseModel):
+    """Per-request post-processing of raw detections (unset fields use the server defaults)"""
+    min_confidence: Optional[float] = Field(None, ge=0.0, le=1.0, description="Minimum confidence")
+    class_thresholds: Optional[Dict[str, float]] = Field(
+        None,
+        description="Minimum confidence per label, overriding min_confidence"
+    )
+    merge: Optional[Literal["none", "nms", "wbf"]] = Field(
+        None,
+        description="How overlapping duplicates of the same class are merged"
+    )
+    merge_iou: Optional[float] = Field(None, gt=0.0, le=1.0, description="IoU above which boxes are duplicates")
+    containment: Optional[float] = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="Drop boxes at least this much inside a more confident box of their class (0 = off)"
+    )
+    max_per_class: Optional[int] = Field(None, ge=1, description="Keep the most confident boxes of each class")
+    max_detections: Optional[int] = Field(None, ge=1, description="Keep the most confident boxes overall")
+
+class BatchDetectRequest(BaseModel):
+    """Blueprints to detect in one batch request"""
+    ids: List[BlueprintId] = Field(..., min_length=1, description="Blueprint IDs from upload")
+
+class ModelReloadRequest(BaseModel):
+    """Weights to load for a model"""
+    path: Optional[str] = Field(
+        None,
+        description="Weights file inside MODEL_DIR; omit to reload the model's current file"
+    )
+    backend: Optional[str] = Field(
+        None,
+        description="Inference backend to switch to, e.g. \"onnxruntime-int8\"; omit to keep the current one"
+    )
+
+class ModelRoutingRequest(BaseModel):
+    """Weighted split of requests that do not name a model"""
+    weights: Dict[str, float] = Field(..., description="Model name -> relative weight; {} routes all to default")
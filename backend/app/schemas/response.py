@@ -18,6 +18,14 @@ class UploadResponse(BaseModel):
     """Response for successful file upload"""
     id: str = Field(..., description="Unique blueprint ID")
     filename: str = Field(..., description="Original filename")
+    size: Optional[int] = Field(None, description="File size in bytes")
+    sha256: Optional[str] = Field(None, description="SHA-256 content hash")
+    width: Optional[int] = Field(None, description="Image width in pixels")
+    height: Optional[int] = Field(None, description="Image height in pixels")
+    pages: Optional[int] = Field(None, description="Page count of a PDF document")
+    revision_of: Optional[str] = Field(None, description="Blueprint ID of the previous revision")
+    project: Optional[str] = Field(None, description="Project, for corpus analytics")
+    tags: List[str] = Field(default_factory=list, description="Tags, for corpus analytics")
     message: str = Field(default="File uploaded successfully")
 
 class DetectionResponse(BaseModel):
@@ -25,6 +33,12 @@ class DetectionResponse(BaseModel):
     id: str = Field(..., description="Blueprint ID")
     total_detections: int = Field(..., description="Total number of detections")
     detections: List[Detection] = Field(..., description="List of detected elements")
+    pages: Optional[List[dict]] = Field(None, description="Per-page summaries of a PDF document")
+    model: Optional[dict] = Field(None, description="Name and version of the model used")
+    revision: Optional[dict] = Field(
+        None,
+        description="How a revision was detected: changed and recomputed regions, work skipped"
+    )
     message: str = Field(default="Detection completed successfully")
 
 class ResultsResponse(BaseModel):
@@ -32,6 +46,25 @@ class ResultsResponse(BaseModel):
     id: str = Field(..., description="Blueprint ID")
     detections: List[Detection] = Field(..., description="List of detected elements")
     statistics: dict = Field(..., description="Detection statistics by type")
+    pages: Optional[List[dict]] = Field(None, description="Per-page summaries of a PDF document")
+    total_detections: Optional[int] = Field(None, description="Detections stored for the blueprint")
+    model: Optional[dict] = Field(None, description="Name and version of the model used")
+    revision: Optional[dict] = Field(None, description="How a revision was detected (see DetectionResponse)")
+    matched: Optional[int] = Field(None, description="Detections matching the filters")
+    offset: int = Field(default=0, description="Matching detections skipped")
+    limit: Optional[int] = Field(None, description="Max detections returned")
+
+class JobResponse(BaseModel):
+    """Detection job state"""
+    id: str = Field(..., description="Job ID")
+    blueprint_id: str = Field(..., description="Blueprint ID")
+    status: str = Field(..., description="queued, running, done or failed")
+    progress: float = Field(..., ge=0.0, le=1.0, description="Completed fraction")
+    stage: Optional[str] = Field(None, description="Current pipeline stage")
+    result: Optional[dict] = Field(None, description="Detection summary once done")
+    error: Optional[str] = Field(None, description="Error message if failed")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    updated_at: float = Field(..., description="Last update time (Unix seconds)")
 
 class ErrorResponse(BaseModel):
     """Error response"""
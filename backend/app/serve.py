@@ -0,0 +1,180 @@
+"""
+Multi-process server with model weights shared copy-on-write
+
+Usage (from backend/app/):
+    SERVER_WORKERS=4 python serve.py
+
+The parent process loads the default model once, freezes the objects it
+created out of the garbage collector's reach (so collections in the
+workers do not write to, and thereby copy, the pages holding them) and
+forks ``SERVER_WORKERS`` uvicorn workers that accept connections on one
+shared socket. Each worker gets an equal share of the ``CPU_THREADS``
+budget for its intra-op pool, so the workers do not oversubscribe the
+CPUs. Workers that die are replaced from the parent, which still holds
+the loaded weights, and their running jobs are put back in the queue.
+
+Only the PyTorch backend is loaded before forking; ONNX Runtime and
+OpenVINO create their thread pools at load time, which do not survive a
+fork, so with those backends every worker loads its own copy. Models
+other than the default, hot reloads and /metrics are per worker.
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Tuple
+
+# Seconds a worker must have run for its exit to count as a crash rather than a failed start
+MIN_WORKER_UPTIME = 5.0
+# Seconds workers get to finish in-flight requests after SIGTERM
+SHUTDOWN_TIMEOUT = 30.0
+
+def _bind(host: str, port: int) -> socket.socket:
+    """Listening socket inherited by every worker"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(sock: socket.socket, index: int, budget: Tuple[int, int]):
+    """Body of a forked worker; never returns"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        import uvicorn
+        from core.config import settings
+        from core.cpu import apply_thread_budget
+        from main import app
+
+        apply_thread_budget(*budget)
+        print(f"Worker {index} (pid {os.getpid()}): {budget[0]} intra-op / {budget[1]} inter-op threads")
+        server = uvicorn.Server(uvicorn.Config(app, log_level="debug" if settings.DEBUG else "info"))
+        server.run(sockets=[sock])
+    except BaseException as e:
+        print(f"✗ Worker {index} failed: {e}")
+        code = 1
+    finally:
+        sys.stdout.flush()
+        os._exit(code)
+
+def serve(workers: int, host: str, port: int) -> int:
+    """
+    Load the model, fork the workers and supervise them until SIGTERM/SIGINT
+
+    Args:
+        workers: Number of worker processes
+        host: Interface to listen on
+        port: Port to listen on
+
+    Returns:
+        Process exit code
+    """
+    from core.cpu import thread_budget, apply_thread_budget
+    # Every share is computed before any is applied; applying one changes the settings
+    budgets = [thread_budget(workers, index) for index in range(workers)]
+    # Sized like a worker, so libraries that start in the parent do not grab every CPU
+    apply_thread_budget(*budgets[0])
+
+    # Import every module the workers need before forking
+    from main import app
+    from models.registry import model_registry
+    from services.jobs import job_queue
+    from services.results_store import results_store
+    from core.config import settings
+
+    started = time.perf_counter()
+    if model_registry.load_for_fork():
+        print(f"✓ Model loaded once for {workers} worker(s) in {time.perf_counter() - started:.2f}s")
+
+    # Work that must happen once, not once per worker
+    recovered = job_queue.recover()
+    if recovered:
+        print(f"Requeued {recovered} interrupted detection job(s)")
+    job_queue.recover_on_start = False
+    migrated = results_store.migrate_json_results(settings.RESULTS_DIR)
+    if migrated:
+        print(f"✓ Migrated {migrated} JSON results file(s) to the results store")
+    # SQLite connections must not cross a fork
+    job_queue.close()
+    results_store.close()
+
+    sock = _bind(host, port)
+    print(f"Listening on http://{host}:{port} with {workers} worker(s)")
+
+    # Objects created so far are never collected; their pages stay shared
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, Tuple[int, float]] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(sock, index, budgets[index])
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+
+    exit_code = 0
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        if deadline is not None and time.monotonic() > deadline:
+            print(f"⚠ Killing {len(children)} worker(s) still running after {SHUTDOWN_TIMEOUT:.0f}s")
+            for pid in list(children):
+                os.kill(pid, signal.SIGKILL)
+            deadline = float("inf")
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        index, spawned_at = children.pop(pid)
+        if stopping:
+            continue
+
+        print(f"⚠ Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+        recovered = job_queue.recover(worker=pid)
+        job_queue.close()
+        if recovered:
+            print(f"Requeued {recovered} job(s) of worker {index}")
+        if time.monotonic() - spawned_at < MIN_WORKER_UPTIME:
+            # Failing at startup; restarting would only loop
+            print(f"✗ Worker {index} failed during startup, shutting down")
+            exit_code = 1
+            stop(None, None)
+            continue
+        spawn(index)
+
+    sock.close()
+    print("All workers stopped")
+    return exit_code
+
+def main() -> int:
+    from core.config import settings
+    return serve(max(1, settings.SERVER_WORKERS), settings.HOST, settings.PORT)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+Corpus analytics: aggregates of stored detections, maintained incrementally
+
+Every stored result adds its detections to aggregate rows keyed by:
+
+- scope: ``all``, ``project:<name>`` or ``tag:<name>`` (a sheet with
+  several tags counts once in each)
+- period: ``all``, ``month:YYYY-MM`` or ``day:YYYY-MM-DD`` (UTC, when the
+  results were stored)
+- label: a class label, or ``*`` for all labels together
+
+Each row holds the number of sheets and detections, the confidence sum,
+and two histograms: confidence in steps of 1/CONFIDENCE_BINS, and box
+size in powers of two of the longer side. When a result is replaced or
+deleted, the store subtracts what it added, in the same transaction as
+the write, so the aggregates always match the stored results. Queries
+read a few rows per label, whatever the size of the corpus.
+
+The tables live in the results database, and ``rebuild`` recomputes them
+from the stored results.
+"""
+import json
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Optional, List, Dict, Tuple, Callable, Sequence
+import numpy as np
+from core.config import settings
+
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_totals (
+    scope TEXT NOT NULL,
+    period TEXT NOT NULL,
+    label TEXT NOT NULL,
+    sheets INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (scope, period, label)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS analytics_histograms (
+    scope TEXT NOT NULL,
+    period TEXT NOT NULL,
+    label TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (scope, period, label, kind, bin)
+) WITHOUT ROWID;
+"""
+
+ALL = "all"
+ALL_LABELS = "*"
+GRANULARITIES = ("day", "month")
+
+CONFIDENCE_BINS = 20
+# Box size bin k holds longer sides in [2^k, 2^(k+1)) pixels; the last bin is open ended
+SIZE_BINS = 16
+
+def scope_key(project: Optional[str] = None, tag: Optional[str] = None) -> str:
+    """Scope of a query: one project, one tag, or the whole corpus"""
+    if project is not None:
+        return f"project:{project}"
+    if tag is not None:
+        return f"tag:{tag}"
+    return ALL
+
+def scopes_of(project: Optional[str], tags: Optional[Sequence[str]]) -> List[str]:
+    """Every scope a sheet counts in"""
+    scopes = [ALL]
+    if project:
+        scopes.append(scope_key(project=project))
+    scopes.extend(scope_key(tag=tag) for tag in dict.fromkeys(tags or []) if tag)
+    return scopes
+
+def periods_of(timestamp: float) -> List[str]:
+    """Every period a result stored at ``timestamp`` counts in"""
+    day = time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+    return [ALL, f"month:{day[:7]}", f"day:{day}"]
+
+def _is_document_summary(extra: Optional[str]) -> bool:
+    """Whether a stored results row summarizes a PDF document (its pages are the sheets)"""
+    return bool(extra) and "pages" in json.loads(extra)
+
+def _parse_tags(tags: Optional[str]) -> List[str]:
+    return json.loads(tags) if tags else []
+
+class Aggregates:
+    """Pending changes to the aggregate rows, written in one go"""
+
+    def __init__(self):
+        # (scope, period, label) -> [sheets, detections, confidence sum]
+        self.totals: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0, 0, 0.0])
+        # (scope, period, label, kind, bin) -> count
+        self.histograms: Dict[Tuple[str, str, str, str, int], int] = defaultdict(int)
+
+    def add(
+        self,
+        labels: Sequence[str],
+        confidences: np.ndarray,
+        sizes: np.ndarray,
+        scopes: List[str],
+        periods: List[str],
+        sign: int = 1
+    ):
+        """
+        Count the detections of one sheet (or uncount them with ``sign=-1``)
+
+        Args:
+            labels: Label of each detection
+            confidences: Confidence of each detection
+            sizes: Longer box side of each detection, in pixels
+            scopes: Scopes the sheet counts in
+            periods: Periods the sheet counts in
+            sign: 1 to add, -1 to remove
+        """
+        confidence_bins = np.clip((confidences * CONFIDENCE_BINS).astype(np.int64), 0, CONFIDENCE_BINS - 1)
+        size_bins = np.clip(np.log2(np.maximum(sizes, 1.0)).astype(np.int64), 0, SIZE_BINS - 1)
+        names, inverse = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+        groups = [(ALL_LABELS, slice(None))]
+        groups.extend((str(name), inverse == i) for i, name in enumerate(names))
+
+        for label, mask in groups:
+            count = int(confidence_bins[mask].size)
+            confidence_sum = float(confidences[mask].sum(dtype=np.float64))
+            bins = [
+                ("confidence", np.bincount(confidence_bins[mask], minlength=CONFIDENCE_BINS)),
+                ("size", np.bincount(size_bins[mask], minlength=SIZE_BINS))
+            ]
+            bins = [(kind, b, int(histogram[b])) for kind, histogram in bins for b in np.flatnonzero(histogram).tolist()]
+            for scope in scopes:
+                for period in periods:
+                    totals = self.totals[(scope, period, label)]
+                    totals[0] += sign
+                    totals[1] += sign * count
+                    totals[2] += sign * confidence_sum
+                    for kind, b, n in bins:
+                        self.histograms[(scope, period, label, kind, b)] += sign * n
+
+    def add_rows(self, rows: Sequence[sqlite3.Row], scopes: List[str], periods: List[str], sign: int = 1):
+        """Count stored detection rows (label, confidence, width, height)"""
+        confidences = np.array([row["confidence"] for row in rows], dtype=np.float64)
+        sizes = np.array([max(row["width"], row["height"]) for row in rows], dtype=np.float64)
+        self.add([row["label"] for row in rows], confidences, sizes, scopes, periods, sign)
+
+    def write(self, conn: sqlite3.Connection):
+        """Apply the changes (inside the caller's transaction)"""
+        conn.executemany(
+            "INSERT INTO analytics_totals (scope, period, label, sheets, detections, confidence_sum) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (scope, period, label) DO UPDATE SET "
+            "sheets = sheets + excluded.sheets, detections = detections + excluded.detections, "
+            "confidence_sum = confidence_sum + excluded.confidence_sum",
+            ((*key, *values) for key, values in self.totals.items() if any(values))
+        )
+        conn.executemany(
+            "INSERT INTO analytics_histograms (scope, period, label, kind, bin, count) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (scope, period, label, kind, bin) DO UPDATE SET "
+            "count = count + excluded.count",
+            ((*key, count) for key, count in self.histograms.items() if count)
+        )
+        # Rows emptied by removals
+        conn.executemany(
+            "DELETE FROM analytics_totals WHERE scope = ? AND period = ? AND label = ? AND sheets <= 0",
+            (key for key, values in self.totals.items() if values[0] < 0)
+        )
+        conn.executemany(
+            "DELETE FROM analytics_histograms "
+            "WHERE scope = ? AND period = ? AND label = ? AND kind = ? AND bin = ? AND count <= 0",
+            (key for key, count in self.histograms.items() if count < 0)
+        )
+
+class CorpusAnalytics:
+    """
+    Aggregate queries over all stored results
+
+    Owned by the results store, which calls ``record`` inside its write
+    transactions.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], enabled: Optional[bool] = None):
+        """
+        Initialize the analytics
+
+        Args:
+            connect: Connection factory of the results store
+            enabled: Maintain aggregates on writes (default from settings)
+        """
+        self._connect = connect
+        self.enabled = settings.ANALYTICS_ENABLED if enabled is None else enabled
+
+    def create_schema(self, conn: sqlite3.Connection):
+        """Create the tables, aggregating results stored before they existed"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'analytics_totals'"
+        ).fetchone()
+        conn.executescript(ANALYTICS_SCHEMA)
+        if not exists and self.enabled and conn.execute("SELECT 1 FROM results LIMIT 1").fetchone():
+            self.rebuild(conn)
+
+    def record(
+        self,
+        conn: sqlite3.Connection,
+        result_id: str,
+        detections: Optional[List[Dict]] = None,
+        project: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        stored_at: Optional[float] = None
+    ):
+        """
+        Update the aggregates for a result being written or deleted
+
+        Must run in the store's transaction, before the previous
+        detections of the result are deleted: their contribution is
+        subtracted. Summaries of PDF documents are not counted, their
+        pages are.
+
+        Args:
+            conn: Connection in a write transaction
+            result_id: Result being replaced or deleted
+            detections: New detections (label, confidence, xywh bbox); None to delete
+            project: Project of the sheet
+            tags: Tags of the sheet
+            stored_at: Write time of the new results
+        """
+        if not self.enabled:
+            return
+        aggregates = Aggregates()
+        previous = conn.execute(
+            "SELECT project, tags, extra, updated_at FROM results WHERE id = ?", (result_id,)
+        ).fetchone()
+        if previous is not None and not _is_document_summary(previous["extra"]):
+            rows = conn.execute(
+                "SELECT label, confidence, width, height FROM detections WHERE result_id = ?",
+                (result_id,)
+            ).fetchall()
+            aggregates.add_rows(
+                rows,
+                scopes_of(previous["project"], _parse_tags(previous["tags"])),
+                periods_of(previous["updated_at"]),
+                sign=-1
+            )
+        if detections is not None:
+            aggregates.add(
+                [det["label"] for det in detections],
+                np.array([det["confidence"] for det in detections], dtype=np.float64),
+                np.array([max(det["bbox"][2], det["bbox"][3]) for det in detections], dtype=np.float64),
+                scopes_of(project, tags),
+                periods_of(stored_at if stored_at is not None else time.time())
+            )
+        aggregates.write(conn)
+
+    def rebuild(self, conn: Optional[sqlite3.Connection] = None) -> Dict:
+        """
+        Recompute every aggregate from the stored results
+
+        Blocks result writes while it runs.
+
+        Args:
+            conn: Connection to use (default: the store's connection of this thread)
+
+        Returns:
+            Number of results aggregated and the time taken
+        """
+        conn = conn or self._connect()
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM analytics_totals")
+            conn.execute("DELETE FROM analytics_histograms")
+            aggregates = Aggregates()
+            results = [
+                result
+                for result in conn.execute("SELECT id, project, tags, extra, updated_at FROM results")
+                if not _is_document_summary(result["extra"])
+            ]
+            for result in results:
+                rows = conn.execute(
+                    "SELECT label, confidence, width, height FROM detections WHERE result_id = ?",
+                    (result["id"],)
+                ).fetchall()
+                aggregates.add_rows(
+                    rows,
+                    scopes_of(result["project"], _parse_tags(result["tags"])),
+                    periods_of(result["updated_at"])
+                )
+            aggregates.write(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        seconds = time.perf_counter() - started
+        print(f"✓ Rebuilt corpus analytics from {len(results)} results in {seconds:.2f}s")
+        return {"results": len(results), "seconds": seconds}
+
+    # Queries
+
+    def summary(
+        self,
+        scope: str = ALL,
+        period: str = ALL,
+        labels: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Counts, average confidence and histograms of a scope and period
+
+        Args:
+            scope: ``all``, ``project:<name>`` or ``tag:<name>``
+            period: ``all``, ``month:YYYY-MM`` or ``day:YYYY-MM-DD``
+            labels: Only report these labels (totals still cover all)
+
+        Returns:
+            Totals over all labels and the same figures per label
+        """
+        conn = self._connect()
+        entries: Dict[str, Dict] = {}
+        for row in conn.execute(
+            "SELECT label, sheets, detections, confidence_sum FROM analytics_totals "
+            "WHERE scope = ? AND period = ? AND sheets > 0",
+            (scope, period)
+        ):
+            if labels and row["label"] != ALL_LABELS and row["label"] not in labels:
+                continue
+            entries[row["label"]] = {
+                "sheets": row["sheets"],
+                "detections": row["detections"],
+                "avg_confidence": row["confidence_sum"] / row["detections"] if row["detections"] else 0.0,
+                "confidence_histogram": [0] * CONFIDENCE_BINS,
+                "size_histogram": [0] * SIZE_BINS
+            }
+        for row in conn.execute(
+            "SELECT label, kind, bin, count FROM analytics_histograms "
+            "WHERE scope = ? AND period = ? AND count > 0",
+            (scope, period)
+        ):
+            entry = entries.get(row["label"])
+            if entry is not None:
+                entry[f"{row['kind']}_histogram"][row["bin"]] = row["count"]
+
+        total = entries.pop(ALL_LABELS, None) or {
+            "sheets": 0,
+            "detections": 0,
+            "avg_confidence": 0.0,
+            "confidence_histogram": [0] * CONFIDENCE_BINS,
+            "size_histogram": [0] * SIZE_BINS
+        }
+        return {
+            "scope": scope,
+            "period": period,
+            **total,
+            "by_label": dict(sorted(entries.items())),
+            "bins": {
+                "confidence": [round(i / CONFIDENCE_BINS, 4) for i in range(CONFIDENCE_BINS + 1)],
+                "size": [2 ** k for k in range(SIZE_BINS)]
+            }
+        }
+
+    def timeseries(
+        self,
+        scope: str = ALL,
+        granularity: str = "day",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        label: str = ALL_LABELS
+    ) -> List[Dict]:
+        """
+        Sheet and detection counts per day or month
+
+        Args:
+            scope: ``all``, ``project:<name>`` or ``tag:<name>``
+            granularity: "day" or "month"
+            start: First period (``YYYY-MM-DD`` or ``YYYY-MM``), inclusive
+            end: Last period, inclusive
+            label: One label, or ``*`` for all
+
+        Returns:
+            One entry per period with results, in order
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}. Available: {', '.join(GRANULARITIES)}")
+        length = 10 if granularity == "day" else 7
+        low = f"{granularity}:{(start or '')[:length]}"
+        high = f"{granularity}:{(end or '9999-12-31')[:length]}"
+        return [
+            {
+                "period": row["period"].split(":", 1)[1],
+                "sheets": row["sheets"],
+                "detections": row["detections"],
+                "avg_confidence": row["confidence_sum"] / row["detections"] if row["detections"] else 0.0
+            }
+            for row in self._connect().execute(
+                "SELECT period, sheets, detections, confidence_sum FROM analytics_totals "
+                "WHERE scope = ? AND period >= ? AND period <= ? AND label = ? AND sheets > 0 "
+                "ORDER BY period",
+                (scope, low, high, label)
+            )
+        ]
+
+    def list_scopes(self, kind: str) -> List[Dict]:
+        """
+        Every project or tag with its all-time totals
+
+        Args:
+            kind: "project" or "tag"
+
+        Returns:
+            Name, sheets and detections, most sheets first
+        """
+        prefix = f"{kind}:"
+        return [
+            {
+                "name": row["scope"][len(prefix):],
+                "sheets": row["sheets"],
+                "detections": row["detections"]
+            }
+            for row in self._connect().execute(
+                "SELECT scope, sheets, detections FROM analytics_totals "
+                "WHERE scope >= ? AND scope < ? AND period = ? AND label = ? AND sheets > 0 "
+                "ORDER BY sheets DESC, scope",
+                # ';' sorts right after ':', bounding the prefix range on the primary key
+                (prefix, f"{kind};", ALL, ALL_LABELS)
+            )
+        ]
@@ -0,0 +1,117 @@
+import asyncio
+import orjson
+from pathlib import Path
+from typing import Optional, Iterator, AsyncIterator, Awaitable, Callable, Dict, Tuple
+from schemas.request import TilingOptions, PostprocessOptions
+from services.detection import detect_blueprint
+from services.executor import ExecutorBusyError
+from models.batcher import QueueFullError
+from core.config import settings
+
+# Seconds to wait before retrying a sheet when inference capacity is exhausted
+BUSY_BACKOFF_SECONDS = 0.25
+
+# (source name, coroutine function resolving to (blueprint_id, file_path))
+BatchItem = Tuple[str, Callable[[], Awaitable[Tuple[str, Path]]]]
+
+async def _detect_with_backoff(
+    blueprint_id: str,
+    file_path: Path,
+    tiling: Optional[TilingOptions],
+    model: Optional[str] = None,
+    postprocess: Optional[PostprocessOptions] = None
+) -> Dict:
+    """Run detection, waiting for capacity instead of failing the sheet"""
+    while True:
+        try:
+            return await detect_blueprint(blueprint_id, file_path, tiling, model=model, postprocess=postprocess)
+        except (ExecutorBusyError, QueueFullError):
+            await asyncio.sleep(BUSY_BACKOFF_SECONDS)
+
+async def _process_item(
+    index: int,
+    source: str,
+    resolve: Callable[[], Awaitable[Tuple[str, Path]]],
+    tiling: Optional[TilingOptions],
+    model: Optional[str] = None,
+    postprocess: Optional[PostprocessOptions] = None
+) -> Dict:
+    """Resolve and detect one sheet, turning errors into a failed entry"""
+    entry = {"index": index, "source": source, "id": None}
+    try:
+        blueprint_id, file_path = await resolve()
+        entry["id"] = blueprint_id
+        results = await _detect_with_backoff(blueprint_id, file_path, tiling, model, postprocess)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        entry.update(status="failed", error=str(e))
+        return entry
+
+    entry.update(
+        status="done",
+        total_detections=results["total_detections"],
+        detections=results["detections"],
+        statistics=results["statistics"],
+        model=results.get("model")
+    )
+    if "pages" in results:
+        entry["pages"] = results["pages"]
+    return entry
+
+async def stream_batch_results(
+    items: Iterator[BatchItem],
+    tiling: Optional[TilingOptions] = None,
+    concurrency: Optional[int] = None,
+    model: Optional[str] = None,
+    postprocess: Optional[PostprocessOptions] = None
+) -> AsyncIterator[str]:
+    """
+    Detect a sequence of sheets and yield one NDJSON line per finished sheet
+
+    At most ``concurrency`` sheets are resolved or in inference at a time,
+    and a sheet's result is released as soon as its line is yielded, so
+    memory stays bounded regardless of batch size. Concurrent sheets share
+    model calls through the batch scheduler. Lines are emitted in completion
+    order; each carries the ``index`` of its sheet. The last line is a
+    summary. Callers enforce ``MAX_BATCH_ITEMS`` before streaming starts.
+
+    Args:
+        items: Sheets to process, consumed lazily
+        tiling: Optional tiled inference settings for every sheet
+        concurrency: Max sheets in flight (default from settings)
+        model: Model name for every sheet (routed per sheet if None)
+        postprocess: Post-processing settings for every sheet
+
+    Returns:
+        Async iterator of NDJSON lines
+    """
+    concurrency = concurrency or settings.BATCH_DETECT_CONCURRENCY
+    pending = set()
+    summary = {"summary": True, "total": 0, "done": 0, "failed": 0}
+
+    def finished_lines(tasks) -> Iterator[str]:
+        for task in tasks:
+            entry = task.result()
+            summary[entry["status"]] += 1
+            yield orjson.dumps(entry).decode() + "\n"
+
+    try:
+        for index, (source, resolve) in enumerate(items):
+            while len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for line in finished_lines(done):
+                    yield line
+            summary["total"] += 1
+            pending.add(asyncio.create_task(_process_item(index, source, resolve, tiling, model, postprocess)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for line in finished_lines(done):
+                yield line
+    finally:
+        # Client went away: stop remaining work
+        for task in pending:
+            task.cancel()
+
+    yield orjson.dumps(summary).decode() + "\n"
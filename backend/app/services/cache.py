@@ -0,0 +1,332 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict
+import numpy as np
+from models.detections import Detections
+from schemas.request import TilingOptions
+from core.config import settings
+from core.metrics import metrics_registry
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Files whose content hash is remembered, least recently used dropped first
+MAX_CONTENT_HASHES = 10000
+
+# path -> (size, mtime_ns, sha256) so unchanged files are hashed only once
+_content_hashes: "OrderedDict[str, tuple]" = OrderedDict()
+_content_hashes_lock = threading.Lock()
+
+def hash_file(path: Path) -> str:
+    """
+    Get the SHA-256 content hash of a file
+
+    Args:
+        path: File to hash
+
+    Returns:
+        Hex digest
+    """
+    stat = path.stat()
+    key = str(path)
+    with _content_hashes_lock:
+        cached = _content_hashes.get(key)
+        if cached:
+            _content_hashes.move_to_end(key)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    remember_file_hash(path, digest.hexdigest())
+    return digest.hexdigest()
+
+def remember_file_hash(path: Path, content_hash: str):
+    """Record a content hash computed elsewhere (e.g. while uploading)"""
+    stat = path.stat()
+    key = str(path)
+    with _content_hashes_lock:
+        _content_hashes[key] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        _content_hashes.move_to_end(key)
+        while len(_content_hashes) > MAX_CONTENT_HASHES:
+            _content_hashes.popitem(last=False)
+
+def forget_file_hash(path: Path):
+    """Drop the remembered hash of a deleted file"""
+    with _content_hashes_lock:
+        _content_hashes.pop(str(path), None)
+
+def _detections_nbytes(detections: Detections) -> int:
+    """Approximate memory held by a cached result"""
+    return (
+        detections.boxes.nbytes
+        + detections.scores.nbytes
+        + detections.class_ids.nbytes
+        + 256
+    )
+
+class DetectionCache:
+    """
+    Two-tier content-addressed cache of raw detections
+
+    Keys combine the image content hash, the model file identity and the
+    inference parameters, so re-uploads of the same sheet reuse earlier
+    results while a new model or threshold always misses. The memory tier
+    is an LRU bounded by bytes; the disk tier stores ``.npz`` files under
+    ``CACHE_DIR`` and evicts least recently used entries by total size.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        memory_bytes: Optional[int] = None,
+        disk_bytes: Optional[int] = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            directory: Directory for the disk tier (default from settings)
+            memory_bytes: Memory tier budget (default from settings)
+            disk_bytes: Disk tier budget (default from settings)
+        """
+        self.directory = directory or settings.CACHE_DIR
+        self.memory_budget = memory_bytes if memory_bytes is not None else settings.CACHE_MEMORY_BYTES
+        self.disk_budget = disk_bytes if disk_bytes is not None else settings.CACHE_DISK_BYTES
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Detections]" = OrderedDict()
+        self._memory_sizes: Dict[str, int] = {}
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._disk_loaded = False
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions_memory = 0
+        self.evictions_disk = 0
+
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        model_identity: str,
+        conf_threshold: float,
+        iou_threshold: float,
+        tiling: Optional[TilingOptions] = None
+    ) -> str:
+        """
+        Build a cache key for one inference
+
+        Args:
+            content_hash: SHA-256 of the image bytes
+            model_identity: Identity of the model file
+            conf_threshold: Confidence threshold used
+            iou_threshold: IOU threshold used
+            tiling: Tiled inference settings, if any
+
+        Returns:
+            Hex key
+        """
+        tiling_key = None
+        if tiling is not None and tiling.enabled:
+            tiling_key = [
+                tiling.tile_size or settings.TILE_SIZE,
+                tiling.overlap if tiling.overlap is not None else settings.TILE_OVERLAP,
+                tiling.merge or settings.TILE_MERGE,
+                tiling.merge_threshold or settings.TILE_MERGE_THRESHOLD
+            ]
+        payload = json.dumps(
+            [content_hash, model_identity, round(conf_threshold, 6), round(iou_threshold, 6), tiling_key]
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def _load_disk_index(self):
+        """Index existing disk entries, oldest access first (called under lock)"""
+        if self._disk_loaded:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        self._disk_loaded = True
+
+    def get(self, key: str) -> Optional[Detections]:
+        """
+        Look up a cached result
+
+        Args:
+            key: Key from ``make_key``
+
+        Returns:
+            Cached detections, or None on a miss
+        """
+        with self._lock:
+            detections = self._memory.get(key)
+            if detections is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return detections
+
+            self._load_disk_index()
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            detections = self._read_disk(key)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._drop_disk_entry(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits_disk += 1
+            self._put_memory(key, detections)
+        return detections
+
+    def put(self, key: str, detections: Detections):
+        """
+        Store a result in both tiers
+
+        Args:
+            key: Key from ``make_key``
+            detections: Raw detections to cache
+        """
+        path = self._disk_path(key)
+        # Unique per writer: concurrent puts of one key must not share a temp file
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                np.savez(
+                    f,
+                    boxes=detections.boxes,
+                    scores=detections.scores,
+                    class_ids=detections.class_ids,
+                    class_names=np.asarray(json.dumps(
+                        {str(k): v for k, v in detections.class_names.items()}
+                    ))
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        size = path.stat().st_size
+
+        with self._lock:
+            self._put_memory(key, detections)
+            self._load_disk_index()
+            if key in self._disk:
+                self._disk_used -= self._disk.pop(key)
+            self._disk[key] = size
+            self._disk_used += size
+            while self._disk_used > self.disk_budget and len(self._disk) > 1:
+                oldest = next(iter(self._disk))
+                self._drop_disk_entry(oldest)
+                self.evictions_disk += 1
+
+    def _read_disk(self, key: str) -> Detections:
+        path = self._disk_path(key)
+        with np.load(path) as data:
+            class_names = {
+                int(k): v for k, v in json.loads(str(data["class_names"])).items()
+            }
+            detections = Detections(
+                data["boxes"],
+                data["scores"],
+                data["class_ids"],
+                class_names
+            )
+        # Keep access order across restarts
+        os.utime(path)
+        return detections
+
+    def _put_memory(self, key: str, detections: Detections):
+        """Insert into the memory tier and evict by size (called under lock)"""
+        size = _detections_nbytes(detections)
+        if size > self.memory_budget:
+            return
+        if key in self._memory:
+            self._memory_used -= self._memory_sizes.pop(key)
+            del self._memory[key]
+        self._memory[key] = detections
+        self._memory_sizes[key] = size
+        self._memory_used += size
+        while self._memory_used > self.memory_budget:
+            oldest, _ = self._memory.popitem(last=False)
+            self._memory_used -= self._memory_sizes.pop(oldest)
+            self.evictions_memory += 1
+
+    def _drop_disk_entry(self, key: str):
+        """Remove a disk entry and its file (called under lock)"""
+        size = self._disk.pop(key, 0)
+        self._disk_used -= size
+        try:
+            self._disk_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self) -> Dict:
+        """Get hit/miss counters and tier usage"""
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "enabled": settings.CACHE_ENABLED,
+                "lookups": lookups,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                "memory": {
+                    "entries": len(self._memory),
+                    "bytes": self._memory_used,
+                    "budget_bytes": self.memory_budget,
+                    "evictions": self.evictions_memory
+                },
+                "disk": {
+                    "entries": len(self._disk),
+                    "bytes": self._disk_used,
+                    "budget_bytes": self.disk_budget,
+                    "evictions": self.evictions_disk
+                }
+            }
+
+# Global detection cache
+detection_cache = DetectionCache()
+
+def _cache_lookups() -> Dict:
+    stats = detection_cache.get_stats()
+    return {
+        ("memory_hit",): stats["hits_memory"],
+        ("disk_hit",): stats["hits_disk"],
+        ("miss",): stats["misses"]
+    }
+
+metrics_registry.counter(
+    "detection_cache_lookups_total",
+    "Detection cache lookups by outcome",
+    ("result",),
+    callback=_cache_lookups
+)
+metrics_registry.gauge(
+    "detection_cache_hit_ratio",
+    "Share of detection cache lookups served from memory or disk",
+    callback=lambda: detection_cache.get_stats()["hit_rate"]
+)
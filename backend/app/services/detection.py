@@ -0,0 +1,309 @@
+import asyncio
+from pathlib import Path
+from typing import Optional, Callable, Dict, List, Tuple, Union
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from schemas.request import TilingOptions, PostprocessOptions
+from services.inference import run_inference, lookup_cached_detections
+from services.cache import detection_cache
+from services.postprocess import (
+    process_and_save_results,
+    save_document_summary,
+    page_result_id,
+    load_results
+)
+from services.revision import run_incremental_inference, pipeline_signature, revision_tiling
+from services.results_store import results_store
+from utils.file_handler import get_blueprint_path
+from services.executor import inference_executor
+from services.pdf import PagePrefetcher, count_pdf_pages
+from models.detections import Detections
+from models.registry import model_registry
+from core.config import settings
+from core.metrics import stage_timer
+
+# progress(fraction, stage) with fraction in [0, 1]
+ProgressCallback = Callable[[float, str], None]
+
+async def _detect_cached(
+    file_path: Path,
+    source: Union[Path, np.ndarray],
+    tiling: Optional[TilingOptions] = None,
+    variant: Optional[str] = None,
+    tile_progress: Optional[Callable[[int, int], None]] = None,
+    model: Optional[str] = None
+) -> Tuple[Detections, Dict[str, str]]:
+    """Detections for an image and the model that produced them, from the cache or the inference executor"""
+    # Reuse earlier results for identical image bytes, model version and parameters
+    with stage_timer("cache_lookup"):
+        cache_key, detections, tag = await run_in_threadpool(
+            lookup_cached_detections,
+            file_path,
+            tiling,
+            variant,
+            model
+        )
+    if detections is not None:
+        return detections, tag
+    
+    # Run inference on the bounded executor; concurrent requests are batched
+    detections, used = await inference_executor.run(
+        run_inference,
+        source,
+        tiling,
+        tile_progress,
+        model_registry.entry(model).spec
+    )
+    # A model swapped in between lookup and inference gives results for another key
+    if cache_key is not None and used == tag:
+        with stage_timer("cache_store"):
+            await run_in_threadpool(detection_cache.put, cache_key, detections)
+    return detections, used
+
+async def _detect_revision(
+    file_path: Path,
+    previous_id: str,
+    tiling: Optional[TilingOptions],
+    tile_progress: Optional[Callable[[int, int], None]],
+    model: str,
+    postprocess: Optional[PostprocessOptions] = None
+) -> Tuple[Detections, Dict[str, str], Dict, Optional[TilingOptions]]:
+    """
+    Detections for a new revision of a sheet, reusing the previous revision's
+    results outside the regions that changed (see ``run_incremental_inference``)
+    
+    The previous revision's raw detections are taken from the detection
+    cache when they are still there. Otherwise its stored results are
+    reused only if they were tiled and post-processed like this request,
+    since they are post-processed again after the merge.
+    
+    Falls back to regular detection when the previous revision is gone,
+    was never detected, or was detected with other settings.
+    
+    Returns:
+        (raw detections, model tag, revision report, tiling the detections
+        were produced with)
+    """
+    previous_path = await run_in_threadpool(get_blueprint_path, previous_id)
+    previous = None
+    reason = "previous revision has no detection results"
+    if previous_path is not None and previous_path.suffix.lower() != ".pdf":
+        options = revision_tiling(tiling)
+        _, raw, raw_tag = await run_in_threadpool(
+            lookup_cached_detections,
+            previous_path,
+            options,
+            model=model
+        )
+        if raw is not None:
+            previous = {"detections": raw, "model": raw_tag}
+        else:
+            try:
+                stored = await run_in_threadpool(load_results, previous_id)
+            except FileNotFoundError:
+                stored = None
+            if stored is not None:
+                if stored.get("pipeline") == pipeline_signature(options, postprocess):
+                    previous = stored
+                else:
+                    reason = "previous revision was detected with other tiling or post-processing settings"
+    
+    if previous is None:
+        detections, model_tag = await _detect_cached(
+            file_path,
+            file_path,
+            tiling,
+            tile_progress=tile_progress,
+            model=model
+        )
+        return detections, model_tag, {
+            "previous_id": previous_id,
+            "mode": "full",
+            "reason": reason
+        }, tiling
+    
+    detections, model_tag, revision = await inference_executor.run(
+        run_incremental_inference,
+        file_path,
+        previous_path,
+        previous["detections"],
+        previous.get("model"),
+        tiling,
+        tile_progress,
+        model_registry.entry(model).spec
+    )
+    return detections, model_tag, {"previous_id": previous_id, **revision}, options
+
+async def detect_blueprint(
+    blueprint_id: str,
+    file_path: Path,
+    tiling: Optional[TilingOptions] = None,
+    progress: Optional[ProgressCallback] = None,
+    model: Optional[str] = None,
+    incremental: bool = False,
+    postprocess: Optional[PostprocessOptions] = None
+) -> Dict:
+    """
+    Full detection pipeline for one blueprint: cache, inference, statistics, save
+    
+    PDF documents are detected page by page (see ``_detect_document``). A
+    revision of an earlier upload can be detected incrementally (see
+    ``_detect_revision``).
+    
+    Args:
+        blueprint_id: Unique blueprint ID
+        file_path: Path to the uploaded blueprint image or PDF
+        tiling: Optional tiled inference settings
+        progress: Optional callback receiving (fraction, stage) updates
+        model: Model name; if None the blueprint is routed by the configured split
+        incremental: If the blueprint was uploaded as a revision, only re-detect
+            the regions that changed since the previous revision
+        postprocess: Post-processing settings (server defaults if None)
+        
+    Returns:
+        Processed results dictionary (see ``process_and_save_results``)
+        
+    Raises:
+        ExecutorBusyError: If the inference executor is saturated
+        QueueFullError: If the batching queue is full
+        UnknownModelError: If ``model`` is not registered
+    """
+    report = progress or (lambda fraction, stage: None)
+    model = model_registry.route(model, blueprint_id)
+    
+    if file_path.suffix.lower() == ".pdf":
+        return await _detect_document(blueprint_id, file_path, tiling, report, model, postprocess)
+    
+    report(0.05, "inference")
+    tile_progress = None
+    if progress is not None and inference_executor.kind == "thread":
+        # Tiles finish on a worker thread; hop back to the event loop to report
+        loop = asyncio.get_running_loop()
+        
+        def tile_progress(done: int, total: int):
+            loop.call_soon_threadsafe(report, 0.1 + 0.75 * done / total, "inference")
+    
+    blueprint = await run_in_threadpool(results_store.get_blueprint, blueprint_id) if incremental else None
+    extra = {}
+    if blueprint is not None and blueprint.get("revision_of"):
+        raw_detections, model_tag, revision, tiling = await _detect_revision(
+            file_path,
+            blueprint["revision_of"],
+            tiling,
+            tile_progress,
+            model,
+            postprocess
+        )
+        extra["revision"] = revision
+    else:
+        raw_detections, model_tag = await _detect_cached(
+            file_path,
+            file_path,
+            tiling,
+            tile_progress=tile_progress,
+            model=model
+        )
+    
+    # Lets a later revision of this sheet reuse these results
+    extra["pipeline"] = pipeline_signature(tiling, postprocess)
+    
+    # Process and save results
+    report(0.9, "saving")
+    results = await run_in_threadpool(
+        process_and_save_results,
+        blueprint_id,
+        raw_detections,
+        model_tag,
+        extra,
+        postprocess
+    )
+    report(1.0, "done")
+    return results
+
+async def _detect_document(
+    blueprint_id: str,
+    file_path: Path,
+    tiling: Optional[TilingOptions],
+    report: ProgressCallback,
+    model: str,
+    postprocess: Optional[PostprocessOptions] = None
+) -> Dict:
+    """
+    Detect every page of a PDF document
+    
+    Pages are rasterized lazily on a background thread, at most
+    PDF_PREFETCH_PAGES ahead, while earlier pages are in inference; the same
+    number of pages is detected concurrently so they share batched model
+    calls. Each page is saved as its own results entry
+    (``<blueprint_id>_pNNNN``) and the document gets a summary entry.
+    
+    Args:
+        blueprint_id: Unique blueprint ID of the document
+        file_path: Path to the uploaded PDF
+        tiling: Optional tiled inference settings applied to every page
+        report: Progress callback
+        model: Model name
+        postprocess: Post-processing settings applied to every page
+        
+    Returns:
+        Document results (see ``save_document_summary``)
+    """
+    report(0.05, "rasterizing")
+    total = min(await run_in_threadpool(count_pdf_pages, file_path), settings.MAX_PDF_PAGES)
+    if total == 0:
+        raise ValueError("PDF document has no pages")
+    
+    async def detect_page(index: int, image: np.ndarray) -> Dict:
+        detections, model_tag = await _detect_cached(
+            file_path,
+            image,
+            tiling,
+            variant=f"page={index}:dpi={settings.PDF_DPI}",
+            model=model
+        )
+        results = await run_in_threadpool(
+            process_and_save_results,
+            page_result_id(blueprint_id, index),
+            detections,
+            model_tag,
+            None,
+            postprocess
+        )
+        results["page"] = index + 1
+        return results
+    
+    pages: List[Dict] = []
+    pending = set()
+    
+    def collect(done):
+        for task in done:
+            page = task.result()
+            # Keep only the summary; page detections are already on disk
+            page.pop("detections")
+            pages.append(page)
+            report(0.05 + 0.85 * len(pages) / total, f"page {len(pages)}/{total}")
+    
+    prefetcher = PagePrefetcher(file_path)
+    try:
+        while True:
+            while len(pending) >= settings.PDF_PREFETCH_PAGES:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+            page = await run_in_threadpool(prefetcher.next_page)
+            if page is None:
+                break
+            pending.add(asyncio.create_task(detect_page(*page)))
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await run_in_threadpool(prefetcher.close)
+    
+    report(0.9, "saving")
+    results = await run_in_threadpool(save_document_summary, blueprint_id, pages)
+    report(1.0, "done")
+    return results
@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Callable, Any, Dict
+from core.config import settings
+from core.metrics import metrics_registry, record_stage, stage_timer
+from core.cpu import available_cpus
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the in-flight inference limit has been reached"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _init_process_worker(intra_threads: int, interop_threads: int):
+    """Size thread pools and load the default model once per worker process instead of on first request"""
+    from core.cpu import apply_thread_budget
+    from models.registry import model_registry
+    apply_thread_budget(intra_threads, interop_threads)
+    model_registry.start(background=False)
+
+class InferenceExecutor:
+    """
+    Bounded execution layer for blocking inference work
+
+    Blocking calls are handed to a thread or process pool so the event loop
+    stays free for other requests. At most ``max_inflight`` calls are
+    accepted at a time; anything beyond that is rejected immediately with
+    ``ExecutorBusyError`` instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        kind: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        retry_after: Optional[int] = None
+    ):
+        """
+        Initialize the executor
+
+        Args:
+            kind: "thread" or "process" (default from settings)
+            max_workers: Pool size (default from settings)
+            max_inflight: Max accepted calls, running or queued (default from settings)
+            retry_after: Seconds suggested to rejected clients (default from settings)
+        """
+        self.kind = (kind or settings.INFERENCE_EXECUTOR).lower()
+        if self.kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {self.kind}")
+        self.max_workers = max_workers or settings.INFERENCE_WORKERS
+        if self.kind == "thread" and settings.BATCH_ENABLED:
+            # A thread blocks while its request waits in a batch, so fewer threads cap the batch size
+            self.max_workers = max(self.max_workers, settings.BATCH_MAX_SIZE)
+        self.max_inflight = max_inflight or settings.MAX_INFLIGHT_INFERENCES
+        self.retry_after = retry_after or settings.RETRY_AFTER_SECONDS
+
+        self._pool: Optional[Executor] = None
+        self._inflight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def start(self):
+        """Create the worker pool (no-op if already started)"""
+        if self._pool is not None:
+            return
+        if self.kind == "process":
+            # Spawn rather than fork: the parent already runs background threads.
+            # The workers split this process's intra-op threads between them.
+            intra = max(1, (settings.INFERENCE_THREADS or available_cpus()) // self.max_workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(intra, settings.INFERENCE_INTEROP_THREADS)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+
+    def shutdown(self):
+        """Shut down the worker pool, waiting for running calls"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking callable in the pool without blocking the event loop
+
+        Args:
+            fn: Callable to run (must be picklable in process mode)
+            *args: Positional arguments for ``fn``
+            **kwargs: Keyword arguments for ``fn``
+
+        Returns:
+            Return value of ``fn``
+
+        Raises:
+            ExecutorBusyError: If ``max_inflight`` calls are already accepted
+        """
+        # Only touched from the event loop thread, so no lock is needed
+        if self._inflight >= self.max_inflight:
+            self._rejected += 1
+            raise ExecutorBusyError(
+                f"Inference capacity exhausted ({self.max_inflight} requests in flight)",
+                self.retry_after
+            )
+
+        if self._pool is None:
+            self.start()
+
+        self._inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            if self.kind == "thread":
+                # Carry the request context over so stages are attributed to it
+                call = functools.partial(
+                    contextvars.copy_context().run,
+                    _timed_call,
+                    call,
+                    time.perf_counter()
+                )
+            with stage_timer("inference"):
+                return await loop.run_in_executor(self._pool, call)
+        finally:
+            self._inflight -= 1
+            self._completed += 1
+
+    def get_metrics(self) -> Dict:
+        """Get executor utilisation counters"""
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "in_flight": self._inflight,
+            "max_in_flight": self.max_inflight,
+            "completed": self._completed,
+            "rejected": self._rejected
+        }
+
+def _timed_call(call: Callable, submitted: float) -> Any:
+    """Record how long a call waited for a worker thread, then run it"""
+    record_stage("executor_wait", time.perf_counter() - submitted)
+    return call()
+
+# Global inference executor
+inference_executor = InferenceExecutor()
+
+metrics_registry.gauge(
+    "inference_in_flight",
+    "Inference calls accepted by the executor (running or waiting for a worker)",
+    callback=lambda: inference_executor.inflight
+)
+metrics_registry.counter(
+    "inference_rejected_total",
+    "Inference calls rejected because the executor was saturated",
+    callback=lambda: inference_executor.get_metrics()["rejected"]
+)
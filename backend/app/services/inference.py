@@ -1,34 +1,112 @@
 from pathlib import Path
-from typing import List, Dict
-from models.detector import detector
+from typing import Dict, Optional, Tuple, Callable, Union
+import numpy as np
+from models.detections import Detections
+from models.batcher import QueueFullError
+from models.registry import model_registry, ModelSpec
+from schemas.request import TilingOptions
+from services.tiling import predict_tiled
+from services.cache import detection_cache, hash_file
+from services.preprocess import prepare_image, preprocess_signature
 from core.config import settings
 
-def run_inference(image_path: Path) -> List[Dict]:
+def run_inference(
+    image_path: Union[Path, np.ndarray],
+    tiling: Optional[TilingOptions] = None,
+    tile_progress: Optional[Callable[[int, int], None]] = None,
+    model: Optional[ModelSpec] = None
+) -> Tuple[Detections, Dict[str, str]]:
     """
     Run YOLO inference on a blueprint image
     
     Args:
-        image_path: Path to blueprint image
+        image_path: Path to blueprint image, or a decoded BGR image (e.g. a PDF page);
+            prepared with the PREPROCESS_* settings before inference
+        tiling: Optional tiled inference settings for large sheets
+        tile_progress: Optional callback receiving (tiles done, total tiles)
+        model: Model to run (default model if None)
         
     Returns:
-        List of raw detection results
+        (raw columnar detection results, name and version of the model that produced them)
     """
     try:
-        detections = detector.predict(
-            image_path=image_path,
-            conf_threshold=settings.CONFIDENCE_THRESHOLD,
-            iou_threshold=settings.IOU_THRESHOLD
-        )
-        return detections
+        with model_registry.acquire(model) as loaded:
+            if tiling is not None and tiling.enabled:
+                detections = predict_tiled(
+                    image_path,
+                    tiling,
+                    conf_threshold=settings.CONFIDENCE_THRESHOLD,
+                    iou_threshold=settings.IOU_THRESHOLD,
+                    progress=tile_progress,
+                    detector=loaded.detector
+                )
+            else:
+                # Decoded once (or taken from the decoded image cache) and handed over as an array
+                image, scale = prepare_image(image_path, max_side=settings.PREPROCESS_MAX_SIDE)
+                # Shares a model call with other concurrent requests when batching is on
+                detections = loaded.predict(
+                    image,
+                    settings.CONFIDENCE_THRESHOLD,
+                    settings.IOU_THRESHOLD
+                )
+                if scale != (1.0, 1.0):
+                    detections = detections.scale(*scale)
+        return detections, loaded.tag
+    except QueueFullError:
+        # Let the API layer turn this into a fast 503 instead of a 500
+        raise
     except Exception as e:
         raise RuntimeError(f"Inference failed: {str(e)}")
 
-def get_detection_statistics(detections: List[Dict]) -> Dict:
+def lookup_cached_detections(
+    image_path: Path,
+    tiling: Optional[TilingOptions] = None,
+    variant: Optional[str] = None,
+    model: Optional[str] = None
+) -> Tuple[Optional[str], Optional[Detections], Optional[Dict[str, str]]]:
+    """
+    Look up detections for an image in the content-addressed cache
+    
+    Args:
+        image_path: Path to blueprint image
+        tiling: Tiled inference settings the result must have been produced with
+        variant: Part of the file the detections belong to (e.g. a PDF page and DPI)
+        model: Model name (default model if None)
+        
+    Returns:
+        (cache key, cached detections or None, name and version of the model
+        on disk); the key is None when caching is disabled
+    """
+    entry = model_registry.entry(model)
+    identity = entry.identity()
+    if identity is None:
+        return None, None, None
+    tag = {"name": entry.name, "version": entry.version()}
+    if not settings.CACHE_ENABLED:
+        return None, None, tag
+    
+    content_hash = hash_file(image_path)
+    if variant is not None:
+        content_hash = f"{content_hash}:{variant}"
+    signature = preprocess_signature()
+    if signature is not None:
+        content_hash = f"{content_hash}:{signature}"
+    
+    key = detection_cache.make_key(
+        content_hash,
+        identity,
+        settings.CONFIDENCE_THRESHOLD,
+        settings.IOU_THRESHOLD,
+        tiling
+    )
+    return key, detection_cache.get(key), tag
+
+def get_detection_statistics(detections: Detections) -> Dict:
     """
     Calculate statistics from detections
     
     Args:
-        detections: List of detection dictionaries
+        detections: Columnar detections
         
     Returns:
         Statistics dictionary
@@ -39,17 +117,16 @@ def get_detection_statistics(detections: List[Dict]) -> Dict:
         "avg_confidence": 0.0
     }
     
-    if not detections:
+    if not len(detections):
         return stats
     
     # Count by type
-    total_confidence = 0.0
-    for det in detections:
-        label = det["label"]
-        stats["by_type"][label] = stats["by_type"].get(label, 0) + 1
-        total_confidence += det["confidence"]
+    counts = np.bincount(detections.class_ids)
+    for class_id in np.flatnonzero(counts).tolist():
+        label = detections.class_names[class_id]
+        stats["by_type"][label] = int(counts[class_id])
     
     # Average confidence
-    stats["avg_confidence"] = total_confidence / len(detections)
+    stats["avg_confidence"] = float(detections.scores.mean(dtype=np.float64))
     
     return stats
@@ -0,0 +1,398 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, List, Dict, Set
+from starlette.concurrency import run_in_threadpool
+from schemas.request import TilingOptions, PostprocessOptions
+from services.detection import detect_blueprint
+from services.executor import ExecutorBusyError
+from models.batcher import QueueFullError
+from utils.file_handler import get_blueprint_path
+from core.config import settings
+from core.metrics import metrics_registry, record_stage
+
+TERMINAL_STATES = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    blueprint_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    stage TEXT,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_blueprint ON jobs (blueprint_id);
+"""
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are already waiting"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class JobQueue:
+    """
+    Persistent detection job queue backed by SQLite
+
+    Jobs survive restarts: anything still marked running at startup is put
+    back in the queue. Background worker tasks claim queued jobs in FIFO
+    order and run them through ``detect_blueprint``. Progress changes are
+    written to the database and pushed to in-process subscribers (used for
+    server-sent events).
+
+    Several server processes can share one database. Each claim records the
+    process ID, so a supervisor can requeue exactly the jobs of a worker
+    that died.
+
+    Only asynchronous submissions go through the queue; synchronous
+    ``POST /detect`` calls the inference executor directly so it keeps its
+    fast 503 backpressure and full micro-batching.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        workers: Optional[int] = None,
+        max_queued: Optional[int] = None
+    ):
+        """
+        Initialize the queue
+
+        Args:
+            db_path: SQLite database file (default from settings)
+            workers: Number of concurrent worker tasks (default from settings)
+            max_queued: Max queued jobs before submissions are rejected (default from settings)
+        """
+        self.db_path = db_path or settings.JOBS_DB_PATH
+        self.workers = workers or settings.JOB_WORKERS
+        self.max_queued = max_queued or settings.JOB_QUEUE_MAX
+        # Off in workers of a supervisor, which recovers jobs itself
+        self.recover_on_start = True
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    # Database helpers (run in a worker thread)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._add_missing_columns(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection):
+        """Upgrade tables created by older versions"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("worker",):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def recover(self, worker: Optional[int] = None) -> int:
+        """
+        Requeue jobs interrupted by a restart or a dead worker process
+
+        Args:
+            worker: Only the jobs of this process ID (all jobs if None)
+
+        Returns:
+            Number of running jobs put back in the queue
+        """
+        scope, params = ("", ()) if worker is None else (" AND worker = ?", (worker,))
+        with self._db_lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = 'requeued', worker = NULL, updated_at = ? "
+                f"WHERE status = 'running'{scope}",
+                (time.time(), *params)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        """Close the database connection (reopened on next use)"""
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.close()
+                self._conn = None
+
+    def queued_count(self) -> int:
+        """Number of jobs waiting for a worker"""
+        with self._db_lock:
+            (queued,) = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()
+        return queued
+
+    def _insert(self, job_id: str, blueprint_id: str, params: Dict) -> Dict:
+        with self._db_lock:
+            conn = self._connect()
+            (queued,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()
+            if queued >= self.max_queued:
+                raise JobQueueFullError(
+                    f"Job queue is full ({queued} jobs waiting)",
+                    settings.RETRY_AFTER_SECONDS
+                )
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (id, blueprint_id, status, progress, stage, params, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', 0, 'queued', ?, ?, ?)",
+                (job_id, blueprint_id, json.dumps(params), now, now)
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row)
+
+    def _claim(self) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running"""
+        pid = os.getpid()
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', stage = 'starting', "
+                    "attempts = attempts + 1, worker = ?, updated_at = ? WHERE id = ?",
+                    (pid, time.time(), row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = self._row_to_dict(row)
+        job["status"] = "running"
+        job["stage"] = "starting"
+        job["worker"] = pid
+        return job
+
+    def _update(self, job_id: str, **fields) -> Optional[Dict]:
+        fields["updated_at"] = time.time()
+        for key in ("params", "result"):
+            if key in fields and not isinstance(fields[key], str) and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def _fetch(self, job_id: str) -> Optional[Dict]:
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._row_to_dict(rows[0]) if rows else None
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # Public API
+
+    async def start(self):
+        """Recover interrupted jobs and start the worker tasks"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        if self.recover_on_start:
+            recovered = await run_in_threadpool(self.recover)
+            if recovered:
+                print(f"Requeued {recovered} interrupted detection job(s)")
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Cancel worker tasks; running jobs are requeued on next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.close()
+
+    async def submit(
+        self,
+        blueprint_id: str,
+        tiling: Optional[TilingOptions] = None,
+        model: Optional[str] = None,
+        incremental: bool = False,
+        postprocess: Optional[PostprocessOptions] = None
+    ) -> Dict:
+        """
+        Queue a detection job
+
+        Args:
+            blueprint_id: Unique blueprint ID
+            tiling: Optional tiled inference settings
+            model: Model name (routed when the job runs if None)
+            incremental: Only re-detect what changed if the blueprint is a revision
+            postprocess: Post-processing settings (server defaults if None)
+
+        Returns:
+            The new job record
+
+        Raises:
+            JobQueueFullError: If JOB_QUEUE_MAX jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        params = {
+            "tiling": tiling.model_dump() if tiling is not None else None,
+            "model": model,
+            "incremental": incremental,
+            "postprocess": postprocess.model_dump(exclude_none=True) if postprocess is not None else None
+        }
+        job = await run_in_threadpool(self._insert, job_id, blueprint_id, params)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job record by ID"""
+        return await run_in_threadpool(self._fetch, job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Receive every update of a job as it happens"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, job: Dict):
+        for queue in self._subscribers.get(job["id"], ()):
+            queue.put_nowait(job)
+
+    # Workers
+
+    async def _worker(self):
+        while True:
+            job = await run_in_threadpool(self._claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # Poll as well, so jobs queued by other processes are picked up
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._publish(job)
+            record_stage("job_wait", max(0.0, time.time() - job["created_at"]))
+            await self._run_job(job)
+
+    async def _run_job(self, job: Dict):
+        job_id = job["id"]
+        pending: List[asyncio.Task] = []
+
+        def progress(fraction: float, stage: str):
+            # Drop tiny increments so large tiled jobs do not flood the database
+            if fraction - job["progress"] < 0.02 and stage == job["stage"]:
+                return
+            job["progress"], job["stage"] = fraction, stage
+            previous = pending[-1] if pending else None
+            pending.append(asyncio.create_task(report_after(previous, fraction, stage)))
+
+        async def report_after(previous: Optional[asyncio.Task], fraction: float, stage: str):
+            # Concurrent pages report from several tasks; keep updates in order
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            await self._report(job_id, progress=fraction, stage=stage)
+
+        try:
+            file_path = await run_in_threadpool(get_blueprint_path, job["blueprint_id"])
+            if not file_path:
+                raise FileNotFoundError(f"Blueprint not found: {job['blueprint_id']}")
+
+            tiling_params = job["params"].get("tiling")
+            tiling = TilingOptions(**tiling_params) if tiling_params else None
+            postprocess_params = job["params"].get("postprocess")
+            postprocess = PostprocessOptions(**postprocess_params) if postprocess_params else None
+            results = await detect_blueprint(
+                job["blueprint_id"],
+                file_path,
+                tiling,
+                progress,
+                job["params"].get("model"),
+                job["params"].get("incremental", False),
+                postprocess
+            )
+            # Progress writes must land before the final state
+            await asyncio.gather(*pending)
+        except (ExecutorBusyError, QueueFullError) as e:
+            # Capacity is taken by other producers; try again shortly
+            await self._report(job_id, status="queued", stage="waiting for capacity")
+            await asyncio.sleep(getattr(e, "retry_after", settings.RETRY_AFTER_SECONDS))
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await asyncio.gather(*pending, return_exceptions=True)
+            await self._report(job_id, status="failed", stage="failed", error=str(e))
+            return
+
+        summary = {
+            "total_detections": results["total_detections"],
+            "statistics": results["statistics"],
+            "model": results.get("model")
+        }
+        for key in ("pages", "revision"):
+            if key in results:
+                summary[key] = results[key]
+        await self._report(job_id, status="done", progress=1.0, stage="done", result=summary)
+
+    async def _report(self, job_id: str, **fields):
+        job = await run_in_threadpool(self._update, job_id, **fields)
+        if job is not None:
+            self._publish(job)
+
+# Global job queue
+job_queue = JobQueue()
+
+metrics_registry.gauge(
+    "job_queue_depth",
+    "Detection jobs waiting for a worker",
+    callback=job_queue.queued_count
+)
@@ -0,0 +1,184 @@
+import math
+import queue
+import threading
+from pathlib import Path
+from typing import Optional, Iterator, Tuple
+import numpy as np
+from core.config import settings
+from core.metrics import stage_timer
+
+# Global lock around every pdfium call: the library is not thread-safe, and
+# job prefetchers, upload page counts, tile renders and pyramid builds all
+# reach it from different threads
+_pdfium_lock = threading.Lock()
+
+def _open_document(pdf_path: Path):
+    """
+    Open a PDF with pypdfium2 (imported lazily, PDF support is optional)
+
+    Must be called with ``_pdfium_lock`` held.
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise RuntimeError("PDF support requires the pypdfium2 package")
+    return pdfium.PdfDocument(str(pdf_path))
+
+def count_pdf_pages(pdf_path: Path) -> int:
+    """Get the number of pages in a PDF"""
+    with _pdfium_lock:
+        document = _open_document(pdf_path)
+        try:
+            return len(document)
+        finally:
+            document.close()
+
+def _page_scale(width_pt: float, height_pt: float, dpi: int) -> float:
+    """Render scale for a page at ``dpi``, reduced if it would exceed MAX_IMAGE_PIXELS"""
+    scale = dpi / 72.0
+    pixels = width_pt * scale * height_pt * scale
+    if pixels > settings.MAX_IMAGE_PIXELS:
+        scale *= math.sqrt(settings.MAX_IMAGE_PIXELS / pixels)
+    return scale
+
+def iter_pdf_pages(
+    pdf_path: Path,
+    dpi: Optional[int] = None,
+    max_pages: Optional[int] = None
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Rasterize PDF pages lazily, one page at a time
+
+    Args:
+        pdf_path: Path to the PDF
+        dpi: Render resolution (default from settings)
+        max_pages: Stop after this many pages (default from settings)
+
+    Returns:
+        Iterator of (page index, BGR image array); only the current page is in memory
+
+    The pdfium lock is taken per page, never across a ``yield``, so other
+    documents can render while the consumer works on a page.
+    """
+    dpi = dpi or settings.PDF_DPI
+    max_pages = max_pages or settings.MAX_PDF_PAGES
+    with _pdfium_lock:
+        document = _open_document(pdf_path)
+        page_count = len(document)
+    try:
+        for index in range(min(page_count, max_pages)):
+            with stage_timer("pdf_rasterize"), _pdfium_lock:
+                page = document[index]
+                try:
+                    width_pt, height_pt = page.get_size()
+                    bitmap = page.render(
+                        scale=_page_scale(width_pt, height_pt, dpi),
+                        may_draw_forms=False
+                    )
+                    # Copy out of the pdfium buffer before it is released
+                    image = np.array(bitmap.to_numpy()[..., :3], copy=True)
+                    bitmap.close()
+                finally:
+                    page.close()
+            yield index, image
+    finally:
+        with _pdfium_lock:
+            document.close()
+
+def render_pdf_page(pdf_path: Path, page_index: int, dpi: Optional[int] = None) -> np.ndarray:
+    """
+    Rasterize a single PDF page
+
+    Args:
+        pdf_path: Path to the PDF
+        page_index: Zero-based page index
+        dpi: Render resolution (default from settings)
+
+    Returns:
+        BGR image array
+    """
+    with _pdfium_lock:
+        document = _open_document(pdf_path)
+        try:
+            if not 0 <= page_index < len(document):
+                raise IndexError(f"Page {page_index + 1} out of range (document has {len(document)} pages)")
+            page = document[page_index]
+            try:
+                width_pt, height_pt = page.get_size()
+                bitmap = page.render(
+                    scale=_page_scale(width_pt, height_pt, dpi or settings.PDF_DPI),
+                    may_draw_forms=False
+                )
+                image = np.array(bitmap.to_numpy()[..., :3], copy=True)
+                bitmap.close()
+            finally:
+                page.close()
+            return image
+        finally:
+            document.close()
+
+class PagePrefetcher:
+    """
+    Rasterize pages on a background thread ahead of the consumer
+
+    At most ``prefetch`` rendered pages wait in memory, so rasterization of
+    the next pages overlaps with inference on the current one without ever
+    holding the whole document.
+    """
+
+    _DONE = object()
+
+    def __init__(self, pdf_path: Path, dpi: Optional[int] = None, prefetch: Optional[int] = None):
+        self._pages: "queue.Queue" = queue.Queue(maxsize=max(1, prefetch or settings.PDF_PREFETCH_PAGES))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce,
+            args=(pdf_path, dpi),
+            name="pdf-rasterizer",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        """Blocking put that gives up when the consumer stops"""
+        while not self._stop.is_set():
+            try:
+                self._pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, pdf_path: Path, dpi: Optional[int]):
+        try:
+            for item in iter_pdf_pages(pdf_path, dpi):
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(self._DONE)
+
+    def next_page(self) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Block until the next page is rendered
+
+        Returns:
+            (page index, BGR image), or None when the document is finished
+        """
+        item = self._pages.get()
+        if item is self._DONE:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        """Stop rasterizing and release queued pages"""
+        self._stop.set()
+        while True:
+            try:
+                self._pages.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join(timeout=5)
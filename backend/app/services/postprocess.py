@@ -1,27 +1,154 @@
-import json
-from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from models.detections import Detections
+from models.suppression import greedy_suppression, fuse_boxes
+from schemas.request import PostprocessOptions
 from schemas.response import Detection
-from utils.file_handler import get_results_path
+from services.inference import get_detection_statistics
+from services.results_store import results_store
+from services.retention import retention_manager, results_size
+from core.config import settings
+from core.metrics import stage_timer
 
 def filter_detections(
-    detections: List[Dict],
+    detections: Detections,
     min_confidence: float = 0.25
-) -> List[Dict]:
+) -> Detections:
     """
     Filter detections by confidence threshold
     
     Args:
-        detections: Raw detection results
+        detections: Raw columnar detection results
         min_confidence: Minimum confidence threshold
         
     Returns:
         Filtered detections
     """
-    return [
-        det for det in detections
-        if det["confidence"] >= min_confidence
-    ]
+    return detections.select(detections.scores >= min_confidence)
+
+def resolve_postprocess(options: Optional[PostprocessOptions] = None) -> PostprocessOptions:
+    """Request options with every unset field taken from the server defaults"""
+    defaults = PostprocessOptions(
+        min_confidence=settings.POSTPROCESS_MIN_CONFIDENCE,
+        class_thresholds=settings.POSTPROCESS_CLASS_THRESHOLDS,
+        merge=settings.POSTPROCESS_MERGE,
+        merge_iou=settings.POSTPROCESS_MERGE_IOU,
+        containment=settings.POSTPROCESS_CONTAINMENT,
+        max_per_class=settings.POSTPROCESS_MAX_PER_CLASS or None,
+        max_detections=settings.POSTPROCESS_MAX_DETECTIONS or None
+    )
+    if options is None:
+        return defaults
+    return defaults.model_copy(update=options.model_dump(exclude_none=True))
+
+def apply_class_thresholds(
+    detections: Detections,
+    min_confidence: float,
+    class_thresholds: Optional[Dict[str, float]] = None
+) -> Detections:
+    """
+    Filter detections by a confidence threshold per class
+    
+    Args:
+        detections: Columnar detections
+        min_confidence: Threshold of classes without their own
+        class_thresholds: Label -> threshold
+        
+    Returns:
+        Filtered detections
+    """
+    if not class_thresholds:
+        return filter_detections(detections, min_confidence)
+    size = max(detections.class_names, default=-1) + 1
+    thresholds = np.full(max(size, 1), min_confidence, dtype=np.float32)
+    for class_id, label in detections.class_names.items():
+        if label in class_thresholds:
+            thresholds[class_id] = class_thresholds[label]
+    return detections.select(detections.scores >= thresholds[detections.class_ids])
+
+def cap_detections(
+    detections: Detections,
+    max_per_class: Optional[int] = None,
+    max_detections: Optional[int] = None
+) -> Detections:
+    """
+    Keep the most confident detections of each class and overall
+    
+    Args:
+        detections: Columnar detections
+        max_per_class: Max detections of one class (no cap if None)
+        max_detections: Max detections in total (no cap if None)
+        
+    Returns:
+        Capped detections in descending confidence order
+    """
+    order = np.argsort(-detections.scores, kind="stable")
+    if max_per_class:
+        # Position of each detection among its class, by confidence
+        by_class = order[np.argsort(detections.class_ids[order], kind="stable")]
+        classes = detections.class_ids[by_class]
+        starts = np.searchsorted(classes, classes, side="left")
+        within = np.arange(len(by_class)) - starts
+        keep = np.zeros(len(detections), dtype=bool)
+        keep[by_class[within < max_per_class]] = True
+        order = order[keep[order]]
+    if max_detections:
+        order = order[:max_detections]
+    return detections.select(order)
+
+def postprocess_detections(
+    detections: Detections,
+    options: Optional[PostprocessOptions] = None
+) -> Detections:
+    """
+    Turn raw detections into the results that are stored and returned
+    
+    Steps, each optional and vectorized over all boxes: per-class
+    confidence thresholds, class-aware NMS or weighted box fusion of
+    overlapping duplicates, suppression of boxes contained in a more
+    confident box of the same class, then per-class and total caps.
+    
+    Args:
+        detections: Raw columnar detections
+        options: Per-request settings (server defaults if None)
+        
+    Returns:
+        Post-processed detections in descending confidence order
+    """
+    options = resolve_postprocess(options)
+    detections = apply_class_thresholds(detections, options.min_confidence, options.class_thresholds)
+    
+    if options.merge in ("nms", "wbf") and len(detections) > 1:
+        kept, owner = greedy_suppression(
+            detections.boxes,
+            detections.scores,
+            detections.class_ids,
+            options.merge_iou,
+            metric="iou"
+        )
+        if options.merge == "wbf":
+            boxes = fuse_boxes(detections.boxes, detections.scores, kept, owner)
+            detections = Detections(
+                boxes,
+                detections.scores[kept],
+                detections.class_ids[kept],
+                detections.class_names
+            )
+        else:
+            detections = detections.select(kept)
+    
+    if options.containment and len(detections) > 1:
+        kept, _ = greedy_suppression(
+            detections.boxes,
+            detections.scores,
+            detections.class_ids,
+            options.containment,
+            metric="containment",
+            inclusive=True
+        )
+        detections = detections.select(kept)
+    
+    return cap_detections(detections, options.max_per_class, options.max_detections)
 
 def format_detections(detections: List[Dict]) -> List[Detection]:
     """
@@ -35,71 +162,185 @@ def format_detections(detections: List[Dict]) -> List[Detection]:
     """
     return [Detection(**det) for det in detections]
 
-def save_results(blueprint_id: str, detections: List[Dict], statistics: Dict):
+def save_results(
+    blueprint_id: str,
+    detections: List[Dict],
+    statistics: Dict,
+    extra: Optional[Dict] = None,
+    model: Optional[Dict] = None
+):
     """
-    Save detection results to JSON file
+    Save detection results to the results store
     
     Args:
         blueprint_id: Unique blueprint ID
         detections: List of detections
         statistics: Detection statistics
+        extra: Additional top-level fields (e.g. the pages of a PDF document)
+        model: Name and version of the model that produced the detections
     """
-    results = {
-        "id": blueprint_id,
-        "detections": detections,
-        "statistics": statistics
-    }
-    
-    results_path = get_results_path(blueprint_id)
-    with results_path.open("w") as f:
-        json.dump(results, f, indent=2)
+    if model:
+        extra = {**(extra or {}), "model": model}
+    results_store.put_results(blueprint_id, detections, statistics, extra)
+    retention_manager.track(
+        "results",
+        blueprint_id,
+        results_size(len(detections)),
+        blueprint_id=parse_page_result_id(blueprint_id)[0]
+    )
 
-def load_results(blueprint_id: str) -> Dict:
+def load_results(
+    blueprint_id: str,
+    labels: Optional[List[str]] = None,
+    min_confidence: Optional[float] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    viewport: Optional[Tuple[float, float, float, float]] = None,
+    min_box_size: Optional[float] = None
+) -> Dict:
     """
-    Load detection results from JSON file
+    Load detection results from the results store
     
     Args:
-        blueprint_id: Unique blueprint ID
+        blueprint_id: Unique blueprint ID (or page results ID of a PDF)
+        labels: Only return detections with one of these labels
+        min_confidence: Only return detections at least this confident
+        offset: Matching detections to skip
+        limit: Max detections to return (all if None)
+        viewport: Only return boxes intersecting this (x1, y1, x2, y2) region
+        min_box_size: Only return boxes with a longer side of at least this many pixels
         
     Returns:
         Results dictionary
         
     Raises:
-        FileNotFoundError: If results file doesn't exist
+        FileNotFoundError: If no results exist for the blueprint
     """
-    results_path = get_results_path(blueprint_id)
-    
-    if not results_path.exists():
+    results = results_store.get_results(
+        blueprint_id,
+        labels,
+        min_confidence,
+        offset,
+        limit,
+        viewport,
+        min_box_size
+    )
+    if results is None:
         raise FileNotFoundError(f"Results not found for blueprint ID: {blueprint_id}")
-    
-    with results_path.open("r") as f:
-        return json.load(f)
+    return results
 
 def process_and_save_results(
     blueprint_id: str,
-    raw_detections: List[Dict],
-    statistics: Dict
+    raw_detections: Detections,
+    model: Optional[Dict] = None,
+    extra: Optional[Dict] = None,
+    options: Optional[PostprocessOptions] = None
 ) -> Dict:
     """
     Process raw detections and save to disk
     
     Args:
         blueprint_id: Unique blueprint ID
-        raw_detections: Raw YOLO detections
-        statistics: Detection statistics
+        raw_detections: Raw columnar YOLO detections
+        model: Name and version of the model that produced the detections
+        extra: Additional fields stored and returned with the results
+        options: Post-processing settings (server defaults if None)
         
     Returns:
         Processed results dictionary
     """
-    # Filter low-confidence detections
-    filtered_detections = filter_detections(raw_detections)
+    # Threshold, merge and cap, then convert once for storage and the API
+    with stage_timer("postprocess"):
+        detections = postprocess_detections(raw_detections, options)
+        filtered_detections = detections.to_dicts()
+    
+    # Statistics describe what is stored
+    with stage_timer("statistics"):
+        statistics = get_detection_statistics(detections)
     
     # Save to disk
-    save_results(blueprint_id, filtered_detections, statistics)
+    with stage_timer("results_write"):
+        save_results(blueprint_id, filtered_detections, statistics, extra, model=model)
     
     return {
         "id": blueprint_id,
         "detections": filtered_detections,
         "statistics": statistics,
-        "total_detections": len(filtered_detections)
+        "total_detections": len(filtered_detections),
+        "model": model,
+        **(extra or {})
+    }
+
+def page_result_id(blueprint_id: str, page_index: int) -> str:
+    """Results ID of one page of a PDF document"""
+    return f"{blueprint_id}_p{page_index + 1:04d}"
+
+def parse_page_result_id(result_id: str) -> Tuple[str, Optional[int]]:
+    """Split a results ID into (blueprint ID, zero-based page index or None)"""
+    blueprint_id, _, page = result_id.rpartition("_p")
+    if blueprint_id and len(page) == 4 and page.isdigit():
+        return blueprint_id, int(page) - 1
+    return result_id, None
+
+def merge_statistics(statistics: List[Dict]) -> Dict:
+    """
+    Combine the statistics of several pages into document totals
+    
+    Args:
+        statistics: Per-page statistics dictionaries
+        
+    Returns:
+        Statistics dictionary for the whole document
+    """
+    merged = {"total": 0, "by_type": {}, "avg_confidence": 0.0}
+    weighted_confidence = 0.0
+    for stats in statistics:
+        merged["total"] += stats["total"]
+        weighted_confidence += stats["avg_confidence"] * stats["total"]
+        for label, count in stats["by_type"].items():
+            merged["by_type"][label] = merged["by_type"].get(label, 0) + count
+    
+    if merged["total"]:
+        merged["avg_confidence"] = weighted_confidence / merged["total"]
+    return merged
+
+def save_document_summary(blueprint_id: str, pages: List[Dict]) -> Dict:
+    """
+    Save the document-level summary of a multi-page blueprint
+    
+    Detections stay in the per-page results; the summary lists the pages
+    with their results IDs and counts, plus statistics for the document.
+    
+    Args:
+        blueprint_id: Unique blueprint ID of the document
+        pages: Per-page results (see ``process_and_save_results``) with a ``page`` number
+        
+    Returns:
+        Processed results dictionary for the document
+    """
+    pages = sorted(pages, key=lambda page: page["page"])
+    summaries = [
+        {
+            "page": page["page"],
+            "id": page["id"],
+            "total_detections": page["total_detections"],
+            "statistics": page["statistics"],
+            "model": page.get("model")
+        }
+        for page in pages
+    ]
+    statistics = merge_statistics([page["statistics"] for page in pages])
+    # Pages detected before and after a model swap can differ; then no single model is reported
+    models = {tuple(sorted(page["model"].items())) for page in summaries if page["model"]}
+    model = dict(models.pop()) if len(models) == 1 else None
+    
+    save_results(blueprint_id, [], statistics, extra={"pages": summaries}, model=model)
+    
+    return {
+        "id": blueprint_id,
+        "detections": [],
+        "statistics": statistics,
+        "total_detections": sum(page["total_detections"] for page in pages),
+        "pages": summaries,
+        "model": model
     }
@@ -0,0 +1,320 @@
+"""
+Image preprocessing ahead of inference
+
+Sheets are decoded once into NumPy arrays, which are handed to the model
+directly instead of a file path the model would decode again. Blueprints
+are mostly monochrome line art, so two fast paths are offered:
+
+- ``gray``: decode straight to one channel (a JPEG skips its color
+  conversion; the image takes a third of the memory)
+- ``binary``: gray, then cut into ink and paper, which also drops scan
+  noise and paper tint
+
+Whole-sheet inference can work on a copy bounded by ``PREPROCESS_MAX_SIDE``
+(the model letterboxes to a few hundred pixels anyway). JPEGs are then
+decoded at reduced resolution by the codec itself. Boxes are scaled back
+to sheet pixels by the caller.
+
+Decoded images are kept in a memory-bounded LRU keyed by content hash, so
+repeat detections, the tile pyramid build and revision diffs of the same
+sheet decode it only once. Cached arrays are read-only.
+"""
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Tuple, Union
+import numpy as np
+from services.cache import hash_file
+from utils.file_handler import probe_image_header, InvalidImageError, MAX_HEADER_BYTES
+from core.config import settings
+from core.metrics import metrics_registry, stage_timer
+
+COLOR_MODES = ("color", "gray", "binary")
+
+# (horizontal, vertical) factor from prepared image back to sheet pixels
+Scale = Tuple[float, float]
+
+class DecodedImageCache:
+    """
+    LRU of decoded (and prepared) images bounded by their total bytes
+
+    Keys are ``<content hash>:<mode>:<max side>``; images larger than the
+    whole budget are not cached.
+    """
+
+    def __init__(self, memory_bytes: Optional[int] = None):
+        """
+        Initialize the cache
+
+        Args:
+            memory_bytes: Budget in bytes (default from settings)
+        """
+        self.memory_budget = memory_bytes if memory_bytes is not None else settings.DECODE_CACHE_BYTES
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, Scale]]" = OrderedDict()
+        self._used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, Scale]]:
+        """Cached (image, scale), or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key: str) -> Optional[Tuple[np.ndarray, Scale]]:
+        """Like ``get`` without counting a lookup"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, image: np.ndarray, scale: Scale):
+        """Cache an image, evicting least recently used ones to stay in budget"""
+        if image.nbytes > self.memory_budget:
+            return
+        image.flags.writeable = False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._used -= previous[0].nbytes
+            self._entries[key] = (image, scale)
+            self._used += image.nbytes
+            while self._used > self.memory_budget:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._used -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._used = 0
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._used,
+                "budget_bytes": self.memory_budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """Single-channel copy of a BGR image (grayscale images are returned as is)"""
+    if image.ndim == 2:
+        return image
+    import cv2
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def binarize(gray: np.ndarray, threshold: Optional[int] = None) -> np.ndarray:
+    """
+    Ink (0) and paper (255) of a grayscale sheet
+
+    Args:
+        gray: Grayscale image
+        threshold: Cut-off, pixels darker are ink (default from settings; 0 = Otsu)
+
+    Returns:
+        Binary uint8 image
+    """
+    import cv2
+    threshold = settings.PREPROCESS_BINARY_THRESHOLD if threshold is None else threshold
+    if threshold > 0:
+        return cv2.threshold(gray, threshold - 1, 255, cv2.THRESH_BINARY)[1]
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+
+def _bounded_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Size with the longer side at most ``max_side``, keeping aspect ratio"""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    ratio = max_side / max(width, height)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+def _finish(image: np.ndarray, mode: str, width: int, height: int, max_side: int) -> Tuple[np.ndarray, Scale]:
+    """
+    Convert a decoded image to the color mode and size bound
+
+    Binarizing happens before downscaling so hairlines fade to gray
+    instead of vanishing.
+
+    Args:
+        image: Decoded image (possibly already reduced by the codec)
+        mode: One of ``COLOR_MODES``
+        width: Width of the sheet
+        height: Height of the sheet
+        max_side: Size bound (0 = none)
+
+    Returns:
+        (prepared image, scale from prepared image to sheet pixels)
+    """
+    if mode != "color":
+        image = to_gray(image)
+    if mode == "binary":
+        image = binarize(image)
+    new_w, new_h = _bounded_size(width, height, max_side)
+    if (new_w, new_h) != (image.shape[1], image.shape[0]):
+        image = _downscale(image, new_w, new_h)
+    return image, (width / new_w, height / new_h)
+
+def _downscale(image: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Shrink an image by halving (area average, like the tile pyramid) and a final linear step
+
+    INTER_AREA at arbitrary ratios is an order of magnitude slower than at
+    exactly one half, while the remaining factor below 2 is small enough
+    for linear interpolation.
+    """
+    import cv2
+    while image.shape[1] >= 2 * width and image.shape[0] >= 2 * height:
+        image = cv2.resize(image, ((image.shape[1] + 1) // 2, (image.shape[0] + 1) // 2), interpolation=cv2.INTER_AREA)
+    if (width, height) == (image.shape[1], image.shape[0]):
+        return image
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+
+def _reduced_decode_flag(path: Path, mode: str, max_side: int) -> Tuple[int, Optional[Tuple[int, int]]]:
+    """
+    OpenCV imread flag, decoding a JPEG at 1/2, 1/4 or 1/8 size when the bound allows
+
+    Returns:
+        (flag, (width, height) of the sheet if known from the header)
+    """
+    import cv2
+    gray = mode != "color"
+    flag = cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+    if not max_side:
+        return flag, None
+    try:
+        with path.open("rb") as f:
+            probe = probe_image_header(f.read(MAX_HEADER_BYTES))
+    except (OSError, InvalidImageError):
+        return flag, None
+    if probe is None:
+        return flag, None
+    image_format, width, height = probe
+    # Binarizing needs full resolution to keep hairlines; other codecs gain nothing
+    if image_format != "jpeg" or mode == "binary":
+        return flag, (width, height)
+    reduced = {
+        (False, 2): cv2.IMREAD_REDUCED_COLOR_2, (False, 4): cv2.IMREAD_REDUCED_COLOR_4,
+        (False, 8): cv2.IMREAD_REDUCED_COLOR_8, (True, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        (True, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4, (True, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8
+    }
+    for factor in (8, 4, 2):
+        if max(width, height) / factor >= max_side:
+            return reduced[(gray, factor)], (width, height)
+    return flag, (width, height)
+
+def load_image(
+    path: Path,
+    mode: Optional[str] = None,
+    max_side: Optional[int] = None
+) -> Tuple[np.ndarray, Scale]:
+    """
+    Decode and prepare an image file, through the decoded image cache
+
+    A gray or binary request is served from a cached full-size color decode
+    of the same file when there is one, instead of decoding again.
+
+    Args:
+        path: Image file
+        mode: One of ``COLOR_MODES`` (default from settings)
+        max_side: Longer side bound, 0 = full size (default 0)
+
+    Returns:
+        (read-only prepared image, scale from prepared image to sheet pixels)
+
+    Raises:
+        ValueError: If the file cannot be decoded
+    """
+    mode = mode or settings.PREPROCESS_COLOR_MODE
+    max_side = max_side or 0
+    if mode not in COLOR_MODES:
+        raise ValueError(f"Unknown color mode: {mode}. Available: {', '.join(COLOR_MODES)}")
+
+    use_cache = decoded_image_cache.memory_budget > 0
+    if use_cache:
+        content_hash = hash_file(path)
+        key = f"{content_hash}:{mode}:{max_side}"
+        cached = decoded_image_cache.get(key)
+        if cached is not None:
+            return cached
+        source = None if key.endswith(":color:0") else decoded_image_cache.peek(f"{content_hash}:color:0")
+    else:
+        source = None
+
+    if source is not None:
+        with stage_timer("preprocess"):
+            color = source[0]
+            image, scale = _finish(color, mode, color.shape[1], color.shape[0], max_side)
+    else:
+        import cv2
+        flag, size = _reduced_decode_flag(path, mode, max_side)
+        with stage_timer("decode"):
+            image = cv2.imread(str(path), flag)
+        if image is None:
+            raise ValueError(f"Could not decode image: {path}")
+        width, height = size or (image.shape[1], image.shape[0])
+        with stage_timer("preprocess"):
+            image, scale = _finish(image, mode, width, height, max_side)
+
+    if use_cache:
+        decoded_image_cache.put(key, image, scale)
+    return image, scale
+
+def prepare_image(
+    source: Union[Path, np.ndarray],
+    mode: Optional[str] = None,
+    max_side: Optional[int] = None
+) -> Tuple[np.ndarray, Scale]:
+    """
+    Prepare a sheet for the model: decode if needed, apply color mode and size bound
+
+    Args:
+        source: Image file, or a decoded BGR image (e.g. a rendered PDF page)
+        mode: One of ``COLOR_MODES`` (default from settings)
+        max_side: Longer side bound, 0 = full size (default 0)
+
+    Returns:
+        (prepared image, scale from prepared image to sheet pixels)
+    """
+    if not isinstance(source, np.ndarray):
+        return load_image(Path(source), mode, max_side)
+    mode = mode or settings.PREPROCESS_COLOR_MODE
+    if mode not in COLOR_MODES:
+        raise ValueError(f"Unknown color mode: {mode}. Available: {', '.join(COLOR_MODES)}")
+    with stage_timer("preprocess"):
+        return _finish(source, mode, source.shape[1], source.shape[0], max_side or 0)
+
+def preprocess_signature() -> Optional[str]:
+    """Preprocessing settings that change detections, None when at the defaults"""
+    if settings.PREPROCESS_COLOR_MODE == "color" and not settings.PREPROCESS_MAX_SIDE:
+        return None
+    threshold = settings.PREPROCESS_BINARY_THRESHOLD if settings.PREPROCESS_COLOR_MODE == "binary" else None
+    return f"{settings.PREPROCESS_COLOR_MODE}:{threshold}:{settings.PREPROCESS_MAX_SIDE}"
+
+# Global decoded image cache
+decoded_image_cache = DecodedImageCache()
+
+metrics_registry.counter(
+    "decoded_image_cache_lookups_total",
+    "Decoded image cache lookups by outcome",
+    ("result",),
+    callback=lambda: {
+        ("hit",): decoded_image_cache.get_stats()["hits"],
+        ("miss",): decoded_image_cache.get_stats()["misses"]
+    }
+)
+metrics_registry.gauge(
+    "decoded_image_cache_bytes",
+    "Memory held by decoded images",
+    callback=lambda: decoded_image_cache.get_stats()["bytes"]
+)
@@ -0,0 +1,214 @@
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Tuple
+import numpy as np
+from services.cache import hash_file
+from services.preprocess import load_image
+from services.pdf import render_pdf_page
+from services.postprocess import parse_page_result_id
+from services.retention import retention_manager, directory_size
+from utils.file_handler import get_blueprint_path, is_valid_blueprint_id
+from core.config import settings
+from core.metrics import stage_timer
+
+MANIFEST_NAME = "pyramid.json"
+
+def pyramid_levels(width: int, height: int, tile_size: int) -> int:
+    """Number of levels so that level 0 fits in a single tile"""
+    longest = max(width, height)
+    if longest <= tile_size:
+        return 1
+    return math.ceil(math.log2(longest / tile_size)) + 1
+
+def _encode_params(image_format: str):
+    import cv2
+    if image_format in ("jpg", "jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, settings.PYRAMID_JPEG_QUALITY]
+    if image_format == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, settings.PYRAMID_JPEG_QUALITY]
+    return []
+
+def build_pyramid(
+    image: np.ndarray,
+    output_dir: Path,
+    etag: str,
+    tile_size: Optional[int] = None,
+    image_format: Optional[str] = None
+) -> Dict:
+    """
+    Cut an image into a deep-zoom tile pyramid
+
+    The highest level is the full-resolution image; each level below halves
+    the size until the whole image fits in one tile (level 0). Tiles are
+    written as ``<level>/<col>_<row>.<format>``, then the manifest.
+
+    Args:
+        image: Decoded BGR image
+        output_dir: Directory to write the pyramid into
+        etag: Version tag of the source image, used in tile ETags
+        tile_size: Tile side in pixels (default from settings)
+        image_format: Tile encoding, "jpg", "png" or "webp" (default from settings)
+
+    Returns:
+        Pyramid manifest
+    """
+    import cv2
+    tile_size = tile_size or settings.PYRAMID_TILE_SIZE
+    image_format = image_format or settings.PYRAMID_FORMAT
+    params = _encode_params(image_format)
+    height, width = image.shape[:2]
+    levels = pyramid_levels(width, height, tile_size)
+
+    level_image = image
+    for level in range(levels - 1, -1, -1):
+        level_dir = output_dir / str(level)
+        level_dir.mkdir(parents=True, exist_ok=True)
+        level_height, level_width = level_image.shape[:2]
+        for row in range(math.ceil(level_height / tile_size)):
+            for col in range(math.ceil(level_width / tile_size)):
+                tile = level_image[
+                    row * tile_size:(row + 1) * tile_size,
+                    col * tile_size:(col + 1) * tile_size
+                ]
+                ok, encoded = cv2.imencode(f".{image_format}", tile, params)
+                if not ok:
+                    raise RuntimeError(f"Failed to encode tile {level}/{col}_{row}")
+                (level_dir / f"{col}_{row}.{image_format}").write_bytes(encoded.tobytes())
+
+        if level > 0:
+            level_image = cv2.resize(
+                level_image,
+                (max(1, (level_width + 1) // 2), max(1, (level_height + 1) // 2)),
+                interpolation=cv2.INTER_AREA
+            )
+
+    manifest = {
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "levels": levels,
+        "format": image_format,
+        "etag": etag
+    }
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest))
+    return manifest
+
+class PyramidStore:
+    """
+    On-disk tile pyramids of uploaded blueprints and PDF pages
+
+    Pyramids are immutable once written: each one is built in a scratch
+    directory and renamed into place, and a lock per pyramid ensures
+    concurrent requests for a missing pyramid build it only once.
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = root or settings.PYRAMID_DIR
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def pyramid_dir(self, pyramid_id: str) -> Path:
+        if not is_valid_blueprint_id(pyramid_id):
+            raise FileNotFoundError(f"Blueprint not found: {pyramid_id}")
+        return self.root / pyramid_id
+
+    def _lock(self, pyramid_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(pyramid_id, threading.Lock())
+
+    def _load_source(self, pyramid_id: str) -> Tuple[np.ndarray, str]:
+        """Decode the image (or PDF page) a pyramid is built from"""
+        blueprint_id, page_index = parse_page_result_id(pyramid_id)
+        file_path = get_blueprint_path(blueprint_id)
+        if file_path is None:
+            raise FileNotFoundError(f"Blueprint not found: {blueprint_id}")
+
+        if file_path.suffix.lower() == ".pdf":
+            if page_index is None:
+                raise FileNotFoundError(
+                    f"{blueprint_id} is a PDF document; request a page such as {blueprint_id}_p0001"
+                )
+            try:
+                image = render_pdf_page(file_path, page_index)
+            except IndexError as e:
+                raise FileNotFoundError(str(e))
+        elif page_index is not None:
+            raise FileNotFoundError(f"Blueprint {blueprint_id} has no pages")
+        else:
+            # Viewer tiles are always in color; the decode is kept for detection
+            image, _ = load_image(file_path, mode="color")
+
+        etag = hash_file(file_path)[:16]
+        if page_index is not None:
+            etag = f"{etag}p{page_index + 1}-{settings.PDF_DPI}"
+        return image, etag
+
+    def ensure(self, pyramid_id: str) -> Dict:
+        """
+        Get the manifest of a pyramid, building the pyramid if needed
+
+        Args:
+            pyramid_id: Blueprint ID, or ``<id>_pNNNN`` for a PDF page
+
+        Returns:
+            Pyramid manifest
+
+        Raises:
+            FileNotFoundError: If the blueprint (or page) does not exist
+        """
+        final_dir = self.pyramid_dir(pyramid_id)
+        if (final_dir / MANIFEST_NAME).exists():
+            return load_manifest(final_dir)
+
+        with self._lock(pyramid_id):
+            if (final_dir / MANIFEST_NAME).exists():
+                return load_manifest(final_dir)
+
+            image, etag = self._load_source(pyramid_id)
+            scratch_dir = self.root / f".{pyramid_id}.{uuid.uuid4().hex}"
+            try:
+                with stage_timer("pyramid_build"):
+                    manifest = build_pyramid(image, scratch_dir, etag)
+                os.replace(scratch_dir, final_dir)
+            except BaseException:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+                raise
+            retention_manager.track(
+                "pyramid",
+                pyramid_id,
+                directory_size(final_dir),
+                path=final_dir,
+                blueprint_id=parse_page_result_id(pyramid_id)[0]
+            )
+        with self._locks_guard:
+            self._locks.pop(pyramid_id, None)
+        return manifest
+
+    def build_in_background(self, pyramid_id: str):
+        """Build a pyramid after upload; failures are logged, tiles retry on demand"""
+        try:
+            self.ensure(pyramid_id)
+        except Exception as e:
+            print(f"Pyramid build failed for {pyramid_id}: {e}")
+
+    def tile_path(self, pyramid_id: str, manifest: Dict, level: int, col: int, row: int) -> Optional[Path]:
+        """Path of one tile, or None if it is outside the pyramid"""
+        if not 0 <= level < manifest["levels"]:
+            return None
+        path = self.pyramid_dir(pyramid_id) / str(level) / f"{col}_{row}.{manifest['format']}"
+        return path if path.exists() else None
+
+@lru_cache(maxsize=1024)
+def load_manifest(pyramid_dir: Path) -> Dict:
+    """Read a pyramid manifest; manifests never change once written"""
+    with (pyramid_dir / MANIFEST_NAME).open("r") as f:
+        return json.load(f)
+
+# Global pyramid store
+pyramid_store = PyramidStore()
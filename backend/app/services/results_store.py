@@ -0,0 +1,486 @@
+import json
+import math
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+from core.config import settings
+from services.analytics import CorpusAnalytics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blueprints (
+    id TEXT PRIMARY KEY,
+    filename TEXT,
+    path TEXT NOT NULL,
+    format TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    width INTEGER,
+    height INTEGER,
+    pages INTEGER,
+    revision_of TEXT,
+    project TEXT,
+    tags TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blueprints_created ON blueprints (created_at);
+CREATE INDEX IF NOT EXISTS idx_blueprints_sha256 ON blueprints (sha256);
+
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    blueprint_id TEXT NOT NULL,
+    page INTEGER,
+    total_detections INTEGER NOT NULL,
+    statistics TEXT NOT NULL,
+    extra TEXT,
+    project TEXT,
+    tags TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_blueprint ON results (blueprint_id, page);
+CREATE INDEX IF NOT EXISTS idx_results_updated ON results (updated_at);
+
+CREATE TABLE IF NOT EXISTS detections (
+    result_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    width REAL NOT NULL,
+    height REAL NOT NULL,
+    PRIMARY KEY (result_id, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_detections_label ON detections (result_id, label, confidence);
+CREATE INDEX IF NOT EXISTS idx_detections_confidence ON detections (result_id, confidence);
+"""
+
+# R*Tree over detection boxes. The first dimension is the rowid of the
+# result, so a query for one sheet only descends into that sheet's boxes.
+# Integer coordinates are rounded outwards; exact filtering happens on the
+# detections table.
+_SPATIAL_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS detection_boxes USING rtree_i32(
+    id, min_key, max_key, min_x, max_x, min_y, max_y, +idx
+);
+"""
+
+# (x1, y1, x2, y2) in image pixels
+Viewport = Tuple[float, float, float, float]
+
+# Results IDs of PDF pages, see services.postprocess.page_result_id
+_PAGE_ID = re.compile(r"^(?P<blueprint_id>.+)_p(?P<page>\d{4})$")
+
+class ResultsStore:
+    """
+    Detection results and upload metadata in an indexed SQLite database
+
+    Detections are stored one row per box, clustered by result, so a
+    filtered or paginated read touches only the rows it returns. Each
+    thread gets its own connection; with WAL, reads never wait for writes.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        Initialize the store
+
+        Args:
+            db_path: SQLite database file (default from settings)
+        """
+        self.db_path = db_path or settings.RESULTS_DB_PATH
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.spatial_index = True
+        self.analytics = CorpusAnalytics(self._connect)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA busy_timeout=5000")
+            with self._lock:
+                if not self._schema_ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._add_missing_columns(conn)
+                    self._create_spatial_index(conn)
+                    self.analytics.create_schema(conn)
+                    self._schema_ready = True
+                self._connections.append(conn)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _add_missing_columns(self, conn: sqlite3.Connection):
+        """Upgrade tables created by older versions"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(blueprints)")}
+        for column in ("revision_of", "project", "tags"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE blueprints ADD COLUMN {column} TEXT")
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(results)")}
+        for column in ("project", "tags"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE results ADD COLUMN {column} TEXT")
+
+    def _create_spatial_index(self, conn: sqlite3.Connection):
+        """Create the R*Tree, indexing results stored before it existed"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'detection_boxes'"
+        ).fetchone()
+        try:
+            conn.executescript(_SPATIAL_SCHEMA)
+        except sqlite3.OperationalError as e:
+            # SQLite built without R*Tree: viewport queries scan the sheet instead
+            print(f"⚠ Spatial index unavailable ({e}); viewport queries will scan")
+            self.spatial_index = False
+            return
+        if not exists:
+            conn.execute(
+                "INSERT INTO detection_boxes (min_key, max_key, min_x, max_x, min_y, max_y, idx) "
+                "SELECT r.rowid, r.rowid, CAST(d.x AS INTEGER) - 1, CAST(d.x + d.width AS INTEGER) + 1, "
+                "CAST(d.y AS INTEGER) - 1, CAST(d.y + d.height AS INTEGER) + 1, d.idx "
+                "FROM detections d JOIN results r ON r.id = d.result_id"
+            )
+
+    def _delete_boxes(self, conn: sqlite3.Connection, result_id: str):
+        """Drop the spatial index entries of a result"""
+        if not self.spatial_index:
+            return
+        row = conn.execute("SELECT rowid FROM results WHERE id = ?", (result_id,)).fetchone()
+        if row is not None:
+            conn.execute(
+                "DELETE FROM detection_boxes WHERE min_key >= ? AND max_key <= ?",
+                (row[0], row[0])
+            )
+
+    def close(self):
+        """Close every connection opened by the store"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._schema_ready = False
+        self._local = threading.local()
+
+    # Blueprints
+
+    def register_blueprint(
+        self,
+        blueprint_id: str,
+        path: Path,
+        filename: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """
+        Record an uploaded blueprint
+
+        Args:
+            blueprint_id: Unique blueprint ID
+            path: Where the uploaded file is stored
+            filename: Original filename
+            metadata: Upload info (format, size, sha256, width, height, pages,
+                revision_of: ID of the previous revision of the same sheet,
+                project and tags: grouping for corpus analytics)
+        """
+        metadata = metadata or {}
+        self._connect().execute(
+            "INSERT OR REPLACE INTO blueprints "
+            "(id, filename, path, format, size, sha256, width, height, pages, revision_of, project, tags, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                blueprint_id,
+                filename,
+                str(path),
+                metadata.get("format"),
+                metadata.get("size"),
+                metadata.get("sha256"),
+                metadata.get("width"),
+                metadata.get("height"),
+                metadata.get("pages"),
+                metadata.get("revision_of"),
+                metadata.get("project"),
+                json.dumps(metadata["tags"]) if metadata.get("tags") else None,
+                time.time()
+            )
+        )
+
+    def get_blueprint(self, blueprint_id: str) -> Optional[Dict]:
+        """Get upload metadata of a blueprint, or None if unknown"""
+        row = self._connect().execute(
+            "SELECT * FROM blueprints WHERE id = ?", (blueprint_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        blueprint = dict(row)
+        blueprint["tags"] = json.loads(blueprint["tags"]) if blueprint["tags"] else []
+        return blueprint
+
+    # Results
+
+    def put_results(
+        self,
+        result_id: str,
+        detections: List[Dict],
+        statistics: Dict,
+        extra: Optional[Dict] = None
+    ):
+        """
+        Store (or replace) the detection results of a blueprint or PDF page
+
+        The results inherit the project and tags of their blueprint, and the
+        corpus analytics are updated in the same transaction.
+
+        Args:
+            result_id: Blueprint ID, or page results ID of a PDF document
+            detections: Detections with label, confidence and xywh bbox
+            statistics: Detection statistics
+            extra: Additional top-level fields (e.g. the pages of a PDF document)
+        """
+        match = _PAGE_ID.match(result_id)
+        blueprint_id, page = (
+            (match["blueprint_id"], int(match["page"])) if match else (result_id, None)
+        )
+        rows = [
+            (result_id, idx, det["label"], det["confidence"], *det["bbox"])
+            for idx, det in enumerate(detections)
+        ]
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            blueprint = conn.execute(
+                "SELECT project, tags FROM blueprints WHERE id = ?", (blueprint_id,)
+            ).fetchone()
+            project, tags = (blueprint["project"], blueprint["tags"]) if blueprint else (None, None)
+            stored_at = time.time()
+            self.analytics.record(
+                conn,
+                result_id,
+                # The summary of a PDF document is not a sheet: only its pages count
+                None if extra and "pages" in extra else detections,
+                project,
+                json.loads(tags) if tags else None,
+                stored_at
+            )
+            self._delete_boxes(conn, result_id)
+            conn.execute("DELETE FROM detections WHERE result_id = ?", (result_id,))
+            conn.executemany(
+                "INSERT INTO detections (result_id, idx, label, confidence, x, y, width, height) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(id, blueprint_id, page, total_detections, statistics, extra, project, tags, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    result_id,
+                    blueprint_id,
+                    page,
+                    len(rows),
+                    json.dumps(statistics),
+                    json.dumps(extra) if extra else None,
+                    project,
+                    tags,
+                    stored_at
+                )
+            )
+            if self.spatial_index:
+                key = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO detection_boxes (min_key, max_key, min_x, max_x, min_y, max_y, idx) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (key, key, math.floor(x) - 1, math.ceil(x + w) + 1,
+                         math.floor(y) - 1, math.ceil(y + h) + 1, idx)
+                        for _, idx, _, _, x, y, w, h in rows
+                    )
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_results(
+        self,
+        result_id: str,
+        labels: Optional[List[str]] = None,
+        min_confidence: Optional[float] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        viewport: Optional[Viewport] = None,
+        min_box_size: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Read stored results, optionally filtered and paginated
+
+        With a viewport, candidate boxes come from the R*Tree, so the cost
+        grows with the number of boxes on screen rather than on the sheet.
+
+        Args:
+            result_id: Blueprint ID or page results ID
+            labels: Only return detections with one of these labels
+            min_confidence: Only return detections at least this confident
+            offset: Matching detections to skip
+            limit: Max detections to return (all if None)
+            viewport: Only return boxes intersecting this (x1, y1, x2, y2) region
+            min_box_size: Only return boxes whose longer side is at least this
+                many image pixels (level of detail)
+
+        Returns:
+            Results dictionary with the selected detections and ``matched``
+            (number of detections matching the filters), or None if not found
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM results WHERE id = ?", (result_id,)).fetchone()
+        if row is None:
+            return None
+
+        source, where, params = "detections d", "d.result_id = ?", [result_id]
+        if viewport is not None:
+            x1, y1, x2, y2 = viewport
+            if self.spatial_index:
+                source = "detection_boxes b JOIN detections d ON d.result_id = ? AND d.idx = b.idx"
+                where = (
+                    "b.min_key >= ? AND b.max_key <= ? "
+                    "AND b.max_x >= ? AND b.min_x <= ? AND b.max_y >= ? AND b.min_y <= ?"
+                )
+                key = conn.execute("SELECT rowid FROM results WHERE id = ?", (result_id,)).fetchone()[0]
+                params.extend([key, key, math.floor(x1), math.ceil(x2), math.floor(y1), math.ceil(y2)])
+            where += " AND d.x + d.width >= ? AND d.x <= ? AND d.y + d.height >= ? AND d.y <= ?"
+            params.extend([x1, x2, y1, y2])
+        if labels:
+            where += f" AND d.label IN ({', '.join('?' * len(labels))})"
+            params.extend(labels)
+        if min_confidence is not None:
+            where += " AND d.confidence >= ?"
+            params.append(min_confidence)
+        if min_box_size:
+            where += " AND MAX(d.width, d.height) >= ?"
+            params.append(min_box_size)
+
+        if len(params) > 1:
+            (matched,) = conn.execute(
+                f"SELECT COUNT(*) FROM {source} WHERE {where}", params
+            ).fetchone()
+        else:
+            matched = row["total_detections"]
+
+        detections = [
+            {
+                "label": label,
+                "confidence": confidence,
+                "bbox": [x, y, width, height]
+            }
+            for label, confidence, x, y, width, height in conn.execute(
+                f"SELECT d.label, d.confidence, d.x, d.y, d.width, d.height FROM {source} "
+                f"WHERE {where} ORDER BY d.idx LIMIT ? OFFSET ?",
+                (*params, -1 if limit is None else limit, offset)
+            )
+        ]
+
+        results = {
+            "id": row["id"],
+            "detections": detections,
+            "statistics": json.loads(row["statistics"]),
+            "total_detections": row["total_detections"],
+            "matched": matched,
+            **(json.loads(row["extra"]) if row["extra"] else {})
+        }
+        return results
+
+    def delete_results(self, result_ids: List[str]) -> int:
+        """
+        Delete stored results
+
+        Args:
+            result_ids: Blueprint IDs or page results IDs
+
+        Returns:
+            Number of results deleted
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = 0
+            for result_id in result_ids:
+                self.analytics.record(conn, result_id)
+                self._delete_boxes(conn, result_id)
+                conn.execute("DELETE FROM detections WHERE result_id = ?", (result_id,))
+                deleted += conn.execute("DELETE FROM results WHERE id = ?", (result_id,)).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def delete_blueprint(self, blueprint_id: str):
+        """Forget an uploaded blueprint (its results are kept)"""
+        self._connect().execute("DELETE FROM blueprints WHERE id = ?", (blueprint_id,))
+
+    def list_blueprints(self) -> List[Dict]:
+        """ID, path, size and upload time of every blueprint"""
+        return [
+            dict(row) for row in self._connect().execute(
+                "SELECT id, path, size, created_at FROM blueprints"
+            )
+        ]
+
+    def list_results(self) -> List[Dict]:
+        """ID, blueprint, detection count and write time of every result"""
+        return [
+            dict(row) for row in self._connect().execute(
+                "SELECT id, blueprint_id, total_detections, updated_at FROM results"
+            )
+        ]
+
+    # Migration
+
+    def migrate_json_results(self, results_dir: Path) -> int:
+        """
+        Import per-blueprint JSON result files written by older versions
+
+        Imported files are moved to ``results_dir/migrated`` so the import
+        runs once.
+
+        Args:
+            results_dir: Directory holding ``<id>.json`` files
+
+        Returns:
+            Number of files imported
+        """
+        migrated = 0
+        archive_dir = results_dir / "migrated"
+        for file_path in sorted(results_dir.glob("*.json")):
+            try:
+                with file_path.open("r") as f:
+                    results = json.load(f)
+                extra = {
+                    key: value for key, value in results.items()
+                    if key not in ("id", "detections", "statistics")
+                }
+                self.put_results(
+                    results.get("id", file_path.stem),
+                    results.get("detections", []),
+                    results.get("statistics", {}),
+                    extra=extra
+                )
+            except Exception as e:
+                print(f"Skipping results file {file_path.name}: {e}")
+                continue
+
+            archive_dir.mkdir(exist_ok=True)
+            shutil.move(str(file_path), str(archive_dir / file_path.name))
+            migrated += 1
+        return migrated
+
+# Global results store
+results_store = ResultsStore()
@@ -0,0 +1,476 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+from services.results_store import results_store
+from services.cache import forget_file_hash
+from core.config import settings
+from core.metrics import metrics_registry
+
+# Kinds of stored data; "results" are rows in the results store, the others files
+KINDS = ("upload", "pyramid", "results")
+
+# Approximate bytes a stored detection takes in the results store (row, indexes, R*Tree)
+RESULT_ROW_BYTES = 120
+
+# Seconds between batches while an eviction backlog remains
+BACKLOG_PAUSE = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    blueprint_id TEXT,
+    path TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_artifacts_age ON artifacts (kind, stored_at);
+
+CREATE TABLE IF NOT EXISTS usage (
+    kind TEXT PRIMARY KEY,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Totals follow the index, so quotas are checked without summing it
+CREATE TRIGGER IF NOT EXISTS artifacts_insert AFTER INSERT ON artifacts BEGIN
+    INSERT INTO usage (kind, files, bytes) VALUES (NEW.kind, 1, NEW.size)
+    ON CONFLICT (kind) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_update AFTER UPDATE OF size ON artifacts BEGIN
+    UPDATE usage SET bytes = bytes + NEW.size - OLD.size WHERE kind = NEW.kind;
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_delete AFTER DELETE ON artifacts BEGIN
+    UPDATE usage SET files = files - 1, bytes = bytes - OLD.size WHERE kind = OLD.kind;
+END;
+"""
+
+RETENTION_EVICTIONS = metrics_registry.counter(
+    "retention_evictions_total",
+    "Stored items deleted by the retention manager, by kind and reason (age or quota)",
+    ("kind", "reason")
+)
+RETENTION_EVICTED_BYTES = metrics_registry.counter(
+    "retention_evicted_bytes_total",
+    "Bytes freed by the retention manager, by kind and reason",
+    ("kind", "reason")
+)
+
+def directory_size(path: Path) -> int:
+    """Total size of the files below a directory"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def results_size(total_detections: int) -> int:
+    """Approximate bytes stored for one result"""
+    return RESULT_ROW_BYTES * (total_detections + 1)
+
+def within_storage(path: Path) -> bool:
+    """
+    Whether a path lies inside one of the directories retention manages
+
+    Only such paths are ever tracked or deleted, whatever the index says.
+    """
+    resolved = Path(path).resolve()
+    for root in (settings.UPLOAD_DIR, settings.RESULTS_DIR, settings.CACHE_DIR, settings.PYRAMID_DIR):
+        root = Path(root).resolve()
+        if resolved != root and resolved.is_relative_to(root):
+            return True
+    return False
+
+class RetentionManager:
+    """
+    Age limits and size quotas for uploads, tile pyramids and results
+
+    Everything stored is recorded in a time-ordered index (a SQLite table
+    next to the results store) when it is written, and triggers keep a
+    running total per kind. A background thread evicts the oldest entries
+    of each kind that are past ``RETENTION_MAX_AGE_HOURS`` or push the kind
+    over ``RETENTION_MAX_BYTES``, at most ``RETENTION_BATCH_SIZE`` per step,
+    so storage is never scanned and a backlog is worked off gradually.
+
+    Entries are claimed by deleting them from the index in one transaction
+    before their files are removed, so several server processes can run
+    the manager on one database. The detection cache bounds its own size.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        max_age_hours: Optional[Dict[str, float]] = None,
+        max_bytes: Optional[Dict[str, int]] = None,
+        interval: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ):
+        """
+        Initialize the manager
+
+        Args:
+            db_path: SQLite database of the index (default from settings)
+            max_age_hours: Kind -> max age, kinds left out are kept forever (default from settings)
+            max_bytes: Kind -> quota, kinds left out are unbounded (default from settings)
+            interval: Seconds between retention passes (default from settings)
+            batch_size: Max entries evicted per kind and step (default from settings)
+        """
+        self.db_path = db_path or settings.RETENTION_DB_PATH
+        self.max_age_hours = max_age_hours if max_age_hours is not None else settings.RETENTION_MAX_AGE_HOURS
+        self.max_bytes = max_bytes if max_bytes is not None else settings.RETENTION_MAX_BYTES
+        self.interval = interval or settings.RETENTION_INTERVAL
+        self.batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Database helpers
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """Close the database connection"""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Index
+
+    def track(
+        self,
+        kind: str,
+        key: str,
+        size: int,
+        path: Optional[Path] = None,
+        blueprint_id: Optional[str] = None,
+        stored_at: Optional[float] = None
+    ):
+        """
+        Record (or refresh) a stored item
+
+        Writing an item again moves it to the young end of the index.
+
+        Args:
+            kind: One of ``KINDS``
+            key: Blueprint ID, pyramid ID or results ID
+            size: Bytes it takes
+            path: File or directory holding it (None for results)
+            blueprint_id: Blueprint it belongs to
+            stored_at: Unix time it was written (default now)
+        """
+        if path is not None and not within_storage(path):
+            print(f"⚠ Not tracking {kind} {key}: {path} is outside the storage directories")
+            return
+        with self._db_lock:
+            self._connect().execute(
+                "INSERT INTO artifacts (kind, key, blueprint_id, path, size, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET "
+                "path = excluded.path, size = excluded.size, stored_at = excluded.stored_at",
+                (
+                    kind,
+                    key,
+                    blueprint_id,
+                    str(path) if path is not None else None,
+                    int(size),
+                    stored_at if stored_at is not None else time.time()
+                )
+            )
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Tracked files and bytes per kind"""
+        with self._db_lock:
+            rows = self._connect().execute("SELECT kind, files, bytes FROM usage").fetchall()
+        return {row["kind"]: {"files": row["files"], "bytes": row["bytes"]} for row in rows}
+
+    def oldest(self) -> Dict[str, float]:
+        """Age in seconds of the oldest tracked item of each kind"""
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            ages = {}
+            for kind in KINDS:
+                # One index seek per kind
+                row = conn.execute(
+                    "SELECT MIN(stored_at) FROM artifacts WHERE kind = ?", (kind,)
+                ).fetchone()
+                if row[0] is not None:
+                    ages[kind] = now - row[0]
+        return ages
+
+    def _backfill(self):
+        """
+        Index data stored before the index existed
+
+        Runs once per set of storage locations: the marker records the
+        directories and results database that were indexed. An index
+        written against other locations (another checkout, a moved data
+        directory) describes files this server does not own, so it is
+        cleared and rebuilt from what is actually stored.
+        """
+        # Imported here: postprocess records results through this module
+        from services.postprocess import parse_page_result_id
+        roots = json.dumps([
+            str(Path(root).resolve())
+            for root in (settings.UPLOAD_DIR, settings.PYRAMID_DIR, settings.RESULTS_DB_PATH)
+        ])
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                marker = conn.execute("SELECT value FROM meta WHERE name = 'backfilled'").fetchone()
+                if marker is not None and marker[0] == roots:
+                    conn.execute("ROLLBACK")
+                    return
+                if marker is not None:
+                    dropped = conn.execute("DELETE FROM artifacts").rowcount
+                    print(f"⚠ Retention index was built for other storage locations; re-indexing ({dropped} entries dropped)")
+                items: List[Tuple] = []
+                for blueprint in results_store.list_blueprints():
+                    items.append((
+                        "upload", blueprint["id"], blueprint["id"], blueprint["path"],
+                        blueprint["size"] or 0, blueprint["created_at"]
+                    ))
+                for result in results_store.list_results():
+                    items.append((
+                        "results", result["id"], result["blueprint_id"], None,
+                        results_size(result["total_detections"]), result["updated_at"]
+                    ))
+                # Files from before the results store, and pyramids
+                with os.scandir(settings.UPLOAD_DIR) as entries:
+                    for entry in entries:
+                        name = Path(entry.name)
+                        if entry.name.startswith(".") or name.suffix.lower() not in settings.ALLOWED_EXTENSIONS:
+                            continue
+                        if entry.is_file():
+                            stat = entry.stat()
+                            items.append(("upload", name.stem, name.stem, entry.path, stat.st_size, stat.st_mtime))
+                if settings.PYRAMID_DIR.exists():
+                    with os.scandir(settings.PYRAMID_DIR) as entries:
+                        for entry in entries:
+                            if entry.is_dir() and not entry.name.startswith("."):
+                                items.append((
+                                    "pyramid", entry.name, parse_page_result_id(entry.name)[0], entry.path,
+                                    directory_size(Path(entry.path)), entry.stat().st_mtime
+                                ))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO artifacts (kind, key, blueprint_id, path, size, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    items
+                )
+                conn.execute(
+                    "INSERT INTO meta (name, value) VALUES ('backfilled', ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                    (roots,)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if items:
+            print(f"✓ Indexed {len(items)} item(s) stored before retention tracking")
+
+    # Eviction
+
+    def _claim(self, kind: str, reason: str) -> List[sqlite3.Row]:
+        """Remove the next batch of entries to evict from the index and return them"""
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if reason == "age":
+                    cutoff = time.time() - self.max_age_hours[kind] * 3600
+                    batch = conn.execute(
+                        "SELECT * FROM artifacts WHERE kind = ? AND stored_at < ? "
+                        "ORDER BY stored_at LIMIT ?",
+                        (kind, cutoff, self.batch_size)
+                    ).fetchall()
+                else:
+                    row = conn.execute("SELECT bytes FROM usage WHERE kind = ?", (kind,)).fetchone()
+                    excess = (row["bytes"] if row else 0) - self.max_bytes[kind]
+                    batch = []
+                    if excess > 0:
+                        for entry in conn.execute(
+                            "SELECT * FROM artifacts WHERE kind = ? ORDER BY stored_at LIMIT ?",
+                            (kind, self.batch_size)
+                        ):
+                            batch.append(entry)
+                            excess -= entry["size"]
+                            if excess <= 0:
+                                break
+                conn.executemany(
+                    "DELETE FROM artifacts WHERE kind = ? AND key = ?",
+                    [(entry["kind"], entry["key"]) for entry in batch]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return batch
+
+    def _delete(self, kind: str, batch: List[sqlite3.Row]):
+        """Delete the stored data of claimed entries"""
+        if kind == "results":
+            results_store.delete_results([entry["key"] for entry in batch])
+            return
+        for entry in batch:
+            path = Path(entry["path"]) if entry["path"] else None
+            if path is not None and not within_storage(path):
+                print(f"⚠ Not deleting {kind} {entry['key']}: {path} is outside the storage directories")
+                continue
+            if kind == "pyramid":
+                if path is not None:
+                    shutil.rmtree(path, ignore_errors=True)
+            else:
+                if path is not None:
+                    path.unlink(missing_ok=True)
+                    forget_file_hash(path)
+                results_store.delete_blueprint(entry["key"])
+
+    def evict_step(self, kind: str, reason: str) -> int:
+        """
+        Evict one batch of a kind
+
+        Args:
+            kind: One of ``KINDS``
+            reason: "age" or "quota"
+
+        Returns:
+            Number of entries evicted
+        """
+        batch = self._claim(kind, reason)
+        if not batch:
+            return 0
+        self._delete(kind, batch)
+        freed = sum(entry["size"] for entry in batch)
+        RETENTION_EVICTIONS.inc(len(batch), kind=kind, reason=reason)
+        RETENTION_EVICTED_BYTES.inc(freed, kind=kind, reason=reason)
+        print(f"Evicted {len(batch)} {kind} item(s) by {reason} ({freed / (1024 * 1024):.1f} MB)")
+        return len(batch)
+
+    def run_once(self) -> bool:
+        """
+        Run one step for every kind with a limit
+
+        Returns:
+            True if a batch was full, i.e. more entries may need evicting
+        """
+        backlog = False
+        for kind in KINDS:
+            for reason, limits in (("age", self.max_age_hours), ("quota", self.max_bytes)):
+                if limits.get(kind):
+                    backlog |= self.evict_step(kind, reason) >= self.batch_size
+        return backlog
+
+    def _run(self):
+        try:
+            self._backfill()
+        except Exception as e:
+            print(f"✗ Indexing existing storage failed: {e}")
+        backlog = False
+        while not self._stop.wait(BACKLOG_PAUSE if backlog else self.interval):
+            try:
+                backlog = self.run_once()
+            except Exception as e:
+                print(f"✗ Retention pass failed: {e}")
+                backlog = False
+
+    def start(self):
+        """Start the background retention thread"""
+        self._stop.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and close the database"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.close()
+
+    def get_stats(self) -> Dict:
+        """Usage, limits and eviction counters per kind"""
+        usage = self.usage()
+        oldest = self.oldest()
+        return {
+            kind: {
+                "files": usage.get(kind, {}).get("files", 0),
+                "bytes": usage.get(kind, {}).get("bytes", 0),
+                "max_bytes": self.max_bytes.get(kind),
+                "max_age_hours": self.max_age_hours.get(kind),
+                "oldest_age_seconds": oldest.get(kind)
+            }
+            for kind in KINDS
+        }
+
+def _disk_usage() -> Dict[Tuple[str, str], float]:
+    """Free and total bytes of the volumes holding uploads and results"""
+    values = {}
+    for name, directory in (("uploads", settings.UPLOAD_DIR), ("results", settings.RESULTS_DIR)):
+        usage = shutil.disk_usage(directory)
+        values[(name, "free")] = usage.free
+        values[(name, "total")] = usage.total
+    return values
+
+# Global retention manager
+retention_manager = RetentionManager()
+
+metrics_registry.gauge(
+    "storage_bytes",
+    "Bytes of tracked uploads, tile pyramids and results (estimated), by kind",
+    ("kind",),
+    callback=lambda: {(kind,): value["bytes"] for kind, value in retention_manager.usage().items()}
+)
+metrics_registry.gauge(
+    "storage_items",
+    "Tracked uploads, tile pyramids and results, by kind",
+    ("kind",),
+    callback=lambda: {(kind,): value["files"] for kind, value in retention_manager.usage().items()}
+)
+metrics_registry.gauge(
+    "storage_quota_bytes",
+    "Retention size quota, by kind",
+    ("kind",),
+    callback=lambda: {(kind,): value for kind, value in retention_manager.max_bytes.items() if value}
+)
+metrics_registry.gauge(
+    "storage_oldest_age_seconds",
+    "Age of the oldest tracked item, by kind",
+    ("kind",),
+    callback=lambda: {(kind,): value for kind, value in retention_manager.oldest().items()}
+)
+metrics_registry.gauge(
+    "storage_volume_bytes",
+    "Size and free space of the volumes holding uploads and results",
+    ("volume", "state"),
+    callback=_disk_usage
+)
@@ -0,0 +1,347 @@
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Callable, Union
+import numpy as np
+from models.detections import Detections
+from models.batcher import QueueFullError
+from models.registry import model_registry, ModelSpec
+from schemas.request import TilingOptions, PostprocessOptions
+from services.tiling import compute_tiles, merge_detections, predict_tiled
+from services.preprocess import prepare_image, to_gray, preprocess_signature
+from services.postprocess import resolve_postprocess
+from core.config import settings
+from core.metrics import metrics_registry, stage_timer
+
+# (x1, y1, x2, y2) in pixels of the new revision
+Region = Tuple[int, int, int, int]
+
+REVISION_DETECTIONS = metrics_registry.counter(
+    "revision_detections_total",
+    "Detections of blueprint revisions, by whether only changed tiles were recomputed",
+    ("mode",)
+)
+REVISION_TILES = metrics_registry.counter(
+    "revision_tiles_total",
+    "Tiles of revision sheets, recomputed or reused from the previous revision",
+    ("outcome",)
+)
+
+def _tiling_settings(options: TilingOptions) -> Tuple[int, float, str, float]:
+    """(tile size, overlap, merge strategy, merge threshold) with unset fields from the server defaults"""
+    return (
+        options.tile_size or settings.TILE_SIZE,
+        options.overlap if options.overlap is not None else settings.TILE_OVERLAP,
+        options.merge or settings.TILE_MERGE,
+        options.merge_threshold or settings.TILE_MERGE_THRESHOLD
+    )
+
+def revision_tiling(tiling: Optional[TilingOptions] = None) -> TilingOptions:
+    """Tiling of incremental detection: the request's settings, always enabled"""
+    return (tiling or TilingOptions()).model_copy(update={"enabled": True})
+
+def pipeline_signature(
+    tiling: Optional[TilingOptions] = None,
+    postprocess: Optional[PostprocessOptions] = None
+) -> Dict:
+    """
+    Settings that shaped stored detections, stored with the results of a sheet
+
+    Detections of a previous revision can only be reused next to new ones
+    produced with the same signature, since they are already tiled and
+    post-processed.
+
+    Args:
+        tiling: Tiled inference settings (None or disabled = whole sheet)
+        postprocess: Post-processing settings (server defaults if None)
+
+    Returns:
+        JSON-serializable signature with every default resolved
+    """
+    tiled = list(_tiling_settings(tiling)) if tiling is not None and tiling.enabled else None
+    return {
+        "tiling": tiled,
+        "postprocess": resolve_postprocess(postprocess).model_dump(),
+        "preprocess": preprocess_signature()
+    }
+
+def _ink(gray: np.ndarray, scale: float, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Ink coverage of a sheet at diff resolution
+
+    Binarizing before downscaling keeps hairlines that averaging would fade.
+
+    Args:
+        gray: Grayscale sheet
+        scale: Diff resolution relative to the sheet
+        shape: (height, width) of the common diff canvas
+
+    Returns:
+        float32 ink fraction per diff pixel, zero-padded to ``shape``
+    """
+    import cv2
+    ink = (gray < settings.REVISION_INK_THRESHOLD).astype(np.float32)
+    if scale < 1.0:
+        size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+        ink = cv2.resize(ink, size, interpolation=cv2.INTER_AREA)
+    canvas = np.zeros(shape, dtype=np.float32)
+    canvas[:ink.shape[0], :ink.shape[1]] = ink
+    return canvas
+
+def _shift(mask: np.ndarray, dx: int, dy: int) -> np.ndarray:
+    """Translate a mask by whole pixels, filling with zeros"""
+    shifted = np.zeros_like(mask)
+    height, width = mask.shape
+    if abs(dx) >= width or abs(dy) >= height:
+        return shifted
+    shifted[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = (
+        mask[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+    )
+    return shifted
+
+def align_and_diff(
+    previous: np.ndarray,
+    current: np.ndarray
+) -> Tuple[Tuple[float, float], float, List[Region]]:
+    """
+    Align two revisions of a sheet and find where their drawing differs
+
+    Both sheets are compared as ink masks at reduced resolution. The offset
+    between them is found by phase correlation (translation only, which
+    covers re-exports and re-scans with a different margin). Ink present in
+    one revision but not within one pixel of ink in the other is a change;
+    nearby changes are grouped into regions.
+
+    Args:
+        previous: Grayscale previous revision
+        current: Grayscale new revision
+
+    Returns:
+        ((dx, dy) offset of the new revision in its pixels, alignment
+        confidence in [0, 1], changed regions in new revision pixels)
+    """
+    import cv2
+    longest = max(*previous.shape, *current.shape)
+    scale = min(1.0, settings.REVISION_DIFF_MAX_SIDE / longest)
+    shape = (
+        round(max(previous.shape[0], current.shape[0]) * scale),
+        round(max(previous.shape[1], current.shape[1]) * scale)
+    )
+
+    with stage_timer("revision_align"):
+        previous_ink = _ink(previous, scale, shape)
+        current_ink = _ink(current, scale, shape)
+        window = cv2.createHanningWindow((shape[1], shape[0]), cv2.CV_32F)
+        (dx, dy), response = cv2.phaseCorrelate(previous_ink, current_ink, window)
+
+    with stage_timer("revision_diff"):
+        shift_x, shift_y = int(round(dx)), int(round(dy))
+        before = _shift((previous_ink > 0).astype(np.uint8), shift_x, shift_y)
+        after = (current_ink > 0).astype(np.uint8)
+        # A stroke that moved by less than a pixel (resampling, rounding of the offset) is not a change
+        tolerance = np.ones((3, 3), np.uint8)
+        changed = (after & (1 - cv2.dilate(before, tolerance))) | (before & (1 - cv2.dilate(after, tolerance)))
+
+        # Group the strokes of one edit (a revision cloud, a moved door) into one region
+        radius = max(1, int(settings.REVISION_REGION_PADDING * scale))
+        grouped = cv2.dilate(changed, np.ones((2 * radius + 1, 2 * radius + 1), np.uint8))
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(grouped, connectivity=8)
+        changed_pixels = np.bincount(labels[changed > 0], minlength=count)
+
+    regions = []
+    for label in range(1, count):
+        if changed_pixels[label] < settings.REVISION_MIN_REGION_PIXELS:
+            continue
+        x, y, width, height = stats[label, :4]
+        regions.append((
+            max(0, int(x / scale)),
+            max(0, int(y / scale)),
+            min(current.shape[1], int(np.ceil((x + width) / scale))),
+            min(current.shape[0], int(np.ceil((y + height) / scale)))
+        ))
+    return (dx / scale, dy / scale), float(response), regions
+
+def _intersects(boxes: np.ndarray, regions: np.ndarray) -> np.ndarray:
+    """(N, M) whether each xyxy box overlaps each xyxy region"""
+    return (
+        (boxes[:, None, 0] < regions[None, :, 2]) & (boxes[:, None, 2] > regions[None, :, 0])
+        & (boxes[:, None, 1] < regions[None, :, 3]) & (boxes[:, None, 3] > regions[None, :, 1])
+    )
+
+def _centered_in(detections: Detections, regions: np.ndarray) -> np.ndarray:
+    """Whether the centre of each box lies inside any of the regions"""
+    centers = (detections.boxes[:, :2] + detections.boxes[:, 2:]) / 2.0
+    return _intersects(np.concatenate([centers, centers], axis=1), regions).any(axis=1)
+
+def merge_revision(
+    previous: Detections,
+    recomputed: Detections,
+    regions: List[Region],
+    strategy: str = "nms",
+    threshold: float = 0.5
+) -> Tuple[Detections, Detections]:
+    """
+    Combine reused and recomputed detections
+
+    Inside the changed regions the new detections replace the previous
+    ones; outside them the previous detections are kept, since the drawing
+    there is the same. Previous boxes reaching into a changed region from
+    outside are merged with the new ones like boxes at a tile seam.
+
+    Args:
+        previous: Previous detections, already shifted to new revision pixels
+        recomputed: Detections of the tiles around the changed regions
+        regions: Changed (x1, y1, x2, y2) regions
+        strategy: Seam merge strategy (see ``merge_detections``)
+        threshold: Seam merge overlap threshold
+
+    Returns:
+        (merged detections, previous detections that were reused)
+    """
+    if not regions:
+        return previous, previous
+
+    areas = np.asarray(regions, dtype=np.float32)
+    kept = previous.select(~_centered_in(previous, areas))
+    added = recomputed.select(_centered_in(recomputed, areas))
+
+    # Only boxes touching a changed region can duplicate a new box
+    touching = _intersects(kept.boxes, areas).any(axis=1)
+    seam = Detections.concatenate([kept.select(touching), added], previous.class_names)
+    with stage_timer("revision_merge"):
+        boxes, scores, class_ids = merge_detections(
+            seam.boxes,
+            seam.scores,
+            seam.class_ids,
+            strategy=strategy,
+            threshold=threshold
+        )
+    merged = Detections.concatenate(
+        [kept.select(~touching), Detections(boxes, scores, class_ids, previous.class_names)],
+        previous.class_names
+    )
+    return merged, kept
+
+def run_incremental_inference(
+    image_path: Path,
+    previous_path: Path,
+    previous_detections: Union[List[Dict], Detections],
+    previous_model: Optional[Dict[str, str]],
+    tiling: Optional[TilingOptions] = None,
+    tile_progress: Optional[Callable[[int, int], None]] = None,
+    model: Optional[ModelSpec] = None
+) -> Tuple[Detections, Dict[str, str], Dict]:
+    """
+    Detect a new revision of a sheet, recomputing only the tiles that changed
+
+    The sheet is divided into the same tiles as tiled inference. Tiles that
+    overlap a changed region are run through the model and their detections
+    are used inside the changed regions; everywhere else the previous
+    revision's detections are reused, shifted by the alignment offset. The whole sheet is re-detected when the revisions cannot be
+    aligned, were detected with another model version, or changed too much.
+
+    Args:
+        image_path: Path to the new revision
+        previous_path: Path to the previous revision
+        previous_detections: Detections of the previous revision, produced
+            with the same tiling and post-processing (raw cached detections
+            or stored results, see ``pipeline_signature``)
+        previous_model: Model name and version of the previous detections
+        tiling: Tile size, overlap and merge settings (tiling is always used)
+        tile_progress: Optional callback receiving (tiles done, total tiles)
+        model: Model to run (default model if None)
+
+    Returns:
+        (detections, name and version of the model, revision report with
+        ``mode``, ``changed_regions``, ``recomputed_regions`` and the share
+        of the sheet that was skipped)
+    """
+    options = revision_tiling(tiling)
+    tile_size, overlap, strategy, threshold = _tiling_settings(options)
+
+    try:
+        # Both sheets usually come from the decoded image cache
+        image, _ = prepare_image(image_path)
+        previous, _ = prepare_image(previous_path, mode="gray")
+        height, width = image.shape[:2]
+        all_tiles = compute_tiles(width, height, tile_size, overlap)
+
+        with model_registry.acquire(model) as loaded:
+            shift, alignment, regions = align_and_diff(
+                previous,
+                to_gray(image)
+            )
+            report = {
+                "mode": "incremental",
+                "reason": None,
+                "shift": [round(shift[0], 1), round(shift[1], 1)],
+                "alignment": round(alignment, 3),
+                "changed_regions": [[x1, y1, x2 - x1, y2 - y1] for x1, y1, x2, y2 in regions]
+            }
+
+            if previous_model is not None and previous_model != loaded.tag:
+                report["reason"] = "previous revision was detected with another model version"
+            elif alignment < settings.REVISION_MIN_ALIGNMENT:
+                report["reason"] = "revisions could not be aligned"
+
+            selected = []
+            if report["reason"] is None and regions:
+                hits = _intersects(
+                    np.asarray(all_tiles, dtype=np.float32),
+                    np.asarray(regions, dtype=np.float32)
+                ).any(axis=1)
+                selected = [tile for tile, hit in zip(all_tiles, hits) if hit]
+                if len(selected) > settings.REVISION_MAX_RECOMPUTE_FRACTION * len(all_tiles):
+                    report["reason"] = "too much of the sheet changed"
+
+            if report["reason"] is not None:
+                report["mode"] = "full"
+                selected = all_tiles
+
+            recomputed = Detections.empty(loaded.detector.class_names)
+            if selected:
+                recomputed = predict_tiled(
+                    image,
+                    options,
+                    conf_threshold=settings.CONFIDENCE_THRESHOLD,
+                    iou_threshold=settings.IOU_THRESHOLD,
+                    progress=tile_progress,
+                    detector=loaded.detector,
+                    tiles=selected
+                )
+            tag = loaded.tag
+
+        if report["mode"] == "full":
+            detections, reused = recomputed, Detections.empty(recomputed.class_names)
+        else:
+            carried = previous_detections
+            if not isinstance(carried, Detections):
+                carried = Detections.from_dicts(carried, loaded.detector.class_names)
+            carried = carried.offset(*shift)
+            centers = (carried.boxes[:, :2] + carried.boxes[:, 2:]) / 2.0
+            on_sheet = (
+                (centers[:, 0] >= 0) & (centers[:, 0] < width)
+                & (centers[:, 1] >= 0) & (centers[:, 1] < height)
+            )
+            detections, reused = merge_revision(
+                carried.select(on_sheet),
+                recomputed,
+                regions,
+                strategy,
+                threshold
+            )
+    except QueueFullError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Incremental inference failed: {str(e)}")
+
+    REVISION_DETECTIONS.inc(mode=report["mode"])
+    REVISION_TILES.inc(len(selected), outcome="recomputed")
+    REVISION_TILES.inc(len(all_tiles) - len(selected), outcome="reused")
+    report.update(
+        recomputed_regions=[[x1, y1, x2 - x1, y2 - y1] for x1, y1, x2, y2 in selected],
+        tiles_total=len(all_tiles),
+        tiles_recomputed=len(selected),
+        skipped_fraction=round(1.0 - len(selected) / len(all_tiles), 4),
+        reused_detections=len(reused),
+        new_detections=len(detections) - len(reused)
+    )
+    return detections, tag, report
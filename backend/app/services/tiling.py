@@ -0,0 +1,147 @@
+from pathlib import Path
+from typing import Optional, List, Tuple, Callable, Union
+import numpy as np
+from models.detector import BlueprintDetector, detector as default_detector
+from models.detections import Detections
+from models.suppression import greedy_suppression, fuse_boxes
+from schemas.request import TilingOptions
+from services.preprocess import prepare_image
+from core.config import settings
+from core.metrics import stage_timer
+
+def compute_tiles(
+    width: int,
+    height: int,
+    tile_size: int,
+    overlap: float
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Split an image into overlapping tiles
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        tile_size: Tile side in pixels
+        overlap: Fractional overlap between neighbouring tiles
+
+    Returns:
+        List of tiles as (x1, y1, x2, y2) page coordinates
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        # Last tile is flush with the image edge
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+def merge_detections(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    strategy: str = "nms",
+    threshold: float = 0.5
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge duplicate detections produced by overlapping tiles
+
+    Boxes of the same class are grouped greedily in descending score order.
+    Overlap is measured as intersection over the smaller box, so the
+    truncated copy of a symbol cut by a tile seam is matched with the
+    complete copy from the neighbouring tile.
+
+    Args:
+        boxes: (N, 4) xyxy boxes in page coordinates
+        scores: (N,) confidences
+        class_ids: (N,) class indices
+        strategy: "nms" keeps the best box of each group, "wbf" averages the
+            group weighted by confidence, "none" keeps everything
+        threshold: Overlap above which two boxes are considered duplicates
+
+    Returns:
+        Merged (boxes, scores, class_ids)
+    """
+    if strategy == "none" or len(boxes) == 0:
+        return boxes, scores, class_ids
+    if strategy not in ("nms", "wbf"):
+        raise ValueError(f"Unknown merge strategy: {strategy}")
+
+    kept, owner = greedy_suppression(boxes, scores, class_ids, threshold, metric="ios", inclusive=True)
+    merged_boxes = fuse_boxes(boxes, scores, kept, owner) if strategy == "wbf" else boxes[kept]
+    return (
+        merged_boxes.astype(np.float32, copy=False),
+        scores[kept].astype(np.float32, copy=False),
+        class_ids[kept]
+    )
+
+def predict_tiled(
+    image_path: Union[Path, np.ndarray],
+    options: TilingOptions,
+    conf_threshold: Optional[float] = None,
+    iou_threshold: Optional[float] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    detector: Optional[BlueprintDetector] = None,
+    tiles: Optional[List[Tuple[int, int, int, int]]] = None
+) -> Detections:
+    """
+    Run sliding-window inference on a large image
+
+    The image is cut into overlapping tiles which are put through the model
+    in batches. Tile detections are shifted back to page coordinates and
+    duplicates along tile seams are merged.
+
+    Args:
+        image_path: Path to input image, or a decoded BGR image array (already
+            prepared arrays pass through unchanged)
+        options: Tile size, overlap and merge settings for this request
+        conf_threshold: Confidence threshold (default from settings)
+        iou_threshold: IOU threshold for per-tile NMS (default from settings)
+        progress: Optional callback receiving (tiles done, total tiles)
+        detector: Model to run (default: the global detector)
+        tiles: Only run these (x1, y1, x2, y2) tiles (default: cover the whole image)
+
+    Returns:
+        Merged detections in page coordinates
+    """
+    detector = detector or default_detector
+    # Tiles exist to keep full resolution, so only the color mode applies
+    image, _ = prepare_image(image_path)
+    height, width = image.shape[:2]
+
+    tile_size = options.tile_size or settings.TILE_SIZE
+    overlap = options.overlap if options.overlap is not None else settings.TILE_OVERLAP
+    strategy = options.merge or settings.TILE_MERGE
+    threshold = options.merge_threshold or settings.TILE_MERGE_THRESHOLD
+    if tiles is None:
+        tiles = compute_tiles(width, height, tile_size, overlap)
+
+    parts: List[Detections] = []
+    for start in range(0, len(tiles), settings.TILE_BATCH_SIZE):
+        chunk = tiles[start:start + settings.TILE_BATCH_SIZE]
+        crops = [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in chunk]
+        results = detector.predict_batch(crops, conf_threshold, iou_threshold)
+        parts.extend(
+            tile_detections.offset(x_off, y_off)
+            for (x_off, y_off, _, _), tile_detections in zip(chunk, results)
+        )
+        if progress is not None:
+            progress(start + len(chunk), len(tiles))
+
+    detections = Detections.concatenate(parts, detector.class_names)
+    with stage_timer("tile_merge"):
+        boxes, scores, class_ids = merge_detections(
+            detections.boxes,
+            detections.scores,
+            detections.class_ids,
+            strategy=strategy,
+            threshold=threshold
+        )
+    return Detections(boxes, scores, class_ids, detector.class_names)
@@ -1,84 +1,354 @@
+import os
+import re
 import uuid
-import shutil
+import zipfile
+import hashlib
+import struct
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple, Dict, Iterator
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 from core.config import settings
+from services.results_store import results_store
+from services.retention import retention_manager
+
+# Blueprint IDs as issued by generate_unique_id, and page results IDs derived from them:
+# no dots or separators, so an ID can never name a path outside the storage directories
+_BLUEPRINT_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+# Bytes of the upload we are willing to buffer while looking for image dimensions
+MAX_HEADER_BYTES = 256 * 1024
+
+# JPEG start-of-frame markers carrying the image dimensions
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE"""
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not a readable image of acceptable size"""
 
 def generate_unique_id() -> str:
     """Generate a unique ID for blueprints"""
     return str(uuid.uuid4())
 
+def is_valid_blueprint_id(blueprint_id: str) -> bool:
+    """Whether an ID has the shape of an issued blueprint (or page results) ID"""
+    return bool(_BLUEPRINT_ID.match(blueprint_id))
+
 def validate_file_extension(filename: str) -> bool:
     """Validate file extension"""
     file_ext = Path(filename).suffix.lower()
     return file_ext in settings.ALLOWED_EXTENSIONS
 
-def save_upload_file(upload_file: UploadFile, blueprint_id: str) -> Path:
+def probe_image_header(header: bytes) -> Optional[Tuple[str, int, int]]:
     """
-    Save uploaded file to disk
+    Read image format and dimensions from the first bytes of a file
+    
+    Args:
+        header: Leading bytes of the file
+        
+    Returns:
+        (format, width, height), or None if more bytes are needed
+        
+    Raises:
+        InvalidImageError: If the bytes are not a PNG, JPEG or PDF file
+    """
+    if header.startswith(b"%PDF-"):
+        # Page sizes are only known once the document is opened
+        return "pdf", 0, 0
+    
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(header) < 24:
+            return None
+        if header[12:16] != b"IHDR":
+            raise InvalidImageError("Corrupt PNG header")
+        width, height = struct.unpack(">II", header[16:24])
+        return "png", width, height
+    
+    if header.startswith(b"\xff\xd8"):
+        pos = 2
+        while True:
+            # Skip fill bytes before the marker
+            while pos < len(header) and header[pos] == 0xFF:
+                pos += 1
+            if pos >= len(header):
+                return None
+            marker = header[pos]
+            pos += 1
+            if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                continue  # Standalone markers have no length
+            if pos + 2 > len(header):
+                return None
+            (length,) = struct.unpack(">H", header[pos:pos + 2])
+            if marker in _JPEG_SOF_MARKERS:
+                if pos + 7 > len(header):
+                    return None
+                height, width = struct.unpack(">HH", header[pos + 3:pos + 7])
+                return "jpeg", width, height
+            if marker == 0xDA or length < 2:
+                raise InvalidImageError("JPEG has no frame header")
+            pos += length
+            if pos < len(header) and header[pos] != 0xFF:
+                raise InvalidImageError("Corrupt JPEG header")
+    
+    if len(header) < 8:
+        return None
+    raise InvalidImageError("File is not a PNG, JPEG or PDF file")
+
+def _validate_dimensions(width: int, height: int):
+    """Reject empty or oversized images before they reach the decoder"""
+    if width <= 0 or height <= 0:
+        raise InvalidImageError(f"Invalid image dimensions {width}x{height}")
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise InvalidImageError(
+            f"Image is {width}x{height}; at most {settings.MAX_IMAGE_PIXELS} pixels are allowed"
+        )
+
+class _ImageIngest:
+    """Single-pass size check, hashing and header probe over a chunk stream"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.header = b""
+        self.probe: Optional[Tuple[str, int, int]] = None
+    
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(
+                f"File exceeds the {self.max_size} byte upload limit"
+            )
+        
+        self.digest.update(chunk)
+        if self.probe is None:
+            self.header = (self.header + chunk)[:MAX_HEADER_BYTES]
+            self.probe = probe_image_header(self.header)
+            if self.probe is not None:
+                if self.probe[0] != "pdf":
+                    _validate_dimensions(self.probe[1], self.probe[2])
+                self.header = b""
+            elif len(self.header) >= MAX_HEADER_BYTES:
+                raise InvalidImageError("Image dimensions not found in file header")
+    
+    def finish(self, file_path: Path) -> Dict:
+        if self.probe is None:
+            raise InvalidImageError("File is empty or truncated")
+        image_format, width, height = self.probe
+        if (image_format == "pdf") != (file_path.suffix.lower() == ".pdf"):
+            raise InvalidImageError(
+                f"File content ({image_format}) does not match extension {file_path.suffix}"
+            )
+        if image_format == "pdf":
+            width = height = None
+        return {
+            "path": file_path,
+            "size": self.size,
+            "sha256": self.digest.hexdigest(),
+            "format": image_format,
+            "width": width,
+            "height": height
+        }
+
+def max_upload_size(filename: str) -> int:
+    """Upload size limit for a file, PDF documents get a larger one"""
+    if Path(filename).suffix.lower() == ".pdf":
+        return settings.MAX_PDF_UPLOAD_SIZE
+    return settings.MAX_UPLOAD_SIZE
+
+def _upload_paths(blueprint_id: str, filename: str) -> Tuple[Path, Path]:
+    """Final and temporary paths for an uploaded blueprint"""
+    file_ext = Path(filename).suffix.lower()
+    return (
+        settings.UPLOAD_DIR / f"{blueprint_id}{file_ext}",
+        settings.UPLOAD_DIR / f".{blueprint_id}{file_ext}.part"
+    )
+
+async def save_upload_stream(upload_file: UploadFile, blueprint_id: str) -> Dict:
+    """
+    Stream an uploaded file to disk in a single pass
+    
+    Chunks are written from a worker thread so the event loop is never
+    blocked. While writing, the size limit is enforced, the SHA-256 content
+    hash is computed and the image header is checked. The file is written
+    under a temporary name and renamed into place only when complete.
     
     Args:
         upload_file: FastAPI UploadFile object
         blueprint_id: Unique blueprint ID
         
     Returns:
-        Path to saved file
+        Dictionary with path, size, sha256, format, width and height
+        
+    Raises:
+        UploadTooLargeError: If the upload exceeds its size limit
+        InvalidImageError: If the upload is not a valid image or PDF
     """
-    # Get file extension
-    file_ext = Path(upload_file.filename).suffix.lower()
+    file_path, tmp_path = _upload_paths(blueprint_id, upload_file.filename)
+    ingest = _ImageIngest(max_upload_size(upload_file.filename))
     
-    # Create filename
-    filename = f"{blueprint_id}{file_ext}"
-    file_path = settings.UPLOAD_DIR / filename
+    buffer = await run_in_threadpool(tmp_path.open, "wb")
+    try:
+        while True:
+            chunk = await upload_file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            ingest.feed(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+        
+        info = ingest.finish(file_path)
+        await run_in_threadpool(buffer.close)
+        # Atomic: readers never see a partially written blueprint
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        buffer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
     
-    # Save file
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
+    return info
+
+async def save_archive_stream(upload_file: UploadFile) -> Path:
+    """
+    Stream an uploaded ZIP archive to a temporary file
     
-    return file_path
+    Args:
+        upload_file: FastAPI UploadFile object
+        
+    Returns:
+        Path to the temporary archive; the caller deletes it
+        
+    Raises:
+        UploadTooLargeError: If the archive exceeds MAX_ARCHIVE_SIZE
+        InvalidImageError: If the upload is not a ZIP archive
+    """
+    tmp_path = settings.UPLOAD_DIR / f".{generate_unique_id()}.zip.part"
+    size = 0
+    
+    buffer = await run_in_threadpool(tmp_path.open, "wb")
+    try:
+        while True:
+            chunk = await upload_file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if size == 0 and not chunk.startswith(b"PK"):
+                raise InvalidImageError("File is not a ZIP archive")
+            size += len(chunk)
+            if size > settings.MAX_ARCHIVE_SIZE:
+                raise UploadTooLargeError(
+                    f"Archive exceeds the {settings.MAX_ARCHIVE_SIZE} byte limit"
+                )
+            await run_in_threadpool(buffer.write, chunk)
+        await run_in_threadpool(buffer.close)
+    except BaseException:
+        buffer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    return tmp_path
+
+def iter_archive_images(archive: zipfile.ZipFile) -> Iterator[zipfile.ZipInfo]:
+    """
+    List the blueprint images inside an archive, in name order
+    
+    Args:
+        archive: Open ZIP archive
+        
+    Returns:
+        Iterator over image members with an allowed extension
+    """
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not Path(info.filename).name.startswith(".")
+        and validate_file_extension(info.filename)
+    ]
+    return iter(sorted(members, key=lambda info: info.filename))
+
+def extract_archive_image(
+    archive: zipfile.ZipFile,
+    member: zipfile.ZipInfo,
+    blueprint_id: str
+) -> Dict:
+    """
+    Extract one archive member as an uploaded blueprint
+    
+    Applies the same size, hash and header checks as ``save_upload_stream``
+    while streaming the member, so nothing is held fully in memory.
+    
+    Args:
+        archive: Open ZIP archive
+        member: Image member to extract
+        blueprint_id: Unique blueprint ID for the extracted image
+        
+    Returns:
+        Dictionary with path, size, sha256, format, width and height
+    """
+    max_size = max_upload_size(member.filename)
+    if member.file_size > max_size:
+        raise UploadTooLargeError(
+            f"File exceeds the {max_size} byte upload limit"
+        )
+    
+    file_path, tmp_path = _upload_paths(blueprint_id, member.filename)
+    ingest = _ImageIngest(max_size)
+    try:
+        with archive.open(member) as source, tmp_path.open("wb") as buffer:
+            for chunk in iter(lambda: source.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                ingest.feed(chunk)
+                buffer.write(chunk)
+        info = ingest.finish(file_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return info
+
+def register_upload(
+    blueprint_id: str,
+    path: Path,
+    filename: Optional[str] = None,
+    metadata: Optional[Dict] = None
+):
+    """
+    Record a stored upload in the results store and the retention index
+    
+    Args:
+        blueprint_id: Unique blueprint ID
+        path: Where the uploaded file is stored
+        filename: Original filename
+        metadata: Upload info (see ``ResultsStore.register_blueprint``)
+    """
+    results_store.register_blueprint(blueprint_id, path, filename, metadata)
+    size = (metadata or {}).get("size")
+    if size is None:
+        size = path.stat().st_size
+    retention_manager.track("upload", blueprint_id, size, path=path, blueprint_id=blueprint_id)
 
 def get_blueprint_path(blueprint_id: str) -> Optional[Path]:
     """
     Get path to blueprint file
     
+    Looks the blueprint up in the results store; files uploaded before the
+    store existed are found on disk once and registered.
+    
     Args:
         blueprint_id: Unique blueprint ID
         
     Returns:
-        Path to blueprint file or None if not found
+        Path to blueprint file or None if not found (or the ID is malformed)
     """
+    if not is_valid_blueprint_id(blueprint_id):
+        return None
+    blueprint = results_store.get_blueprint(blueprint_id)
+    if blueprint is not None:
+        file_path = Path(blueprint["path"])
+        return file_path if file_path.exists() else None
+    
     for ext in settings.ALLOWED_EXTENSIONS:
         file_path = settings.UPLOAD_DIR / f"{blueprint_id}{ext}"
         if file_path.exists():
+            register_upload(blueprint_id, file_path)
             return file_path
     return None
-
-def get_results_path(blueprint_id: str) -> Path:
-    """Get path to results JSON file"""
-    return settings.RESULTS_DIR / f"{blueprint_id}.json"
-
-def cleanup_old_files(max_age_hours: int = 24):
-    """
-    Clean up old uploaded files and results
-    
-    Args:
-        max_age_hours: Maximum age of files in hours
-    """
-    import time
-    from datetime import datetime, timedelta
-    
-    cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
-    
-    # Clean uploads
-    for file_path in settings.UPLOAD_DIR.glob("*"):
-        if file_path.is_file():
-            file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-            if file_time < cutoff_time:
-                file_path.unlink()
-    
-    # Clean results
-    for file_path in settings.RESULTS_DIR.glob("*.json"):
-        file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-        if file_time < cutoff_time:
-            file_path.unlink()
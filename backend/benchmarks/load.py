@@ -0,0 +1,133 @@
+"""
+In-process load generator
+
+Drives the real FastAPI app through an ASGI transport (no sockets) with a
+number of concurrent clients, each running the upload -> detect -> results
+flow on synthetic sheets, and reports throughput and latency percentiles
+for every endpoint.
+"""
+import asyncio
+import time
+from typing import List, Dict
+import httpx
+from micro import latency_summary
+from synthetic import generate_preset, encode_png
+
+OPERATIONS = ("upload", "detect", "results")
+
+async def _client(
+    client: httpx.AsyncClient,
+    images: List[bytes],
+    flows: "asyncio.Queue[int]",
+    samples: Dict[str, List[float]],
+    errors: Dict[str, int]
+):
+    while True:
+        try:
+            index = flows.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+
+        started = time.perf_counter()
+        response = await client.post(
+            "/upload",
+            files={"file": (f"sheet-{index}.png", images[index % len(images)], "image/png")}
+        )
+        samples["upload"].append((time.perf_counter() - started) * 1000.0)
+        if response.status_code != 200:
+            errors["upload"] += 1
+            continue
+        blueprint_id = response.json()["id"]
+
+        started = time.perf_counter()
+        response = await client.post(f"/detect/{blueprint_id}")
+        samples["detect"].append((time.perf_counter() - started) * 1000.0)
+        if response.status_code != 200:
+            errors["detect"] += 1
+            continue
+
+        started = time.perf_counter()
+        response = await client.get(f"/results/{blueprint_id}")
+        samples["results"].append((time.perf_counter() - started) * 1000.0)
+        if response.status_code != 200:
+            errors["results"] += 1
+
+async def drive(client: httpx.AsyncClient, images: List[bytes], concurrency: int, total_flows: int) -> Dict:
+    """
+    Run the flows through a client and report throughput and latencies
+
+    Args:
+        client: Client bound to a running app (in-process or over HTTP)
+        images: Encoded sheets cycled through as uploads
+        concurrency: Number of concurrent clients
+        total_flows: Number of upload -> detect -> results flows in total
+
+    Returns:
+        Throughput and per-operation latency report
+    """
+    samples = {operation: [] for operation in OPERATIONS}
+    errors = {operation: 0 for operation in OPERATIONS}
+
+    # One untimed flow so model load and warm-up are not measured
+    warmup: "asyncio.Queue[int]" = asyncio.Queue()
+    warmup.put_nowait(0)
+    await _client(client, images, warmup, {op: [] for op in OPERATIONS}, dict(errors))
+
+    flows: "asyncio.Queue[int]" = asyncio.Queue()
+    for index in range(total_flows):
+        flows.put_nowait(index)
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _client(client, images, flows, samples, errors)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "concurrency": concurrency,
+        "flows": total_flows,
+        "elapsed_s": elapsed,
+        "flows_per_s": total_flows / elapsed if elapsed > 0 else 0.0,
+        "operations": {}
+    }
+    for operation in OPERATIONS:
+        report["operations"][operation] = {
+            **latency_summary(samples[operation]),
+            "requests": len(samples[operation]),
+            "errors": errors[operation],
+            "throughput_rps": len(samples[operation]) / elapsed if elapsed > 0 else 0.0
+        }
+    return report
+
+async def _run(app, images: List[bytes], concurrency: int, total_flows: int) -> Dict:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            return await drive(client, images, concurrency, total_flows)
+
+def run_load(presets: List[str], concurrency: int, total_flows: int) -> Dict:
+    """
+    Run the upload/detect/results flow under concurrent load
+
+    Args:
+        presets: Names of ``synthetic.PRESETS`` cycled through as uploads
+        concurrency: Number of concurrent clients
+        total_flows: Number of upload -> detect -> results flows in total
+
+    Returns:
+        Throughput and per-operation latency report
+    """
+    # Imported here so the benchmark environment is configured first
+    from main import app
+
+    images = [encode_png(generate_preset(preset, seed=seed)[0]) for seed, preset in enumerate(presets)]
+    report = asyncio.run(_run(app, images, concurrency, total_flows))
+
+    print(f"  {total_flows} flows, {concurrency} clients: {report['flows_per_s']:.2f} flows/s")
+    for operation, summary in report["operations"].items():
+        print(
+            f"  {operation:<8} p50 {summary['p50_ms']:9.2f} ms  p95 {summary['p95_ms']:9.2f} ms  "
+            f"p99 {summary['p99_ms']:9.2f} ms  {summary['throughput_rps']:7.2f} req/s  "
+            f"{summary['errors']} errors"
+        )
+    return report
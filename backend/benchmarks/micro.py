@@ -0,0 +1,177 @@
+"""
+Microbenchmarks of the CPU-side detection pipeline
+
+Times image decoding and preparation, raw-output parsing (decode + NMS),
+confidence filtering, post-processing (NMS/WBF), statistics and response
+serialization on detections derived from synthetic sheets, so they do not
+depend on model weights.
+"""
+import gc
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Callable
+import numpy as np
+from models.backends import decode_yolo_output, non_max_suppression, letterbox, letterbox_into
+from models.detections import Detections
+from api.serialization import detection_response, COLUMNAR_JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+from schemas.response import DetectionResponse
+from services.inference import get_detection_statistics
+from schemas.request import PostprocessOptions
+from services.postprocess import filter_detections, postprocess_detections
+from services.preprocess import prepare_image, decoded_image_cache
+from core.config import settings
+from stub_detector import StubBackend
+from synthetic import CLASS_NAMES, generate_preset, encode_png
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean of latency samples in milliseconds"""
+    return {
+        "p50_ms": percentile(samples_ms, 50),
+        "p95_ms": percentile(samples_ms, 95),
+        "p99_ms": percentile(samples_ms, 99),
+        "mean_ms": sum(samples_ms) / len(samples_ms) if samples_ms else 0.0
+    }
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    """
+    Time repeated calls of ``fn``
+
+    Args:
+        fn: Function under test
+        repeat: Number of timed calls
+        warmup: Untimed calls made first
+
+    Returns:
+        Latency summary in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000.0)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return latency_summary(samples)
+
+def _jittered(truth: List[Dict], copies: int, seed: int) -> Detections:
+    """Ground truth repeated with box/confidence noise, like overlapping raw predictions"""
+    rng = np.random.default_rng(seed)
+    base = Detections.from_dicts(truth, CLASS_NAMES)
+    boxes = np.concatenate([base.boxes] * copies)
+    boxes += rng.normal(0, 2.0, boxes.shape).astype(np.float32)
+    scores = rng.uniform(0.05, 1.0, len(boxes)).astype(np.float32)
+    return Detections(boxes, scores, np.concatenate([base.class_ids] * copies), base.class_names)
+
+def run_micro(presets: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Run every microbenchmark on every preset sheet
+
+    Args:
+        presets: Names of ``synthetic.PRESETS`` to use
+        repeat: Timed calls per benchmark
+
+    Returns:
+        ``{"<benchmark>[<preset>]": latency summary}``
+    """
+    import cv2
+    backend = StubBackend(settings.MODEL_PATH)
+    backend.load()
+    results = {}
+    input_buffer = np.empty((1, 3, backend.imgsz, backend.imgsz), dtype=np.float32)
+    workdir = tempfile.TemporaryDirectory(prefix="blueprint-micro-")
+
+    def uncached(path: Path, mode: str, max_side: int = 0):
+        decoded_image_cache.clear()
+        return prepare_image(path, mode, max_side)
+
+    for preset in presets:
+        image, truth = generate_preset(preset)
+        png_path = Path(workdir.name) / f"{preset}.png"
+        png_path.write_bytes(encode_png(image))
+        jpeg_path = Path(workdir.name) / f"{preset}.jpg"
+        jpeg_path.write_bytes(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+
+        canvas, ratio, pad = letterbox(image, backend.imgsz)
+        batch = np.ascontiguousarray(canvas[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        raw = backend._run(batch)[0]
+
+        candidates = _jittered(truth, copies=3, seed=1)
+        detections = filter_detections(candidates, settings.CONFIDENCE_THRESHOLD)
+        dicts = detections.to_dicts()
+        statistics = get_detection_statistics(detections)
+        response_payload = {
+            "id": "benchmark",
+            "total_detections": len(dicts),
+            "detections": dicts,
+            "message": "Detection completed successfully"
+        }
+
+        cases = {
+            "decode.png.color": lambda: uncached(png_path, "color"),
+            "decode.png.gray": lambda: uncached(png_path, "gray"),
+            "decode.png.binary": lambda: uncached(png_path, "binary"),
+            "decode.jpeg.color": lambda: uncached(jpeg_path, "color"),
+            "decode.jpeg.gray_1024": lambda: uncached(jpeg_path, "gray", 1024),
+            "decode.cached": lambda: prepare_image(png_path, "color"),
+            "letterbox": lambda: letterbox(image, backend.imgsz),
+            "letterbox.into_batch": lambda: letterbox_into(image, input_buffer[0]),
+            "parse.decode_yolo_output": lambda: decode_yolo_output(
+                raw,
+                settings.CONFIDENCE_THRESHOLD,
+                settings.IOU_THRESHOLD,
+                ratio,
+                pad,
+                image.shape[:2]
+            ),
+            "parse.nms": lambda: non_max_suppression(
+                candidates.boxes,
+                candidates.scores,
+                candidates.class_ids,
+                settings.IOU_THRESHOLD
+            ),
+            "parse.from_dicts": lambda: Detections.from_dicts(dicts, CLASS_NAMES),
+            "filter": lambda: filter_detections(candidates, settings.CONFIDENCE_THRESHOLD),
+            "postprocess.nms": lambda: postprocess_detections(candidates, PostprocessOptions(merge="nms")),
+            "postprocess.wbf": lambda: postprocess_detections(
+                candidates,
+                PostprocessOptions(merge="wbf", containment=0.9, max_per_class=1000)
+            ),
+            "stats": lambda: get_detection_statistics(detections),
+            "serialize.to_dicts": detections.to_dicts,
+            "serialize.json": lambda: json.dumps({"detections": dicts, "statistics": statistics}),
+            "serialize.response": lambda: DetectionResponse(
+                id="benchmark",
+                total_detections=len(dicts),
+                detections=dicts,
+                message="Detection completed successfully"
+            ).model_dump_json(),
+            "serialize.fast": lambda: detection_response(response_payload),
+            "serialize.columnar": lambda: detection_response(response_payload, COLUMNAR_JSON_MEDIA_TYPE),
+            "serialize.msgpack": lambda: detection_response(response_payload, MSGPACK_MEDIA_TYPE)
+        }
+        for name, fn in cases.items():
+            summary = measure(fn, repeat)
+            summary["items"] = len(candidates) if name.startswith(("parse.nms", "filter", "postprocess")) else len(dicts)
+            results[f"{name}[{preset}]"] = summary
+            print(f"  {name:<28} {preset:<14} p50 {summary['p50_ms']:9.3f} ms  p95 {summary['p95_ms']:9.3f} ms")
+
+    decoded_image_cache.clear()
+    workdir.cleanup()
+    return results
@@ -0,0 +1,291 @@
+"""
+CPU benchmark and load-test suite
+
+Usage (from backend/):
+    python benchmarks/run.py run --output benchmarks/results/baseline.json
+    python benchmarks/run.py run --quick --baseline benchmarks/results/baseline.json
+    python benchmarks/run.py compare benchmarks/results/baseline.json current.json
+    python benchmarks/run.py run --suite scaling --forward-cpu-ms 40
+
+``run`` generates synthetic blueprints, times the CPU pipeline stages
+(microbenchmarks) and drives the app in-process with concurrent clients
+(load test). The model is replaced by a deterministic stub, so no
+``best.pt`` is needed; the app runs against a temporary data directory.
+The ``scaling`` suite (not run by default) serves the app with 1, 2, 4,
+... worker processes through ``serve.py`` and measures throughput over
+HTTP. Results are written as a JSON baseline. ``compare`` (or ``run --baseline``)
+exits with status 1 when any metric regressed by more than the threshold.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "app"))
+
+BASELINE_VERSION = 1
+DEFAULT_THRESHOLD = 0.15
+# Differences below this are timer noise, whatever the relative change
+DEFAULT_MIN_DELTA_MS = 0.05
+
+FULL = {
+    "micro_presets": ["small-sparse", "medium", "large-dense"],
+    "micro_repeat": 50,
+    "load_presets": ["small-sparse", "medium", "tiny-symbols"],
+    "concurrency": 8,
+    "flows": 48,
+    "scaling_presets": ["medium"],
+    "scaling_concurrency": 16,
+    "scaling_flows": 64
+}
+QUICK = {
+    "micro_presets": ["small-sparse", "medium"],
+    "micro_repeat": 15,
+    "load_presets": ["small-sparse"],
+    "concurrency": 4,
+    "flows": 12,
+    "scaling_presets": ["small-sparse"],
+    "scaling_concurrency": 8,
+    "scaling_flows": 24
+}
+
+def _configure_environment(workdir: Path, args: argparse.Namespace):
+    """Point every data path of the app at ``workdir``; must run before app imports"""
+    environment = {
+        "UPLOAD_DIR": workdir / "uploads",
+        "RESULTS_DIR": workdir / "results",
+        "MODEL_DIR": workdir / "models",
+        "MODEL_PATH": workdir / "models" / "stub.pt",
+        "CACHE_DIR": workdir / "results" / "cache",
+        "RESULTS_DB_PATH": workdir / "results" / "results.db",
+        "JOBS_DB_PATH": workdir / "results" / "jobs.db",
+        "RETENTION_DB_PATH": workdir / "results" / "retention.db",
+        "PYRAMID_DIR": workdir / "uploads" / "pyramids",
+        "PROFILE_DIR": workdir / "results" / "profiles",
+        # Every flow uploads a repeated sheet; measure inference, not cache hits
+        "CACHE_ENABLED": "true" if args.cache else "false",
+        # Tiles are built after the response in production; keep them out of upload latency
+        "PYRAMID_ENABLED": "false"
+    }
+    for name, value in environment.items():
+        os.environ[name] = str(value)
+
+def _flatten(micro: Optional[Dict], load: Optional[Dict], scaling: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Baseline metrics: ``name -> {"value", "unit", "higher_is_better"}``"""
+    metrics = {}
+    for name, summary in (micro or {}).items():
+        for key in ("p50_ms", "p95_ms"):
+            metrics[f"micro.{name}.{key}"] = {"value": summary[key], "unit": "ms", "higher_is_better": False}
+    if load:
+        metrics["load.flows_per_s"] = {"value": load["flows_per_s"], "unit": "1/s", "higher_is_better": True}
+        for operation, summary in load["operations"].items():
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                metrics[f"load.{operation}.{key}"] = {"value": summary[key], "unit": "ms", "higher_is_better": False}
+            metrics[f"load.{operation}.throughput_rps"] = {
+                "value": summary["throughput_rps"],
+                "unit": "1/s",
+                "higher_is_better": True
+            }
+            metrics[f"load.{operation}.errors"] = {"value": summary["errors"], "unit": "count", "higher_is_better": False}
+    for workers, report in (scaling or {}).items():
+        metrics[f"scaling.workers_{workers}.flows_per_s"] = {
+            "value": report["flows_per_s"],
+            "unit": "1/s",
+            "higher_is_better": True
+        }
+        metrics[f"scaling.workers_{workers}.speedup"] = {"value": report["speedup"], "unit": "x", "higher_is_better": True}
+    return metrics
+
+def run(args: argparse.Namespace) -> Dict:
+    """Run the selected suites and return the baseline document"""
+    profile = dict(QUICK if args.quick else FULL)
+    if args.concurrency:
+        profile["concurrency"] = args.concurrency
+    if args.flows:
+        profile["flows"] = args.flows
+    suites = set(args.suite.split(","))
+
+    with tempfile.TemporaryDirectory(prefix="blueprint-bench-") as tmp:
+        workdir = Path(tmp)
+        _configure_environment(workdir, args)
+
+        from stub_detector import install_stub_detector
+        (workdir / "models").mkdir(parents=True, exist_ok=True)
+        install_stub_detector(workdir / "models", args.forward_ms, args.forward_ms_per_image)
+
+        micro = load = scaling = None
+        if "micro" in suites:
+            from micro import run_micro
+            print("Microbenchmarks")
+            micro = run_micro(profile["micro_presets"], profile["micro_repeat"])
+        if "load" in suites:
+            from load import run_load
+            print("Load test")
+            load = run_load(profile["load_presets"], profile["concurrency"], profile["flows"])
+        if "scaling" in suites:
+            from scaling import run_scaling, worker_counts
+            counts = worker_counts(args.max_workers)
+            print(f"Scaling ({', '.join(map(str, counts))} workers)")
+            scaling = run_scaling(
+                counts,
+                profile["scaling_presets"],
+                max(profile["scaling_concurrency"], 4 * counts[-1]),
+                profile["scaling_flows"],
+                args.forward_cpu_ms
+            )
+
+    import numpy as np
+    return {
+        "version": BASELINE_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__
+        },
+        "config": {
+            **profile,
+            "suites": sorted(suites),
+            "forward_ms": args.forward_ms,
+            "forward_ms_per_image": args.forward_ms_per_image,
+            "forward_cpu_ms": args.forward_cpu_ms,
+            "cache": args.cache
+        },
+        "metrics": _flatten(micro, load, scaling),
+        "details": {"micro": micro, "load": load, "scaling": scaling}
+    }
+
+def _threshold_for(name: str, threshold: float, overrides: Dict[str, float]) -> float:
+    """Threshold of a metric: the last matching glob in ``overrides`` wins"""
+    for pattern, value in overrides.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            threshold = value
+    return threshold
+
+def compare(
+    baseline: Dict,
+    current: Dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    overrides: Optional[Dict[str, float]] = None,
+    min_delta_ms: float = DEFAULT_MIN_DELTA_MS
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Compare the metrics of two runs
+
+    Args:
+        baseline: Baseline document
+        current: Document of the run under test
+        threshold: Allowed relative regression (0.15 = 15% worse)
+        overrides: Per-metric thresholds keyed by glob, e.g. ``{"load.*": 0.3}``
+        min_delta_ms: Latency changes smaller than this never count as regressions
+
+    Returns:
+        (all compared rows, rows that regressed)
+    """
+    overrides = overrides or {}
+    rows, regressions = [], []
+    for name, base in sorted(baseline["metrics"].items()):
+        metric = current["metrics"].get(name)
+        if metric is None:
+            continue
+        old, new = base["value"], metric["value"]
+        limit = _threshold_for(name, threshold, overrides)
+        if base["higher_is_better"]:
+            change = (old - new) / old if old else 0.0
+        else:
+            change = (new - old) / old if old else float(new > 0)
+        regressed = change > limit
+        if regressed and base["unit"] == "ms" and abs(new - old) < min_delta_ms:
+            regressed = False
+
+        row = {"name": name, "baseline": old, "current": new, "change": change, "threshold": limit, "regressed": regressed}
+        rows.append(row)
+        if regressed:
+            regressions.append(row)
+    return rows, regressions
+
+def _print_comparison(rows: List[Dict], regressions: List[Dict]):
+    # Changes are signed so that positive always means worse
+    for row in rows:
+        flag = "REGRESSED" if row["regressed"] else ""
+        print(
+            f"  {row['name']:<58} {row['baseline']:12.3f} -> {row['current']:12.3f} "
+            f"({row['change'] * 100:+6.1f}%, limit {row['threshold'] * 100:.0f}%) {flag}"
+        )
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed beyond the threshold")
+    else:
+        print("No regressions")
+
+def _load_json(path: str) -> Dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _compare_files(baseline_path: str, current: Dict, args: argparse.Namespace) -> int:
+    baseline = _load_json(baseline_path)
+    overrides = _load_json(args.thresholds) if args.thresholds else {}
+    rows, regressions = compare(baseline, current, args.threshold, overrides, args.min_delta_ms)
+    print(f"Comparison against {baseline_path}")
+    _print_comparison(rows, regressions)
+    return 1 if regressions else 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_compare_options(command):
+        command.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                             help="Allowed relative regression (default: %(default)s)")
+        command.add_argument("--thresholds", help="JSON file mapping metric globs to thresholds")
+        command.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                             help="Ignore latency changes below this many ms (default: %(default)s)")
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write a baseline")
+    run_parser.add_argument("--suite", default="micro,load", help="Comma-separated: micro, load, scaling")
+    run_parser.add_argument("--quick", action="store_true", help="Smaller sheets and fewer iterations")
+    run_parser.add_argument("--output", help="Where to write the results JSON")
+    run_parser.add_argument("--baseline", help="Compare against this baseline after the run")
+    run_parser.add_argument("--concurrency", type=int, help="Concurrent clients in the load test")
+    run_parser.add_argument("--flows", type=int, help="Upload/detect/results flows in the load test")
+    run_parser.add_argument("--forward-ms", type=float, default=0.0,
+                            help="Simulated fixed model-call time of the stub detector")
+    run_parser.add_argument("--forward-ms-per-image", type=float, default=0.0,
+                            help="Simulated per-image model time of the stub detector")
+    run_parser.add_argument("--forward-cpu-ms", type=float, default=0.0,
+                            help="Simulated per-image model CPU time in the scaling suite")
+    run_parser.add_argument("--max-workers", type=int,
+                            help="Largest worker count in the scaling suite (default: available CPUs)")
+    run_parser.add_argument("--cache", action="store_true", help="Keep the detection cache enabled")
+    add_compare_options(run_parser)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    add_compare_options(compare_parser)
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        return _compare_files(args.baseline, _load_json(args.current), args)
+
+    results = run(args)
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {output}")
+    if args.baseline:
+        return _compare_files(args.baseline, results, args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Multi-worker throughput scaling
+
+Starts ``serve.py`` (real processes and sockets) with the stub detector for
+each worker count, drives the upload -> detect -> results flow over HTTP
+and reports throughput, speedup over the first worker count and the
+memory of the worker processes (RSS counts shared pages in every worker,
+PSS splits them between the workers sharing them, so their gap is the
+copy-on-write saving).
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Optional
+import httpx
+from synthetic import generate_preset, encode_png
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+READY_TIMEOUT = 120.0
+
+def worker_counts(max_workers: Optional[int] = None) -> List[int]:
+    """1, 2, 4, ... up to the available CPUs (at least 1 and 2)"""
+    sys.path.insert(0, str(BENCHMARK_DIR.parent / "app"))
+    from core.cpu import available_cpus
+    limit = max(2, max_workers or available_cpus())
+    counts, workers = [], 1
+    while workers <= limit:
+        counts.append(workers)
+        workers *= 2
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _memory_kb(pid: int) -> Dict[str, int]:
+    """Rss and Pss of a process in kB"""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    memory[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+def _worker_memory(server_pid: int) -> Dict[str, float]:
+    """Summed memory of the worker processes of a server, in MB"""
+    try:
+        children = open(f"/proc/{server_pid}/task/{server_pid}/children").read().split()
+    except OSError:
+        return {}
+    rss = pss = 0
+    for pid in children:
+        memory = _memory_kb(int(pid))
+        rss += memory.get("Rss", 0)
+        pss += memory.get("Pss", 0)
+    return {"workers_rss_mb": rss / 1024.0, "workers_pss_mb": pss / 1024.0}
+
+async def _wait_ready(base_url: str, workers: int, process: subprocess.Popen):
+    """Wait until every worker has answered /health with a loaded model"""
+    seen = set()
+    deadline = time.monotonic() + READY_TIMEOUT
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=10, limits=limits) as client:
+        while len(seen) < workers:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Only {len(seen)} of {workers} workers became ready")
+            try:
+                health = (await client.get("/health")).json()
+                if health["status"] == "healthy":
+                    seen.add(health["process"]["pid"])
+                    continue
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+
+async def _measure(base_url: str, workers: int, process: subprocess.Popen, images: List[bytes],
+                   concurrency: int, flows: int) -> Dict:
+    # Imported here: the server process must configure its environment before app modules load
+    from load import drive
+    await _wait_ready(base_url, workers, process)
+    # No keep-alive: every request is a new connection, spread over the workers by the kernel
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        return await drive(client, images, concurrency, flows)
+
+def _measure_workers(workers: int, images: List[bytes], concurrency: int, flows: int,
+                     forward_cpu_ms: float) -> Dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory(prefix="blueprint-scaling-") as tmp:
+        log_path = Path(tmp) / "server.log"
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(
+                [
+                    sys.executable, __file__,
+                    "--workdir", tmp,
+                    "--workers", str(workers),
+                    "--port", str(port),
+                    "--forward-cpu-ms", str(forward_cpu_ms)
+                ],
+                stdout=log,
+                stderr=subprocess.STDOUT
+            )
+        try:
+            report = asyncio.run(_measure(f"http://127.0.0.1:{port}", workers, process, images, concurrency, flows))
+            report.update(_worker_memory(process.pid))
+        except Exception:
+            print(log_path.read_text()[-4000:])
+            raise
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    report["workers"] = workers
+    return report
+
+def run_scaling(
+    counts: List[int],
+    presets: List[str],
+    concurrency: int,
+    flows: int,
+    forward_cpu_ms: float = 0.0
+) -> Dict[str, Dict]:
+    """
+    Measure throughput for each number of server workers
+
+    Args:
+        counts: Worker counts to measure
+        presets: Names of ``synthetic.PRESETS`` cycled through as uploads
+        concurrency: Concurrent clients (should be well above the largest count)
+        flows: Upload -> detect -> results flows per measurement
+        forward_cpu_ms: Simulated CPU time of the model per image
+
+    Returns:
+        ``{"<workers>": report}`` with ``flows_per_s``, ``speedup`` and worker memory
+    """
+    images = [encode_png(generate_preset(preset, seed=seed)[0]) for seed, preset in enumerate(presets)]
+    results = {}
+    for workers in counts:
+        report = _measure_workers(workers, images, concurrency, flows, forward_cpu_ms)
+        results[str(workers)] = report
+        base = results[str(counts[0])]["flows_per_s"]
+        report["speedup"] = report["flows_per_s"] / base if base else 0.0
+        detect = report["operations"]["detect"]
+        print(
+            f"  {workers:>3} worker(s): {report['flows_per_s']:8.2f} flows/s  x{report['speedup']:.2f}  "
+            f"detect p95 {detect['p95_ms']:9.2f} ms  {sum(s['errors'] for s in report['operations'].values())} errors  "
+            f"RSS {report.get('workers_rss_mb', 0):7.1f} MB  PSS {report.get('workers_pss_mb', 0):7.1f} MB"
+        )
+    return results
+
+def _serve(args: argparse.Namespace) -> int:
+    """Entry point of the measured server process"""
+    sys.path.insert(0, str(BENCHMARK_DIR.parent / "app"))
+    from run import _configure_environment
+    workdir = Path(args.workdir)
+    _configure_environment(workdir, argparse.Namespace(cache=False))
+    os.environ["SERVER_WORKERS"] = str(args.workers)
+
+    from stub_detector import install_stub_detector
+    (workdir / "models").mkdir(parents=True, exist_ok=True)
+    install_stub_detector(workdir / "models", forward_cpu_ms_per_image=args.forward_cpu_ms)
+    from serve import serve
+    return serve(args.workers, "127.0.0.1", args.port)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server process of the scaling benchmark (started by run.py)")
+    parser.add_argument("--workdir", required=True)
+    parser.add_argument("--workers", type=int, required=True)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--forward-cpu-ms", type=float, default=0.0)
+    sys.exit(_serve(parser.parse_args()))
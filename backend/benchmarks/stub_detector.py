@@ -0,0 +1,99 @@
+"""
+Deterministic stand-in for the YOLO model
+
+The stub goes through the same decode, letterbox and NMS code as the
+exported backends, but computes the raw (4 + classes, anchors) output
+from the ink density of each anchor cell instead of running a network.
+The same image always gives the same detections, denser drawings give
+more of them, and no ``best.pt`` or ML runtime is needed.
+"""
+import time
+from pathlib import Path
+import numpy as np
+from models.backends import BACKENDS, _ExportedBackend
+from models.detector import detector
+from models.registry import model_registry, DEFAULT_MODEL
+from synthetic import CLASS_NAMES
+
+# YOLOv8 detection head strides
+STRIDES = (8, 16, 32)
+
+class StubBackend(_ExportedBackend):
+    """Inference backend that fakes the network forward pass"""
+
+    name = "stub"
+
+    # Simulated forward time; the sleep releases the GIL like a real runtime
+    forward_ms: float = 0.0
+    forward_ms_per_image: float = 0.0
+    # Simulated forward CPU time per image, spent busy on this thread (holds the GIL, competes for cores)
+    forward_cpu_ms_per_image: float = 0.0
+    # Plain numpy, nothing that a fork could break
+    fork_safe = True
+
+    def load(self):
+        self.class_names = dict(CLASS_NAMES)
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        if self.forward_ms or self.forward_ms_per_image:
+            time.sleep((self.forward_ms + self.forward_ms_per_image * len(batch)) / 1000.0)
+        if self.forward_cpu_ms_per_image:
+            deadline = time.thread_time() + self.forward_cpu_ms_per_image * len(batch) / 1000.0
+            while time.thread_time() < deadline:
+                pass
+
+        num_classes = len(self.class_names)
+        size = batch.shape[2]
+        # Fraction of dark pixels; letterbox padding (114) counts as blank
+        ink = (batch.mean(axis=1) < 0.35).astype(np.float32)
+
+        heads = []
+        for stride in STRIDES:
+            cells = size // stride
+            density = ink[:, :cells * stride, :cells * stride].reshape(
+                len(batch), cells, stride, cells, stride
+            ).mean(axis=(2, 4))
+
+            grid_y, grid_x = np.mgrid[0:cells, 0:cells]
+            # Fixed per-cell pseudo-random values keep results deterministic
+            noise = ((grid_x * 73856093) ^ (grid_y * 19349663) ^ stride) % 1000 / 1000.0
+            class_ids = (grid_x * 7 + grid_y * 13 + stride) % num_classes
+
+            output = np.zeros((len(batch), 4 + num_classes, cells * cells), dtype=np.float32)
+            output[:, 0] = ((grid_x + 0.5) * stride).reshape(-1)
+            output[:, 1] = ((grid_y + 0.5) * stride).reshape(-1)
+            output[:, 2] = (stride * (1.5 + noise)).reshape(-1)
+            output[:, 3] = (stride * (2.5 - noise)).reshape(-1)
+            scores = np.clip(density * 4.0, 0.0, 1.0) * (0.55 + 0.45 * noise)
+            flat_classes = class_ids.reshape(-1)
+            output[:, 4 + flat_classes, np.arange(cells * cells)] = scores.reshape(len(batch), -1)
+            heads.append(output)
+        return np.concatenate(heads, axis=2)
+
+BACKENDS[StubBackend.name] = StubBackend
+
+def install_stub_detector(
+    workdir: Path,
+    forward_ms: float = 0.0,
+    forward_ms_per_image: float = 0.0,
+    forward_cpu_ms_per_image: float = 0.0
+):
+    """
+    Point the global detector and the default registry model at the stub backend
+
+    Args:
+        workdir: Directory for the placeholder weights file
+        forward_ms: Simulated fixed cost of each model call
+        forward_ms_per_image: Simulated cost of each image in a model call
+        forward_cpu_ms_per_image: Simulated CPU time of each image in a model call
+    """
+    StubBackend.forward_ms = forward_ms
+    StubBackend.forward_ms_per_image = forward_ms_per_image
+    StubBackend.forward_cpu_ms_per_image = forward_cpu_ms_per_image
+    weights = Path(workdir) / "stub.pt"
+    # The detector and cache keys expect a weights file to exist
+    weights.write_bytes(b"stub")
+    detector.model_path = weights
+    detector.backend_name = StubBackend.name
+    detector.model = None
+    model_registry.register(DEFAULT_MODEL, weights, StubBackend.name)
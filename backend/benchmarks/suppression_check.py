@@ -0,0 +1,150 @@
+"""
+Randomized equivalence check of the vectorized suppression engine
+
+Compares ``candidate_pairs`` and ``greedy_suppression`` with a naive
+O(N^2) pair search and the classic one-box-at-a-time greedy loop, on
+random sheets that mix box scales within and across classes: small
+symbols, long walls and boxes covering most of the sheet, with shared
+edges and tied scores. Every overlap metric is checked, with strict and
+inclusive thresholds.
+
+Usage (from backend/):
+    python benchmarks/suppression_check.py --trials 100 --seed 0
+
+Exits with status 1 on the first mismatch, printing the failing case.
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, Tuple
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from models.suppression import candidate_pairs, greedy_suppression, pair_overlap
+
+METRICS = ("iou", "ios", "containment")
+
+def random_case(rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Boxes, scores and class IDs of one random sheet
+
+    Box sides are drawn per box from a few scales, spread over up to three
+    orders of magnitude. Snapped cases put boxes on a coarse lattice so
+    that edges touch exactly and scores tie.
+    """
+    count = int(rng.integers(2, 400))
+    sheet = float(rng.choice([500.0, 3000.0, 10000.0]))
+    scales = rng.choice([0.002, 0.01, 0.05, 0.3, 0.9], size=(count, 1)) * sheet
+    corners = rng.uniform(0.0, sheet, size=(count, 2))
+    sides = rng.uniform(0.1, 1.0, size=(count, 2)) * scales
+    # Walls: long in one direction, thin in the other
+    walls = rng.random(count) < 0.15
+    sides[walls, rng.integers(0, 2)] = rng.uniform(1.0, 4.0, size=int(walls.sum()))
+    scores = rng.random(count).astype(np.float32)
+    if rng.random() < 0.3:
+        step = sheet / 50.0
+        corners = np.round(corners / step) * step
+        sides = np.maximum(np.round(sides / step), 1.0) * step
+        scores = np.round(scores * 4.0) / 4.0
+    boxes = np.concatenate([corners, corners + sides], axis=1).astype(np.float32)
+    class_ids = rng.integers(0, int(rng.integers(1, 4)), size=count)
+    return boxes, scores, class_ids
+
+def naive_pairs(boxes: np.ndarray, class_ids: np.ndarray) -> Dict[Tuple[int, int], float]:
+    """Intersection area of every intersecting same-class pair (i < j), by brute force"""
+    pairs = {}
+    for i in range(len(boxes)):
+        j = np.arange(i + 1, len(boxes))
+        j = j[class_ids[j] == class_ids[i]]
+        width = np.minimum(boxes[i, 2], boxes[j, 2]) - np.maximum(boxes[i, 0], boxes[j, 0])
+        height = np.minimum(boxes[i, 3], boxes[j, 3]) - np.maximum(boxes[i, 1], boxes[j, 1])
+        hit = (width > 0) & (height > 0)
+        for k, area in zip(j[hit], (width[hit] * height[hit]).astype(np.float32)):
+            pairs[(i, int(k))] = float(area)
+    return pairs
+
+def naive_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    threshold: float,
+    metric: str,
+    inclusive: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Classic greedy suppression: visit boxes by score, compare with every kept box"""
+    order = np.argsort(-scores, kind="stable")
+    owner = np.arange(len(boxes))
+    kept = []
+    for index in order:
+        heads = np.asarray(kept, dtype=np.int64)
+        heads = heads[class_ids[heads] == class_ids[index]]
+        width = np.minimum(boxes[heads, 2], boxes[index, 2]) - np.maximum(boxes[heads, 0], boxes[index, 0])
+        height = np.minimum(boxes[heads, 3], boxes[index, 3]) - np.maximum(boxes[heads, 1], boxes[index, 1])
+        hit = (width > 0) & (height > 0)
+        heads = heads[hit]
+        inter = (width[hit] * height[hit]).astype(np.float32)
+        overlap = pair_overlap(boxes, heads, np.full(len(heads), index), inter, metric)
+        suppressing = heads[overlap >= threshold if inclusive else overlap > threshold]
+        if len(suppressing):
+            # The first kept box in score order claims it
+            owner[index] = suppressing[0]
+        else:
+            kept.append(index)
+    return np.asarray(kept, dtype=np.int64), owner
+
+def check_case(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, rng: np.random.Generator) -> str:
+    """Empty string if the engine agrees with the naive versions, else what differs"""
+    i, j, inter = candidate_pairs(boxes, class_ids)
+    found = {}
+    for a, b, area in zip(i.tolist(), j.tolist(), inter.tolist()):
+        key = (min(a, b), max(a, b))
+        if key in found:
+            return f"pair {key} reported twice"
+        found[key] = area
+    expected = naive_pairs(boxes, class_ids)
+    if found.keys() != expected.keys():
+        missing = sorted(set(expected) - set(found))[:5]
+        extra = sorted(set(found) - set(expected))[:5]
+        return f"candidate pairs differ: missing {missing}, extra {extra}"
+    wrong = [key for key in found if not np.isclose(found[key], expected[key], rtol=1e-5)]
+    if wrong:
+        return f"intersection areas differ for {wrong[:5]}"
+
+    for metric in METRICS:
+        # Include thresholds that exact overlaps (shared edges, nested boxes) hit
+        for threshold in (float(rng.uniform(0.05, 0.95)), 0.5, 1.0):
+            for inclusive in (False, True):
+                kept, owner = greedy_suppression(boxes, scores, class_ids, threshold, metric, inclusive)
+                reference_kept, reference_owner = naive_suppression(
+                    boxes, scores, class_ids, threshold, metric, inclusive
+                )
+                label = f"{metric} threshold={threshold:.3f} inclusive={inclusive}"
+                if not np.array_equal(kept, reference_kept):
+                    return f"kept boxes differ ({label})"
+                if not np.array_equal(owner, reference_owner):
+                    return f"suppressing boxes differ ({label})"
+    return ""
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the suppression engine against naive O(N^2) suppression")
+    parser.add_argument("--trials", type=int, default=100, help="Random sheets to check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    boxes_checked = 0
+    for trial in range(args.trials):
+        boxes, scores, class_ids = random_case(rng)
+        problem = check_case(boxes, scores, class_ids, rng)
+        if problem:
+            print(f"✗ Trial {trial} ({len(boxes)} boxes, seed {args.seed}): {problem}")
+            np.set_printoptions(threshold=20)
+            print(f"  boxes={boxes!r}\n  scores={scores!r}\n  class_ids={class_ids!r}")
+            return 1
+        boxes_checked += len(boxes)
+    print(f"✓ {args.trials} sheets ({boxes_checked} boxes) match naive suppression")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
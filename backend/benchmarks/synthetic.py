@@ -0,0 +1,147 @@
+"""
+Synthetic blueprint generator
+
+Draws deterministic floor-plan-like line drawings: a grid of rooms with
+thick walls, door swings, window glyphs and room labels. The symbol size
+and density are configurable so benchmarks can cover sparse sheets as well
+as dense ones, and every drawn symbol is returned as ground truth.
+"""
+from typing import List, Dict, Tuple
+import cv2
+import numpy as np
+
+CLASS_NAMES = {0: "wall", 1: "door", 2: "window", 3: "room"}
+
+# name -> (width, height, rooms per 1000 px, symbol scale)
+PRESETS = {
+    "small-sparse": (1600, 1200, 2, 1.0),
+    "medium": (3200, 2400, 4, 1.0),
+    "large-dense": (6400, 4800, 8, 0.6),
+    "tiny-symbols": (3200, 2400, 6, 0.35)
+}
+
+def _box(x1: float, y1: float, x2: float, y2: float, label: str) -> Dict:
+    return {
+        "label": label,
+        "confidence": 1.0,
+        "bbox": [float(min(x1, x2)), float(min(y1, y2)), float(abs(x2 - x1)), float(abs(y2 - y1))]
+    }
+
+def _draw_door(image: np.ndarray, x: int, y: int, size: int, rng: np.random.Generator) -> Dict:
+    """Door leaf with its quarter-circle swing, hinged at (x, y)"""
+    angle = int(rng.integers(0, 4)) * 90
+    cv2.ellipse(image, (x, y), (size, size), angle, 0, 90, 0, 1, cv2.LINE_AA)
+    radians = np.deg2rad(angle)
+    end = (int(x + size * np.cos(radians)), int(y + size * np.sin(radians)))
+    cv2.line(image, (x, y), end, 0, 2, cv2.LINE_AA)
+    corner = np.deg2rad(angle + 90)
+    xs = [x, x + size * np.cos(radians), x + size * np.cos(corner)]
+    ys = [y, y + size * np.sin(radians), y + size * np.sin(corner)]
+    return _box(min(xs), min(ys), max(xs), max(ys), "door")
+
+def _draw_window(image: np.ndarray, x: int, y: int, length: int, horizontal: bool) -> Dict:
+    """Window as three parallel strokes across the wall"""
+    thickness = max(6, length // 6)
+    if horizontal:
+        x1, y1, x2, y2 = x, y - thickness // 2, x + length, y + thickness // 2
+    else:
+        x1, y1, x2, y2 = x - thickness // 2, y, x + thickness // 2, y + length
+    cv2.rectangle(image, (x1, y1), (x2, y2), 255, -1)
+    cv2.rectangle(image, (x1, y1), (x2, y2), 0, 1)
+    if horizontal:
+        cv2.line(image, (x1, y), (x2, y), 0, 1)
+    else:
+        cv2.line(image, (x, y1), (x, y2), 0, 1)
+    return _box(x1, y1, x2, y2, "window")
+
+def generate_blueprint(
+    width: int = 3200,
+    height: int = 2400,
+    density: float = 4,
+    symbol_scale: float = 1.0,
+    seed: int = 0
+) -> Tuple[np.ndarray, List[Dict]]:
+    """
+    Draw a synthetic blueprint
+
+    Args:
+        width: Sheet width in pixels
+        height: Sheet height in pixels
+        density: Rooms per 1000 pixels along each axis
+        symbol_scale: Multiplier for door/window/label sizes
+        seed: Random seed; the same arguments always produce the same sheet
+
+    Returns:
+        (BGR image, ground-truth detections in the API list-of-dicts format)
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width), 255, dtype=np.uint8)
+    truth: List[Dict] = []
+
+    margin = max(20, int(min(width, height) * 0.03))
+    cols = max(1, int(round((width - 2 * margin) / 1000 * density)))
+    rows = max(1, int(round((height - 2 * margin) / 1000 * density)))
+
+    # Jittered grid of wall positions
+    xs = np.linspace(margin, width - margin, cols + 1)
+    ys = np.linspace(margin, height - margin, rows + 1)
+    xs[1:-1] += rng.uniform(-0.2, 0.2, cols - 1) * (xs[1] - xs[0])
+    ys[1:-1] += rng.uniform(-0.2, 0.2, rows - 1) * (ys[1] - ys[0])
+    xs, ys = xs.astype(int), ys.astype(int)
+
+    wall = max(3, int(6 * symbol_scale))
+    for x in xs:
+        cv2.line(image, (int(x), int(ys[0])), (int(x), int(ys[-1])), 0, wall)
+        truth.append(_box(x - wall / 2, ys[0], x + wall / 2, ys[-1], "wall"))
+    for y in ys:
+        cv2.line(image, (int(xs[0]), int(y)), (int(xs[-1]), int(y)), 0, wall)
+        truth.append(_box(xs[0], y - wall / 2, xs[-1], y + wall / 2, "wall"))
+
+    font_scale = 0.8 * symbol_scale
+    for row in range(rows):
+        for col in range(cols):
+            x1, x2 = int(xs[col]), int(xs[col + 1])
+            y1, y2 = int(ys[row]), int(ys[row + 1])
+            room_w, room_h = x2 - x1, y2 - y1
+            truth.append(_box(x1, y1, x2, y2, "room"))
+
+            label = f"R{row * cols + col + 1:03d}"
+            (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+            cv2.putText(
+                image,
+                label,
+                ((x1 + x2 - text_w) // 2, (y1 + y2 + text_h) // 2),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                font_scale,
+                0,
+                1,
+                cv2.LINE_AA
+            )
+
+            door = max(8, int(min(room_w, room_h) * 0.18 * symbol_scale))
+            if room_w > 3 * door and room_h > 3 * door:
+                hinge_x = int(rng.integers(x1 + door, x2 - door))
+                truth.append(_draw_door(image, hinge_x, y1 + wall, door, rng))
+
+            for _ in range(int(rng.integers(1, 3))):
+                length = max(12, int(min(room_w, room_h) * 0.25 * symbol_scale))
+                if rng.random() < 0.5 and room_w > 2 * length:
+                    start = int(rng.integers(x1 + length // 2, x2 - length - length // 2))
+                    truth.append(_draw_window(image, start, y2, length, True))
+                elif room_h > 2 * length:
+                    start = int(rng.integers(y1 + length // 2, y2 - length - length // 2))
+                    truth.append(_draw_window(image, x2, start, length, False))
+
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), truth
+
+def generate_preset(name: str, seed: int = 0) -> Tuple[np.ndarray, List[Dict]]:
+    """Draw one of the named ``PRESETS``"""
+    width, height, density, symbol_scale = PRESETS[name]
+    return generate_blueprint(width, height, density, symbol_scale, seed)
+
+def encode_png(image: np.ndarray) -> bytes:
+    """PNG bytes of an image, as a client would upload it"""
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise RuntimeError("Failed to encode synthetic blueprint")
+    return encoded.tobytes()
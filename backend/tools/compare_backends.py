@@ -0,0 +1,137 @@
+"""
+Check that an exported inference backend matches the PyTorch reference
+
+Usage (from backend/):
+    python tools/compare_backends.py --images samples/ --candidate onnxruntime
+
+Runs both backends over every image in the folder, matches boxes of the
+same class by IOU and reports the largest box and confidence deviations
+and the boxes either backend found without a counterpart. Exits with
+status 1 if any deviation or the unmatched fraction exceeds the documented
+tolerance.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import numpy as np
+from core.config import settings
+from models.backends import (
+    create_backend,
+    BACKEND_BOX_TOLERANCE_PX,
+    BACKEND_CONF_TOLERANCE,
+    BACKEND_UNMATCHED_TOLERANCE
+)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IOU matrix between two sets of xyxy boxes"""
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+def compare(reference, candidate, match_iou: float = 0.5) -> dict:
+    """Match candidate detections to reference detections and measure deviations"""
+    report = {
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "matched": 0,
+        "unmatched_reference": len(reference),
+        "unmatched_candidate": len(candidate),
+        "max_box_error_px": 0.0,
+        "max_conf_error": 0.0
+    }
+    if not len(reference) or not len(candidate):
+        return report
+
+    iou = pairwise_iou(reference.boxes, candidate.boxes)
+    iou[reference.class_ids[:, None] != candidate.class_ids[None, :]] = 0.0
+    for i in np.argsort(-reference.scores):
+        # Best candidate not yet matched to a more confident reference box
+        j = int(np.argmax(iou[i]))
+        if iou[i, j] < match_iou:
+            continue
+        iou[:, j] = -1.0
+        report["matched"] += 1
+        report["max_box_error_px"] = max(
+            report["max_box_error_px"],
+            float(np.abs(reference.boxes[i] - candidate.boxes[j]).max())
+        )
+        report["max_conf_error"] = max(
+            report["max_conf_error"],
+            float(abs(reference.scores[i] - candidate.scores[j]))
+        )
+    report["unmatched_reference"] = report["reference"] - report["matched"]
+    report["unmatched_candidate"] = report["candidate"] - report["matched"]
+    return report
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=Path, required=True, help="Folder of sample blueprints")
+    parser.add_argument("--weights", type=Path, default=settings.MODEL_PATH)
+    parser.add_argument("--reference", default="pytorch")
+    parser.add_argument("--candidate", default="onnxruntime")
+    parser.add_argument(
+        "--max-unmatched",
+        type=float,
+        default=BACKEND_UNMATCHED_TOLERANCE,
+        help="Fraction of reference or candidate boxes allowed without a match"
+    )
+    args = parser.parse_args()
+
+    reference = create_backend(args.reference, args.weights)
+    candidate = create_backend(args.candidate, args.weights)
+    reference.load()
+    candidate.load()
+
+    images = sorted(p for p in args.images.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    reports = {}
+    for image in images:
+        ref = reference.predict([image], settings.CONFIDENCE_THRESHOLD, settings.IOU_THRESHOLD)[0]
+        cand = candidate.predict([image], settings.CONFIDENCE_THRESHOLD, settings.IOU_THRESHOLD)[0]
+        reports[image.name] = compare(ref, cand)
+
+    worst_box = max((r["max_box_error_px"] for r in reports.values()), default=0.0)
+    worst_conf = max((r["max_conf_error"] for r in reports.values()), default=0.0)
+    totals = {
+        key: sum(r[key] for r in reports.values())
+        for key in ("reference", "candidate", "matched", "unmatched_reference", "unmatched_candidate")
+    }
+    unmatched_fraction = max(
+        totals["unmatched_reference"] / max(totals["reference"], 1),
+        totals["unmatched_candidate"] / max(totals["candidate"], 1)
+    )
+    within = (
+        worst_box <= BACKEND_BOX_TOLERANCE_PX
+        and worst_conf <= BACKEND_CONF_TOLERANCE
+        and unmatched_fraction <= args.max_unmatched
+    )
+
+    print(json.dumps({
+        "reference": args.reference,
+        "candidate": args.candidate,
+        "images": reports,
+        "max_box_error_px": worst_box,
+        "max_conf_error": worst_conf,
+        **totals,
+        "unmatched_fraction": unmatched_fraction,
+        "tolerance": {
+            "box_px": BACKEND_BOX_TOLERANCE_PX,
+            "conf": BACKEND_CONF_TOLERANCE,
+            "unmatched_fraction": args.max_unmatched
+        },
+        "within_tolerance": within
+    }, indent=2))
+    return 0 if within else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
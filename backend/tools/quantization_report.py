@@ -0,0 +1,337 @@
+"""
+Compare an INT8-quantized model against the FP32 weights on a labeled set
+
+Usage (from backend/):
+    python tools/quantization_report.py --images data/val/images --mode static --calibration data/calib/
+
+Labels are YOLO text files (``<class> <cx> <cy> <w> <h>``, normalized;
+polygon rows count as their bounding box) named after the images, in
+``--labels`` (default: the ``labels`` folder next to an ``images`` folder,
+else the image folder itself).
+
+Both models run over every sheet. The JSON report gives per class and
+overall: AP at IOU 0.5, mAP over IOU 0.5:0.95 and recall at the serving
+confidence threshold, each with its change from reference to candidate;
+plus per-image latency, memory growth while loading and model file size.
+Matching and AP (101-point interpolation) follow ``yolo val``, so the
+reference numbers line up with training metrics.
+
+Exits with status 1 if the candidate loses more than ``--max-map-drop``
+mAP, or any class more than ``--max-recall-drop`` recall. Switch a model
+to the quantized backend (``MODEL_BACKENDS``) only when it passes, and
+calibrate on other sheets than the ones evaluated here.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import numpy as np
+from core.config import settings
+from models.backends import create_backend, InferenceBackend
+from models.detections import Detections
+from compare_backends import pairwise_iou, IMAGE_SUFFIXES
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+
+# Confidence floor for mAP, as in yolo val (recall uses CONFIDENCE_THRESHOLD)
+EVAL_CONF_THRESHOLD = 0.001
+
+DEFAULT_MAX_MAP_DROP = 0.01
+DEFAULT_MAX_RECALL_DROP = 0.02
+
+def _rss_bytes() -> Optional[int]:
+    """Resident memory of this process (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def default_labels_dir(images: Path) -> Path:
+    sibling = images.parent / "labels"
+    return sibling if images.name == "images" and sibling.is_dir() else images
+
+def load_labels(path: Path, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ground truth of one sheet from a YOLO label file
+
+    Args:
+        path: Label file; a missing file means no objects
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        (xyxy boxes in pixels, class ids)
+    """
+    boxes, class_ids = [], []
+    if path.exists():
+        for line in path.read_text().splitlines():
+            values = line.split()
+            if len(values) < 5:
+                continue
+            coords = np.array(values[1:], dtype=np.float64)
+            if len(coords) == 4:
+                cx, cy, w, h = coords
+                boxes.append([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+            else:
+                xs, ys = coords[0::2], coords[1::2]
+                boxes.append([xs.min(), ys.min(), xs.max(), ys.max()])
+            class_ids.append(int(values[0]))
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4) * [width, height, width, height]
+    return boxes, np.array(class_ids, dtype=np.int64)
+
+def match_detections(
+    detections: Detections,
+    gt_boxes: np.ndarray,
+    gt_class_ids: np.ndarray
+) -> np.ndarray:
+    """
+    True positives of each detection at each of ``IOU_THRESHOLDS``
+
+    Same-class pairs are matched by descending IOU, each ground truth box
+    and each detection at most once (as in yolo val).
+
+    Returns:
+        (detections, thresholds) boolean array
+    """
+    correct = np.zeros((len(detections), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(detections) or not len(gt_boxes):
+        return correct
+    iou = pairwise_iou(gt_boxes, detections.boxes.astype(np.float64))
+    iou[gt_class_ids[:, None] != detections.class_ids[None, :]] = 0.0
+    for k, threshold in enumerate(IOU_THRESHOLDS):
+        gt_idx, det_idx = np.nonzero(iou >= threshold)
+        if not len(gt_idx):
+            continue
+        order = np.argsort(-iou[gt_idx, det_idx], kind="stable")
+        gt_idx, det_idx = gt_idx[order], det_idx[order]
+        # np.unique keeps the first (best) pair of each detection, then of each ground truth box
+        _, first = np.unique(det_idx, return_index=True)
+        first.sort()
+        gt_idx, det_idx = gt_idx[first], det_idx[first]
+        _, first = np.unique(gt_idx, return_index=True)
+        correct[det_idx[first], k] = True
+    return correct
+
+def average_precision(correct: np.ndarray, scores: np.ndarray, num_labels: int) -> np.ndarray:
+    """
+    AP at each IOU threshold, COCO 101-point interpolation
+
+    Args:
+        correct: (detections, thresholds) true positives of one class
+        scores: Confidences of those detections
+        num_labels: Ground truth boxes of the class
+
+    Returns:
+        AP per threshold
+    """
+    if not len(scores):
+        return np.zeros(correct.shape[1])
+    correct = correct[np.argsort(-scores, kind="stable")]
+    tp = np.cumsum(correct, axis=0)
+    fp = np.cumsum(~correct, axis=0)
+    recall = tp / num_labels
+    precision = tp / (tp + fp)
+    ap = np.zeros(correct.shape[1])
+    for k in range(correct.shape[1]):
+        # Precision envelope: best precision at this recall or above
+        envelope = np.maximum.accumulate(precision[::-1, k])[::-1]
+        idx = np.searchsorted(recall[:, k], RECALL_POINTS, side="left")
+        ap[k] = np.where(idx < len(envelope), envelope[np.minimum(idx, len(envelope) - 1)], 0.0).mean()
+    return ap
+
+def class_metrics(
+    predictions: List[Tuple[np.ndarray, Detections]],
+    labels: Dict[int, int],
+    serving_conf: float
+) -> Dict[int, Dict[str, float]]:
+    """
+    AP50, mAP and recall per class over all sheets
+
+    Args:
+        predictions: (true positives, detections) per sheet
+        labels: Ground truth box count per class id
+        serving_conf: Confidence threshold for recall
+
+    Returns:
+        ``{class_id: {"ap50", "map", "recall"}}`` for classes with labels
+    """
+    correct = np.concatenate([c for c, _ in predictions]) if predictions else np.zeros((0, len(IOU_THRESHOLDS)), bool)
+    scores = np.concatenate([d.scores for _, d in predictions]) if predictions else np.zeros(0)
+    class_ids = np.concatenate([d.class_ids for _, d in predictions]) if predictions else np.zeros(0, int)
+    metrics = {}
+    for class_id, count in sorted(labels.items()):
+        mask = class_ids == class_id
+        ap = average_precision(correct[mask], scores[mask], count)
+        served = mask & (scores >= serving_conf)
+        metrics[class_id] = {
+            "ap50": float(ap[0]),
+            "map": float(ap.mean()),
+            "recall": float(correct[served, 0].sum() / count)
+        }
+    return metrics
+
+def _overall(metrics: Dict[int, Dict[str, float]]) -> Dict[str, float]:
+    """Mean over classes"""
+    return {
+        name: float(np.mean([m[name] for m in metrics.values()])) if metrics else 0.0
+        for name in ("ap50", "map", "recall")
+    }
+
+def _delta(reference: Dict[str, float], candidate: Dict[str, float]) -> Dict[str, float]:
+    return {name: candidate[name] - reference[name] for name in reference}
+
+def _load(backend: InferenceBackend) -> Dict:
+    """Load and warm up a backend, measuring time and memory growth"""
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    backend.load()
+    backend.warmup()
+    load_seconds = time.perf_counter() - started
+    rss_after = _rss_bytes()
+    artifact = Path(getattr(backend, "artifact", backend.weights_path))
+    return {
+        "backend": backend.name,
+        "artifact": str(artifact),
+        "size_mb": artifact.stat().st_size / 1e6 if artifact.is_file() else None,
+        "load_seconds": load_seconds,
+        # Includes the runtime library itself when it is the first to import it
+        "load_rss_mb": (rss_after - rss_before) / 1e6 if rss_before is not None and rss_after is not None else None
+    }
+
+def _latency(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {}
+    ms = np.array(seconds) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "mean_ms": float(ms.mean())
+    }
+
+def evaluate(
+    reference: InferenceBackend,
+    candidate: InferenceBackend,
+    images: List[Path],
+    labels_dir: Path,
+    serving_conf: float
+) -> Dict:
+    """
+    Run both (loaded) backends over a labeled set and compare them
+
+    Each sheet is decoded once and given to both models as an array, so the
+    latencies are model time only.
+    """
+    import cv2
+
+    predictions = {"reference": [], "candidate": []}
+    latencies = {"reference": [], "candidate": []}
+    labels: Dict[int, int] = {}
+    for path in images:
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"⚠ Skipping unreadable image {path}", file=sys.stderr)
+            continue
+        gt_boxes, gt_class_ids = load_labels(labels_dir / f"{path.stem}.txt", image.shape[1], image.shape[0])
+        for class_id in gt_class_ids.tolist():
+            labels[class_id] = labels.get(class_id, 0) + 1
+        for role, backend in (("reference", reference), ("candidate", candidate)):
+            started = time.perf_counter()
+            detections = backend.predict([image], EVAL_CONF_THRESHOLD, settings.IOU_THRESHOLD)[0]
+            latencies[role].append(time.perf_counter() - started)
+            predictions[role].append((match_detections(detections, gt_boxes, gt_class_ids), detections))
+
+    metrics = {role: class_metrics(predictions[role], labels, serving_conf) for role in predictions}
+    names = reference.class_names
+    classes = {
+        names.get(class_id, f"class_{class_id}"): {
+            "instances": labels[class_id],
+            "reference": metrics["reference"][class_id],
+            "candidate": metrics["candidate"][class_id],
+            "delta": _delta(metrics["reference"][class_id], metrics["candidate"][class_id])
+        }
+        for class_id in sorted(labels)
+    }
+    overall = {role: _overall(metrics[role]) for role in metrics}
+    overall["delta"] = _delta(overall["reference"], overall["candidate"])
+    return {
+        "images": len(latencies["reference"]),
+        "instances": sum(labels.values()),
+        "classes": classes,
+        "overall": overall,
+        "latency": {role: _latency(seconds) for role, seconds in latencies.items()}
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=Path, required=True, help="Folder of labeled blueprints")
+    parser.add_argument("--labels", type=Path, help="Folder of YOLO label files (default: see above)")
+    parser.add_argument("--weights", type=Path, default=settings.MODEL_PATH)
+    parser.add_argument("--reference", default="pytorch")
+    parser.add_argument("--candidate", default="onnxruntime-int8")
+    parser.add_argument("--mode", default=settings.QUANTIZATION_MODE, help="dynamic or static")
+    parser.add_argument("--calibration", type=Path, default=settings.QUANTIZATION_CALIBRATION_DIR,
+                        help="Sample blueprints for static calibration")
+    parser.add_argument("--requantize", action="store_true", help="Discard a cached quantized model first")
+    parser.add_argument("--max-map-drop", type=float, default=DEFAULT_MAX_MAP_DROP)
+    parser.add_argument("--max-recall-drop", type=float, default=DEFAULT_MAX_RECALL_DROP)
+    args = parser.parse_args()
+
+    settings.QUANTIZATION_MODE = args.mode
+    settings.QUANTIZATION_CALIBRATION_DIR = args.calibration
+    if args.requantize:
+        from models.quantization import quantized_artifact_path
+        quantized_artifact_path(args.weights, args.mode).unlink(missing_ok=True)
+
+    reference = create_backend(args.reference, args.weights)
+    candidate = create_backend(args.candidate, args.weights)
+    loads = {"reference": _load(reference), "candidate": _load(candidate)}
+
+    images = sorted(p for p in args.images.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    report = evaluate(
+        reference,
+        candidate,
+        images,
+        args.labels or default_labels_dir(args.images),
+        settings.CONFIDENCE_THRESHOLD
+    )
+
+    latency = report["latency"]
+    for role, load in loads.items():
+        load["latency"] = latency[role]
+    speedup = (
+        latency["reference"]["p50_ms"] / latency["candidate"]["p50_ms"]
+        if latency["reference"] and latency["candidate"]["p50_ms"] else None
+    )
+    worst_recall = min((c["delta"]["recall"] for c in report["classes"].values()), default=0.0)
+    acceptable = (
+        report["overall"]["delta"]["map"] >= -args.max_map_drop
+        and worst_recall >= -args.max_recall_drop
+    )
+
+    print(json.dumps({
+        "reference": loads["reference"],
+        "candidate": {**loads["candidate"], "quantization_mode": args.mode},
+        "images": report["images"],
+        "instances": report["instances"],
+        "classes": report["classes"],
+        "overall": report["overall"],
+        "speedup": speedup,
+        "thresholds": {
+            "max_map_drop": args.max_map_drop,
+            "max_recall_drop": args.max_recall_drop,
+            "serving_confidence": settings.CONFIDENCE_THRESHOLD
+        },
+        "acceptable": acceptable
+    }, indent=2))
+    return 0 if acceptable else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -37,13 +37,81 @@ export const blueprintAPI = {
         return response.data
     },
 
+    /**
+     * Run detection on many blueprints in one request
+     * @param {string[]|File} source - Uploaded blueprint IDs, or a ZIP of images
+     * @param {Function} onResult - Called with each sheet's result as it arrives
+     * @returns {Promise} Batch summary ({ total, done, failed })
+     */
+    detectBatch: async (source, onResult) => {
+        const init = { method: 'POST' }
+        if (Array.isArray(source)) {
+            init.headers = { 'Content-Type': 'application/json' }
+            init.body = JSON.stringify({ ids: source })
+        } else {
+            init.body = new FormData()
+            init.body.append('file', source)
+        }
+
+        // axios buffers the whole body in the browser, so stream with fetch
+        const response = await fetch(`${api.defaults.baseURL}/detect/batch`, init)
+        if (!response.ok) {
+            throw new Error(`Batch detection failed: ${response.status}`)
+        }
+
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffered = ''
+        let summary = null
+        for (;;) {
+            const { value, done } = await reader.read()
+            if (done) break
+            buffered += decoder.decode(value, { stream: true })
+            const lines = buffered.split('\n')
+            buffered = lines.pop()
+            for (const line of lines) {
+                if (!line.trim()) continue
+                const entry = JSON.parse(line)
+                if (entry.summary) summary = entry
+                else onResult?.(entry)
+            }
+        }
+        return summary
+    },
+
+    /**
+     * Queue detection on an uploaded blueprint without waiting for it
+     * @param {string} id - The blueprint ID from upload
+     * @returns {Promise} Job with id, status and progress
+     */
+    submitDetectionJob: async (id) => {
+        const response = await api.post(`/jobs/detect/${id}`)
+        return response.data
+    },
+
+    /**
+     * Get detection job state
+     * @param {string} jobId - The job ID from submitDetectionJob
+     * @returns {Promise} Job with status (queued/running/done/failed) and progress
+     */
+    getJob: async (jobId) => {
+        const response = await api.get(`/jobs/${jobId}`)
+        return response.data
+    },
+
     /**
      * Get detection results
      * @param {string} id - The blueprint ID
+     * @param {Object} [params] - Optional filters: bbox ("x1,y1,x2,y2" viewport),
+     *     scale (zoom level), label (array), min_confidence, offset, limit
      * @returns {Promise} Response with detection results
      */
-    getResults: async (id) => {
-        const response = await api.get(`/results/${id}`)
+    getResults: async (id, params = {}) => {
+        const response = await api.get(`/results/${id}`, {
+            params,
+            // Repeat array params as label=a&label=b
+            paramsSerializer: { indexes: null },
+        })
         return response.data
     },
 }